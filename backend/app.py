@@ -16,6 +16,8 @@ from routes.onu import onu_bp
 from routes.admin import admin_bp
 from routes.user import user_bp
 from routes.olt import olt_bp
+from routes.onu_stream import register_onu_stream
+from routes.monitor_stream import register_monitor_stream
 
 socketio = SocketIO(cors_allowed_origins="*", async_mode='eventlet')
 
@@ -31,6 +33,15 @@ def create_app():
 
     with app.app_context():
         db.create_all()
+        from utils import monitor_store
+        try:
+            # Bancos antigos: estado do monitor ainda no JSON unico de olt_monitor_data
+            imported = monitor_store.import_legacy()
+            if imported:
+                print(f"[INIT] {imported} porta(s) importada(s) do snapshot antigo do monitor.")
+        except Exception as e:
+            db.session.rollback()
+            print(f"[INIT] Snapshot antigo do monitor nao importado: {e}")
 
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(onu_bp, url_prefix='/api/onu')
@@ -40,15 +51,20 @@ def create_app():
 
     # Inicializar SocketIO com o app
     socketio.init_app(app)
+    register_onu_stream(socketio)
+    register_monitor_stream(socketio)
 
-    # Monitoramento de OLTs em background
-    from utils.olt_monitor import start_monitor
-    print("[INIT] Iniciando servidor e monitor...")
-    start_monitor(app, socketio)
+    # Monitoramento de OLTs em background (OLT_MONITOR_ENABLED=0 desliga, ex: benchmarks)
+    if os.environ.get('OLT_MONITOR_ENABLED', '1') != '0':
+        from utils.olt_monitor import start_monitor
+        print("[INIT] Iniciando servidor e monitor...")
+        start_monitor(app, socketio)
+    else:
+        print("[INIT] Iniciando servidor sem o monitor de OLTs (OLT_MONITOR_ENABLED=0).")
 
     return app
 
 app = create_app()
 
 if __name__ == '__main__':
-    socketio.run(app, debug=False, port=5000, host='0.0.0.0', log_output=True)
+    socketio.run(app, debug=False, port=int(os.environ.get('PORT', 5000)), host='0.0.0.0', log_output=True)
@@ -105,6 +105,7 @@ class SignalHistory(db.Model):
             'timestamp': self.timestamp.isoformat()
         }
 
+# Snapshot antigo (um JSON com todas as OLTs); so e lido para importar em olt_port_status
 class OLTMonitorData(db.Model):
     __tablename__ = 'olt_monitor_data'
     id = db.Column(db.Integer, primary_key=True)
@@ -117,3 +118,118 @@ class OLTMonitorData(db.Model):
             'data': self.data
         }
 
+
+class OLTPortStatus(db.Model):
+    __tablename__ = 'olt_port_status'
+    __table_args__ = (db.UniqueConstraint('olt_ip', 'port', name='uq_olt_port_status'),)
+    id = db.Column(db.Integer, primary_key=True)
+    olt_ip = db.Column(db.String(50), nullable=False, index=True)
+    port = db.Column(db.String(20), nullable=False)
+    data = db.Column(db.JSON, nullable=False) # {'port', 'onus', 'total'} como o monitor le da OLT
+    scanned_at = db.Column(db.DateTime, default=datetime.utcnow) # Leitura que gerou o conteudo atual
+
+    def to_dict(self):
+        result = dict(self.data)
+        result['scanned_at'] = self.scanned_at.isoformat() if self.scanned_at else None
+        return result
+
+
+class ONUStateEvent(db.Model):
+    __tablename__ = 'onu_state_events'
+    __table_args__ = (
+        db.Index('ix_onu_state_events_port', 'olt_ip', 'port', 'created_at'),
+        db.Index('ix_onu_state_events_onu', 'olt_ip', 'onu_id', 'created_at'),
+        db.Index('ix_onu_state_events_state', 'new_state', 'created_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    olt_ip = db.Column(db.String(50), nullable=False)
+    port = db.Column(db.String(20), nullable=False)
+    onu_id = db.Column(db.String(30), nullable=False) # ex: 1/2/3:14
+    old_state = db.Column(db.String(30), nullable=True) # None = ONU apareceu na porta
+    new_state = db.Column(db.String(30), nullable=True) # None = ONU sumiu da porta
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'olt_ip': self.olt_ip,
+            'port': self.port,
+            'onu_id': self.onu_id,
+            'old_state': self.old_state,
+            'new_state': self.new_state,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+class ONULocation(db.Model):
+    __tablename__ = 'onu_locations'
+    id = db.Column(db.Integer, primary_key=True)
+    sn = db.Column(db.String(50), unique=True, nullable=False, index=True)
+    olt_ip = db.Column(db.String(50), nullable=False, index=True)
+    interface = db.Column(db.String(50), nullable=False)
+    last_seen = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'sn': self.sn,
+            'olt_ip': self.olt_ip,
+            'interface': self.interface,
+            'last_seen': self.last_seen.isoformat() if self.last_seen else None
+        }
+
+
+class MonitorLease(db.Model):
+    __tablename__ = 'monitor_leases'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)
+    holder = db.Column(db.String(120), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'holder': self.holder,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None
+        }
+
+
+class MonitorDelta(db.Model):
+    __tablename__ = 'monitor_deltas'
+    seq = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    changes = db.Column(db.JSON, nullable=False)
+
+    def to_dict(self):
+        return {
+            'seq': self.seq,
+            'base_seq': self.seq - 1,
+            'updated_at': self.created_at.isoformat() if self.created_at else None,
+            'changes': self.changes
+        }
+
+
+class OLTScanState(db.Model):
+    __tablename__ = 'olt_scan_state'
+    id = db.Column(db.Integer, primary_key=True)
+    olt_ip = db.Column(db.String(50), unique=True, nullable=False, index=True)
+    interval = db.Column(db.Float, nullable=False)
+    next_scan_at = db.Column(db.DateTime, nullable=False)
+    last_scan_at = db.Column(db.DateTime, nullable=True)
+    last_success_at = db.Column(db.DateTime, nullable=True)
+    last_duration = db.Column(db.Float, nullable=True)
+    churn = db.Column(db.Float, nullable=True)
+    failures = db.Column(db.Integer, default=0)
+    last_error = db.Column(db.String(255), nullable=True)
+
+    def to_dict(self):
+        return {
+            'olt_ip': self.olt_ip,
+            'interval': round(self.interval, 1) if self.interval else None,
+            'next_scan_at': self.next_scan_at.isoformat() if self.next_scan_at else None,
+            'last_scan_at': self.last_scan_at.isoformat() if self.last_scan_at else None,
+            'last_success_at': self.last_success_at.isoformat() if self.last_success_at else None,
+            'last_duration': round(self.last_duration, 1) if self.last_duration is not None else None,
+            'churn': round(self.churn, 3) if self.churn is not None else None,
+            'failures': self.failures or 0,
+            'last_error': self.last_error
+        }
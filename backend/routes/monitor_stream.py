@@ -0,0 +1,33 @@
+from flask import request
+from flask_socketio import join_room, leave_room
+from routes.onu_stream import resolve_username
+from utils import monitor_delta
+
+
+def register_monitor_stream(socketio):
+    """Inscricao nas salas do monitor.
+
+    O cliente emite 'monitor_subscribe' {room, token} com room 'all' (parque
+    inteiro, ex: dashboard), 'olt:<ip>' ou 'port:<ip>:<porta>' e passa a
+    receber so os 'olt_delta' daquela sala; 'monitor_unsubscribe' {room} sai.
+    A resposta vem em 'monitor_subscribed' / 'monitor_error'.
+    """
+
+    @socketio.on('monitor_subscribe')
+    def handle_monitor_subscribe(data):
+        data = data or {}
+        room = data.get('room')
+        if resolve_username(data.get('token') or '') is None:
+            socketio.emit('monitor_error', {'room': room, 'error': 'Invalid or expired token'}, to=request.sid)
+            return
+        if monitor_delta.parse_room(room) is None:
+            socketio.emit('monitor_error', {'room': room, 'error': 'Invalid room'}, to=request.sid)
+            return
+        join_room(room)
+        socketio.emit('monitor_subscribed', {'room': room}, to=request.sid)
+
+    @socketio.on('monitor_unsubscribe')
+    def handle_monitor_unsubscribe(data):
+        room = (data or {}).get('room')
+        if monitor_delta.parse_room(room) is not None:
+            leave_room(room)
@@ -1,38 +1,136 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
 from flask_jwt_extended import jwt_required
-from models import db, OLT, StatusDescription, SystemConfig, OLTMonitorData
-import os
-import json
-import re
-from utils.telnet import get_credentials
-from netmiko import ConnectHandler
-from utils.olt_monitor import check_port, parse_onu_state
+from models import db, OLT, StatusDescription, SystemConfig
 import time
-from netmiko import ConnectHandler
-from utils.olt_monitor import check_port
-from sqlalchemy.orm.attributes import flag_modified
+from utils.olt_monitor import parse_onu_state
 from utils.drivers import get_olt_driver
-from utils.telnet import get_credentials
+from utils import olt_registry, onu_index, onu_events, monitor_delta, monitor_store, scan_schedule
+from utils.olt_scheduler import olt_scheduler, PRIORITY_INTERACTIVE, SlotTimeout
+from utils.olt_health import olt_health
+from utils.monitor_leader import monitor_leader
+from utils.olt_monitor import CliSessionError, open_device, cli_profile, cli_device_params, prepare_fast_session, record_fast_cli_failure
+from utils.session_pool import session_pool
+from utils.command_cache import command_cache
+from utils.response_cache import monitor_status_cache
 import traceback
+from datetime import datetime, timezone
 
 olt_bp = Blueprint('olts', __name__)
 
+def _isoformat(value):
+    return value.isoformat() if value else None
+
 @olt_bp.route('/monitor-status', methods=['GET'])
 @jwt_required()
 def get_monitor_status():
+    """Estado do monitor; ?olt=<ip> e ?port=<porta> limitam a uma OLT ou porta.
+
+    O corpo e montado e comprimido uma vez por versao (seq dos deltas + ultimo
+    scan + cadastro de OLTs); polling sem mudanca recebe 304 pelo ETag ou pelo
+    Last-Modified. Por isso nada nele depende da hora: o cliente calcula a
+    idade de cada OLT com last_success_at e o header Date.
+    """
+    olt_ip = request.args.get('olt')
+    port = request.args.get('port')
     try:
-        latest = OLTMonitorData.query.order_by(OLTMonitorData.id.desc()).first()
-        if latest:
-            return jsonify({
-                "id": latest.id,
-                "data": latest.data,
-                "updated_at": latest.updated_at.isoformat() if latest.updated_at else None
-            }), 200
-        else:
+        # seq antes do estado: um delta gravado entre as duas leituras e reaplicado, nunca perdido
+        seq = monitor_delta.current_seq()
+        olts = olt_registry.get_olts()
+        if olt_ip:
+            olts = [olt for olt in olts if olt['ip'] == olt_ip]
+        updated_at = monitor_store.updated_at()
+        if updated_at is None and not (olt_ip or port):
             return jsonify({"status": "waiting", "message": "First scan in progress. Please wait 2-3 minutes."}), 200
+
+        last_scan_at = scan_schedule.last_scan_at()
+        registry = ','.join(f"{olt['ip']}={olt.get('name')}" for olt in olts)
+        version = f"{seq}|{_isoformat(last_scan_at)}|{registry}"
+
+        def build():
+            return {
+                "seq": seq,
+                "data": monitor_store.load(olt_ip, port),
+                "updated_at": _isoformat(updated_at),
+                # Agenda de cada OLT, com o ultimo scan completo e o SLA
+                "olts": scan_schedule.status(olts)
+            }
+
+        return monitor_status_cache.respond(f"{olt_ip or ''}|{port or ''}", version, build)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@olt_bp.route('/monitor-resync', methods=['GET'])
+@jwt_required()
+def get_monitor_resync():
+    """Para o cliente que perdeu algum olt_delta: mudancas desde ?since=<seq> ou o estado inteiro.
+
+    ?olt= e ?port= limitam ao que a sala do cliente acompanha.
+    """
+    since = request.args.get('since', type=int)
+    olt_ip = request.args.get('olt')
+    port = request.args.get('port')
+    try:
+        seq = monitor_delta.current_seq()
+        changes = monitor_delta.changes_since(since) if since is not None else None
+        if changes is not None:
+            changes = monitor_delta.filter_changes(changes, olt_ip, port)
+            return jsonify({"seq": seq, "base_seq": since, "changes": changes}), 200
+
+        return jsonify({
+            "seq": seq,
+            "full": True,
+            "data": monitor_store.load(olt_ip, port),
+            "updated_at": _isoformat(monitor_store.updated_at())
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def _parse_datetime(value):
+    # ISO 8601; com fuso (ex: ...Z) e convertido para UTC, que e como os eventos sao gravados
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+@olt_bp.route('/onu-events', methods=['GET'])
+@jwt_required()
+def get_onu_events():
+    """Transicoes de phase_state das ONUs: ?olt=, ?port=, ?onu=, ?state= (estado novo), ?since=, ?until=, ?limit=."""
+    try:
+        since = _parse_datetime(request.args.get('since'))
+        until = _parse_datetime(request.args.get('until'))
+    except ValueError:
+        return jsonify({"error": "since/until devem estar em ISO 8601"}), 400
+    limit = min(request.args.get('limit', onu_events.ONU_EVENT_QUERY_LIMIT, type=int), onu_events.ONU_EVENT_QUERY_LIMIT)
+    try:
+        events = onu_events.query(
+            olt_ip=request.args.get('olt'),
+            port=request.args.get('port'),
+            onu_id=request.args.get('onu'),
+            state=request.args.get('state'),
+            since=since,
+            until=until,
+            limit=limit,
+        )
+        return jsonify({"events": events, "count": len(events)}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@olt_bp.route('/scheduler-status', methods=['GET'])
+@jwt_required()
+def get_scheduler_status():
+    return jsonify({
+        "scheduler": olt_scheduler.stats(),
+        "sessions": session_pool.stats(),
+        "cache": command_cache.stats(),
+        "health": olt_health.stats(),
+        "onu_index": onu_index.stats(),
+        "monitor_leader": monitor_leader.stats(),
+        "monitor_status_cache": monitor_status_cache.stats(),
+    }), 200
+
 @olt_bp.route('/config', methods=['GET'])
 @jwt_required()
 def get_config():
@@ -68,6 +166,7 @@ def update_config():
         p_config.value = password
     
     db.session.commit()
+    olt_registry.invalidate()
     return jsonify({'message': 'Config updated'}), 200
 
 @olt_bp.route('/', methods=['GET'])
@@ -110,6 +209,46 @@ def add_status():
 
 
 
+def _read_port_state(olt_ip, user, pwd, port):
+    """Le o estado da porta no perfil da OLT; se o fast falhar depois do login, repete no legacy.
+
+    Falha de conexao ou login sobe direto (ja contou no circuit breaker).
+    """
+    profile = cli_profile(olt_ip)
+    cmd = f"show gpon onu state gpon-olt_{port}"
+    pattern = r'[>#]'
+    if profile == 'fast':
+        try:
+            with open_device(cli_device_params(olt_ip, user, pwd, profile, conn_timeout=30)) as device:
+                try:
+                    prepare_fast_session(device)
+                    return device.send_command(cmd, expect_string=pattern, read_timeout=30)
+                except Exception as e:
+                    raise CliSessionError(str(e)) from e
+        except CliSessionError as e:
+            record_fast_cli_failure(olt_ip, e)
+
+    device_params = cli_device_params(olt_ip, user, pwd, 'legacy', global_delay_factor=0.5, conn_timeout=30)
+    with open_device(device_params) as device:
+        device.write_channel('\n')
+        time.sleep(1)
+        try:
+            device.enable()
+        except:
+            pass
+
+        device.read_channel()
+        device.write_channel('terminal length 0\n')
+        time.sleep(0.5)
+        device.read_channel()
+        
+        device.read_channel()
+        device.write_channel('\n')
+        time.sleep(0.5)
+        device.read_channel()
+
+        return device.send_command(cmd, expect_string=pattern, read_timeout=30)
+
 @olt_bp.route('/refresh-port', methods=['POST'])
 @jwt_required()
 def refresh_port():
@@ -120,94 +259,59 @@ def refresh_port():
     if not olt_ip or not port:
         return jsonify({"error": "Missing OLT IP or Port"}), 400
 
-    olt = OLT.query.filter_by(ip=olt_ip).first()
+    olt = olt_registry.get_olt(olt_ip)
     if not olt:
         return jsonify({"error": "OLT not found"}), 404
 
-    user, pwd = get_credentials(olt_ip)
-    
-    device_params = {
-        'device_type': 'zte_zxros_telnet',
-        'host': olt_ip,
-        'username': user,
-        'password': pwd,
-        'global_delay_factor': 0.5,
-        'conn_timeout': 30,
-        'fast_cli': False,
-    }
+    user, pwd = olt['username'], olt['password']
 
+    if not olt_health.allow(olt_ip):
+        return jsonify({"error": f"OLT {olt_ip} indisponivel no momento (circuit breaker aberto)"}), 503
+    
     try:
-        with ConnectHandler(**device_params) as device:
-            device.write_channel('\n')
-            time.sleep(1)
-            try:
-                device.enable()
-            except:
-                pass
-
-            pattern = r'[>#]'
-            
-            device.read_channel()
-            device.write_channel('terminal length 0\n')
-            time.sleep(0.5)
-            device.read_channel()
-            
-            device.read_channel()
-            device.write_channel('\n')
-            time.sleep(0.5)
-            device.read_channel()
-
-            cmd = f"show gpon onu state gpon-olt_{port}"
-            print(f"[DEBUG-REFRESH] Executando comando na OLT: {cmd}")
-            output = device.send_command(cmd, expect_string=pattern, read_timeout=30)
-            print(f"[DEBUG-REFRESH] Resposta bruta da OLT:\n{output}")
-            
-            from utils.olt_monitor import parse_onu_state
-            parsed = parse_onu_state(output)
-            
-            port_data = {
-                'port': port,
-                'onus': parsed['onus'],
-                'total': parsed['total']
-            }
-
-            monitor_entry = OLTMonitorData.query.order_by(OLTMonitorData.id.desc()).first()
-            if monitor_entry:
-                try:
-                    import copy
-                    current_cache = copy.deepcopy(monitor_entry.data) if monitor_entry.data else {}
-                    
-                    if olt_ip not in current_cache:
-                        current_cache[olt_ip] = []
-                     
-                    clean_ports = [p for p in current_cache[olt_ip] if p['port'] != port]
-                    clean_ports.append(port_data)
-                    current_cache[olt_ip] = clean_ports
-                    
-                    from sqlalchemy.orm.attributes import flag_modified
-                    monitor_entry.data = current_cache
-                    monitor_entry.updated_at = db.func.now()
-                    flag_modified(monitor_entry, "data")
-                    db.session.commit()
-                    
-                    print(f"[DEBUG-REFRESH] Banco atualizado para {olt_ip} porta {port}. Total agora: {len(parsed['onus'])} ONUs.")
-                    
-                    try:
-                        from app import socketio
-                        socketio.emit('olt_update', {
-                            'updated_at': time.strftime('%Y-%m-%d %H:%M:%S'),
-                            'data': current_cache
-                        }, broadcast=True)
-                        print(f"[DEBUG-REFRESH] Socket enviado com sucesso.")
-                    except Exception as ws_err:
-                        print(f"[WS ERROR] {ws_err}")
-
-                except Exception as db_err:
-                    db.session.rollback()
-                    print(f"[DB ERROR] {db_err}")
-                    return jsonify({"error": f"Erro ao atualizar banco de dados: {str(db_err)}"}), 500
-
-            return jsonify(port_data), 200
+        # A leitura fica fora da trava da porta: so a vaga do scheduler limita o vty
+        with olt_scheduler.slot(olt_ip, PRIORITY_INTERACTIVE, pooled=False):
+            read_at = datetime.utcnow()
+            output = _read_port_state(olt_ip, user, pwd, port)
+        print(f"[DEBUG-REFRESH] Resposta bruta da OLT:\n{output}")
+        
+        parsed = parse_onu_state(output)
+        
+        port_data = {
+            'port': port,
+            'onus': parsed['onus'],
+            'total': parsed['total']
+        }
+
+        def write():
+            old_port = monitor_store.port_status(olt_ip, port)
+            applied = monitor_store.apply([{'olt': olt_ip, 'port': port, 'op': 'upsert', 'value': port_data}], read_at)
+            monitor_store.touch({olt_ip: [port]}, read_at)
+            onu_events.record(applied, {olt_ip: [old_port] if old_port else []}, read_at)
+            return applied
+
+        try:
+            # Instancia registrada pelo init_app; importar app.py criaria outra (e outro app)
+            socketio = current_app.extensions['socketio']
+            # A trava so ordena gravacao e delta neste worker; entre workers, leitura
+            # mais velha que a gravada perde na condicao de scanned_at do apply
+            with monitor_store.port_locks([(olt_ip, port)]):
+                changes, seq = monitor_delta.publish(write, socketio)
+        except Exception as db_err:
+            db.session.rollback()
+            print(f"[DB ERROR] {db_err}")
+            return jsonify({"error": f"Erro ao atualizar banco de dados: {str(db_err)}"}), 500
+
+        if not changes:
+            # Outro worker (ou refresh concorrente) gravou uma leitura mais nova desta porta
+            print(f"[DEBUG-REFRESH] Leitura mais nova de {olt_ip} porta {port} ja gravada, mantendo.")
+            return jsonify(monitor_store.port_status(olt_ip, port) or port_data), 200
+        print(f"[DEBUG-REFRESH] Banco atualizado para {olt_ip} porta {port}, delta {seq}. Total agora: {len(parsed['onus'])} ONUs.")
+
+        return jsonify(port_data), 200
+    except SlotTimeout as e:
+        olt_health.record_failure(olt_ip, e)
+        return jsonify({"error": f"OLT ocupada, tente novamente: {str(e)}"}), 503
     except Exception as e:
         print(traceback.format_exc())
         return jsonify({"error": str(e)}), 500
@@ -230,23 +334,16 @@ def update_status(id):
 @olt_bp.route('/<int:id>/ports', methods=['GET'])
 @jwt_required()
 def get_olt_ports(id):
-    olt = OLT.query.get(id)
+    olt = olt_registry.get_olt_by_id(id)
     if not olt:
         return jsonify({"error": "OLT not found"}), 404
-        
 
-    
-    if not olt.username or not olt.password:
-        u, p = get_credentials(olt.ip)
-        olt.username = u
-        olt.password = p
-
-    if not olt.username or not olt.password:
+    if not olt['username'] or not olt['password']:
         return jsonify({"error": "No credentials found for this OLT"}), 400
 
     driver = get_olt_driver(olt)
     if not driver.connect():
-        return jsonify({"error": f"Failed to connect to OLT {olt.ip}. Check credentials and connectivity."}), 500
+        return jsonify({"error": f"Failed to connect to OLT {olt['ip']}. Check credentials and connectivity."}), 500
         
     try:
         ports = driver.get_ports()
@@ -257,26 +354,20 @@ def get_olt_ports(id):
 @olt_bp.route('/<int:id>/onus-on-port', methods=['GET'])
 @jwt_required()
 def get_onus_on_port(id):
-    olt = OLT.query.get(id)
+    olt = olt_registry.get_olt_by_id(id)
     if not olt:
         return jsonify({"error": "OLT not found"}), 404
         
     port = request.args.get('port')
     if not port:
         return jsonify({"error": "Port required"}), 400
-        
-
-    if not olt.username or not olt.password:
-        u, p = get_credentials(olt.ip)
-        olt.username = u
-        olt.password = p
 
-    if not olt.username or not olt.password:
+    if not olt['username'] or not olt['password']:
         return jsonify({"error": "No credentials found for this OLT"}), 400
 
     driver = get_olt_driver(olt)
     if not driver.connect():
-        return jsonify({"error": f"Failed to connect to OLT {olt.ip}"}), 500
+        return jsonify({"error": f"Failed to connect to OLT {olt['ip']}"}), 500
         
     try:
         onus = driver.get_onus_on_port(port)
@@ -318,6 +409,7 @@ def add_olt():
     )
     db.session.add(new_olt)
     db.session.commit()
+    olt_registry.invalidate()
     return jsonify({"message": "OLT added successfully", "olt": new_olt.to_dict()}), 201
 
 @olt_bp.route('/<int:id>', methods=['PUT'])
@@ -341,6 +433,7 @@ def update_olt(id):
     if 'actions' in data: olt.actions = ",".join(data['actions'])
 
     db.session.commit()
+    olt_registry.invalidate()
     return jsonify({"message": "OLT updated"}), 200
 
 @olt_bp.route('/<int:id>', methods=['DELETE'])
@@ -352,4 +445,5 @@ def delete_olt(id):
     
     db.session.delete(olt)
     db.session.commit()
+    olt_registry.invalidate()
     return jsonify({"message": "OLT deleted"}), 200
@@ -1,11 +1,14 @@
 ﻿from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from utils.telnet import search_onu_on_olt, send_command, send_command_with_confirmation
+from utils.telnet import search_onu_on_olt, search_onus_on_olt, send_command, send_command_with_confirmation
 from utils.drivers import get_olt_driver
-from models import StatusDescription, OLT, SystemConfig, Log, User, SignalHistory
+from utils import olt_registry, onu_index
+from utils.command_cache import command_cache
+from utils.olt_health import CircuitOpen, olt_health
+from utils.fanout import batch_deadline, fan_out
+from models import StatusDescription, Log, User, SignalHistory
 from database import db
 from datetime import datetime, timedelta
-import concurrent.futures
 import re
 
 onu_bp = Blueprint('onu', __name__)
@@ -23,7 +26,7 @@ def onu_checkup():
     if not sn or not olt_ip:
         return jsonify({"error": "SN and OLT IP required"}), 400
 
-    olt = OLT.query.filter_by(ip=olt_ip).first()
+    olt = olt_registry.get_olt(olt_ip)
     if not olt:
         return jsonify({"error": "OLT not found"}), 404
 
@@ -57,30 +60,15 @@ def get_signal_history(sn):
     return jsonify([h.to_dict() for h in history]), 200
 
 def get_olts_with_credentials():
-    olts = OLT.query.all()
-    
-    u_user_cfg = SystemConfig.query.filter_by(key='universal_username').first()
-    u_pass_cfg = SystemConfig.query.filter_by(key='universal_password').first()
-    
-    univ_user = u_user_cfg.value if u_user_cfg else None
-    univ_pass = u_pass_cfg.value if u_pass_cfg else None
-    
-    results = []
-    for olt in olts:
-        user = olt.username if olt.username else univ_user
-        pwd = olt.password if olt.password else univ_pass
-        
-        if user and pwd:
-            results.append({
-                'ip': olt.ip,
-                'name': olt.name,
-                'username': user,
-                'password': pwd
-            })
-        else:
-            print(f"Skipping OLT {olt.ip} - Missing credentials")
-            
-    return results
+    return olt_registry.get_olts_with_credentials()
+
+
+def get_available_olts():
+    """OLTs com credenciais e circuito fechado, e a lista das puladas por estarem fora do ar."""
+    olt_data_list, skipped = olt_health.split_available(get_olts_with_credentials())
+    if skipped:
+        print(f"[HEALTH] Pulando OLTs indisponiveis: {', '.join(o['ip'] for o in skipped)}")
+    return olt_data_list, skipped
 
 def get_status_info(status_code):
     if not status_code:
@@ -96,13 +84,19 @@ def get_status_info(status_code):
 
 
 def resolve_credentials_for_olt(olt):
-    u_user_cfg = SystemConfig.query.filter_by(key='universal_username').first()
-    u_pass_cfg = SystemConfig.query.filter_by(key='universal_password').first()
+    if not olt:
+        return olt_registry.get_credentials(None)
+    return olt['username'], olt['password']
+
 
-    username = olt.username if olt and olt.username else (u_user_cfg.value if u_user_cfg else None)
-    password = olt.password if olt and olt.password else (u_pass_cfg.value if u_pass_cfg else None)
+def cache_bypassed():
+    """?refresh=1 forca a leitura direto na OLT, ignorando o cache de comandos show."""
+    return str(request.args.get('refresh', '')).lower() in ('1', 'true', 'yes')
 
-    return username, password
+
+def invalidate_onu_cache(context):
+    removed = command_cache.invalidate_interface(context['olt_ip'], context['interface'])
+    print(f"[CACHE] {removed} entradas invalidadas para {context['olt_ip']} {context['interface']}")
 
 
 def normalize_onu_interface(interface):
@@ -251,6 +245,146 @@ def extract_ssid_snapshot(*outputs):
     }
 
 
+def extract_onu_interfaces(raw_output, sn):
+    """Interfaces gpon-onu_ presentes na saida do `show gpon onu by sn` (ignorando o eco do comando)."""
+    found = []
+    if not raw_output:
+        return found
+
+    for line in raw_output.split('\n'):
+        if 'gpon-onu_' in line and not line.strip().startswith(f'show gpon onu by sn {sn}'):
+            for part in line.split():
+                if part.startswith('gpon-onu_'):
+                    found.append((part, line))
+    return found
+
+
+def locate_onus_via_index(sns):
+    """Confirma as posicoes guardadas no indice SN -> OLT com uma sessao por OLT indexada.
+
+    Retorna {sn: location} so para os SNs que a OLT indexada confirmou. Os demais
+    (fora do indice, entrada velha, OLT fora do ar ou ONU que saiu dali) ficam
+    para a busca em todas as OLTs.
+    """
+    entries = onu_index.lookup(sns)
+    by_olt = {}
+    for sn, entry in entries.items():
+        olt = olt_registry.get_olt(entry['olt_ip'])
+        if olt and olt_health.allow(olt['ip'], reserve=False):
+            by_olt.setdefault(olt['ip'], (olt, []))[1].append(sn)
+
+    confirmed = {}
+    if not by_olt:
+        return confirmed
+
+    def confirm(olt):
+        username, password = resolve_credentials_for_olt(olt)
+        try:
+            return search_onus_on_olt(olt['ip'], by_olt[olt['ip']][1], username, password) or {}
+        except CircuitOpen:
+            # Os SNs dela seguem para a busca em todas as OLTs, que reporta a OLT pulada
+            return {}
+
+    results, _ = fan_out(confirm, [olt for olt, _ in by_olt.values()])
+    for olt, outputs in results:
+        for sn, raw_output in outputs.items():
+            interfaces = extract_onu_interfaces(raw_output, sn)
+            if interfaces:
+                interface, line = interfaces[0]
+                confirmed[sn] = {
+                    'olt_ip': olt['ip'],
+                    'olt_name': olt['name'],
+                    'interface': interface,
+                    'raw_line': line,
+                    'username': olt['username'],
+                    'password': olt['password'],
+                }
+
+    onu_index.record({sn: (loc['olt_ip'], loc['interface']) for sn, loc in confirmed.items()})
+    print(f"[INDEX] {len(confirmed)}/{len(sns)} SNs confirmados pelo indice")
+    return confirmed
+
+
+def timed_out_olts(olts):
+    return [{'ip': olt['ip'], 'name': olt.get('name'), 'state': 'timeout'} for olt in olts]
+
+
+def skip_unavailable(fn, skipped):
+    """fn(olt) para o fan_out; OLT que o breaker recusou na hora da conexao entra em skipped.
+
+    Acontece quando ela passou pelo split_available mas outra busca ficou com
+    o teste do half_open; sem isso ela pareceria consultada e sem o SN.
+    """
+    def run(olt):
+        try:
+            return fn(olt)
+        except CircuitOpen:
+            skipped.append({'ip': olt['ip'], 'name': olt.get('name'), 'state': olt_health.state(olt['ip'])})
+            return None
+    return run
+
+
+def search_onu_on_all_olts(sn, first=True, on_found=None):
+    """Busca o SN em todas as OLTs disponiveis. Retorna (locations, skipped_olts).
+
+    Com first=True responde assim que uma OLT encontra o SN, sem esperar as demais.
+    on_found(location) e chamado para cada posicao assim que a OLT responde.
+    """
+    olt_data_list, skipped = get_available_olts()
+    locations = []
+
+    def collect(d, raw_output):
+        for interface, line in extract_onu_interfaces(raw_output, sn):
+            location = {
+                'olt_ip': d['ip'],
+                'olt_name': d['name'],
+                'interface': interface,
+                'raw_line': line,
+                'username': d['username'],
+                'password': d['password'],
+            }
+            locations.append(location)
+            if on_found:
+                on_found(location)
+
+    refused = []
+    _, pending = fan_out(
+        skip_unavailable(lambda d: search_onu_on_olt(d['ip'], sn, d['username'], d['password']), refused),
+        olt_data_list,
+        match=lambda raw_output: bool(extract_onu_interfaces(raw_output, sn)),
+        first=first,
+        on_result=collect,
+    )
+
+    if not (first and locations):
+        # Sem match as OLTs pendentes sao as que estouraram o deadline
+        skipped = skipped + refused + timed_out_olts(pending)
+    return locations, skipped
+
+
+def locate_onu(sn, first=True, on_found=None):
+    """Onde o SN esta: indice primeiro, busca em todas as OLTs so se ele nao confirmar.
+
+    Retorna (locations, skipped_olts); cada location tem olt_ip, olt_name,
+    interface, raw_line, username e password. first=False pula o indice e
+    espera todas as OLTs (ate o deadline) para achar tambem SNs duplicados.
+    """
+    if first:
+        location = locate_onus_via_index([sn]).get(sn)
+        if location:
+            if on_found:
+                on_found(location)
+            return [location], []
+
+    locations, skipped = search_onu_on_all_olts(sn, first=first, on_found=on_found)
+    if locations:
+        onu_index.record({sn: (locations[0]['olt_ip'], locations[0]['interface'])})
+    elif not skipped:
+        # Nenhuma OLT tem o SN: uma entrada antiga so custaria um comando a mais nas proximas buscas
+        onu_index.forget([sn])
+    return locations, skipped
+
+
 def extract_recent_log_lines(output, limit=40):
     if not output:
         return []
@@ -271,7 +405,7 @@ def find_onu_context(sn=None, olt_ip=None, interface=None):
     normalized_interface = normalize_onu_interface(interface)
 
     if olt_ip:
-        olt = OLT.query.filter_by(ip=olt_ip).first()
+        olt = olt_registry.get_olt(olt_ip)
         if not olt:
             return None
 
@@ -281,15 +415,18 @@ def find_onu_context(sn=None, olt_ip=None, interface=None):
 
         if normalized_interface:
             return {
-                'olt_ip': olt.ip,
-                'olt_name': olt.name,
+                'olt_ip': olt['ip'],
+                'olt_name': olt['name'],
                 'interface': normalized_interface,
                 'username': username,
                 'password': password,
                 'sn': sn,
             }
 
-        raw_output = search_onu_on_olt(olt.ip, sn, username, password)
+        try:
+            raw_output = search_onu_on_olt(olt['ip'], sn, username, password)
+        except CircuitOpen:
+            return None
         if not raw_output:
             return None
 
@@ -299,8 +436,8 @@ def find_onu_context(sn=None, olt_ip=None, interface=None):
                 for part in parts:
                     if part.startswith('gpon-onu_'):
                         return {
-                            'olt_ip': olt.ip,
-                            'olt_name': olt.name,
+                            'olt_ip': olt['ip'],
+                            'olt_name': olt['name'],
                             'interface': part,
                             'username': username,
                             'password': password,
@@ -308,48 +445,23 @@ def find_onu_context(sn=None, olt_ip=None, interface=None):
                         }
         return None
 
-    olt_data_list = get_olts_with_credentials()
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
-        future_to_idx = {
-            executor.submit(
-                search_onu_on_olt,
-                d['ip'],
-                sn,
-                d['username'],
-                d['password']
-            ): i
-            for i, d in enumerate(olt_data_list)
-        }
-
-        for future in concurrent.futures.as_completed(future_to_idx):
-            idx = future_to_idx[future]
-            try:
-                raw_output = future.result()
-                if raw_output:
-                    c_ip = olt_data_list[idx]['ip']
-                    c_name = olt_data_list[idx]['name']
-
-                    for line in raw_output.split('\n'):
-                        if 'gpon-onu_' in line and not line.strip().startswith(f'show gpon onu by sn {sn}'):
-                            parts = line.split()
-                            for part in parts:
-                                if part.startswith('gpon-onu_'):
-                                    return {
-                                        'olt_ip': c_ip,
-                                        'olt_name': c_name,
-                                        'interface': part,
-                                        'username': olt_data_list[idx]['username'],
-                                        'password': olt_data_list[idx]['password'],
-                                        'sn': sn,
-                                    }
-            except Exception as exc:
-                print(f'{olt_data_list[idx]["ip"]} generated an exception: {exc}')
+    locations, skipped = locate_onu(sn)
+    if not locations:
+        return None
 
-    return None
+    location = locations[0]
+    return {
+        'olt_ip': location['olt_ip'],
+        'olt_name': location['olt_name'],
+        'interface': location['interface'],
+        'username': location['username'],
+        'password': location['password'],
+        'sn': sn,
+        'skipped_olts': skipped,
+    }
 
 
-def load_onu_operational_data(context, sn):
+def load_onu_operational_data(context, sn, use_cache=True):
     olt_ip = context['olt_ip']
     interface = context['interface']
     c_user = context['username']
@@ -370,7 +482,7 @@ def load_onu_operational_data(context, sn):
         'show running-config | include wifi',
     ]
 
-    outputs = send_command(olt_ip, commands, c_user, c_pass)
+    outputs = send_command(olt_ip, commands, c_user, c_pass, use_cache=use_cache)
     if not outputs:
         return None
 
@@ -494,6 +606,8 @@ def run_onu_action(context, commands, username):
     if not outputs:
         raise RuntimeError('No response returned by OLT')
 
+    invalidate_onu_cache(context)
+
     resolved_sn = context.get('sn')
     if not resolved_sn:
         details = load_onu_operational_data(context, None)
@@ -526,7 +640,7 @@ def get_onu_acs_summary(sn):
         return jsonify({'error': 'ONU not found'}), 404
 
     try:
-        payload = load_onu_operational_data(context, sn)
+        payload = load_onu_operational_data(context, sn, use_cache=not cache_bypassed())
         if not payload:
             return jsonify({'error': 'Failed to read ONU data'}), 500
         return jsonify(payload), 200
@@ -552,7 +666,7 @@ def get_onu_interface_info():
         return jsonify({'error': 'ONU not found'}), 404
 
     try:
-        payload = load_onu_operational_data(context, context.get('sn'))
+        payload = load_onu_operational_data(context, context.get('sn'), use_cache=not cache_bypassed())
         if payload:
             print(f'[DEBUG] Payload SN={payload.get("sn")}, Name={payload.get("name")}, Uptime={payload.get("uptime")}')
         if not payload:
@@ -630,6 +744,8 @@ def update_onu_password(sn):
             context['password']
         )
 
+        invalidate_onu_cache(context)
+
         write_onu_log(
             username,
             f'Alterou senha ONU: {sn}',
@@ -680,6 +796,8 @@ def update_onu_name(sn):
             context['password']
         )
 
+        invalidate_onu_cache(context)
+
         write_onu_log(
             username,
             f'Alterou nome ONU: {sn}',
@@ -720,6 +838,7 @@ def restore_onu(sn):
     try:
         execution = _execute_onu_action_with_fallback(context, 'restore')
         outputs = execution['outputs']
+        invalidate_onu_cache(context)
         print(f"Restore execution result: {execution}")
 
         if not execution['success']:
@@ -800,6 +919,8 @@ def update_onu_wifi(sn):
         if ssid_password:
             action_parts.append(f'senha SSID {wifi_port} atualizada')
 
+        invalidate_onu_cache(context)
+
         write_onu_log(
             username,
             f'Atualizou Wi-Fi ONU: {sn}',
@@ -843,6 +964,7 @@ def reboot_onu(sn):
     try:
         execution = _execute_onu_action_with_fallback(context, 'reboot')
         outputs = execution['outputs']
+        invalidate_onu_cache(context)
         print(f"Reboot execution result: {execution}")
 
         if not execution['success']:
@@ -871,6 +993,64 @@ def reboot_onu(sn):
         traceback.print_exc()
         return jsonify({'error': str(exc)}), 500
 
+def build_locate_result(sn, onu_data, use_cache=True):
+    """Status e sinais de uma posicao encontrada pelo /locate (3 comandos na OLT)."""
+    olt_ip = onu_data['olt_ip']
+    interface = onu_data['interface']
+    c_user = onu_data['username']
+    c_pass = onu_data['password']
+
+    status = "Unknown"
+    rx_onu = -99.9 
+    tx_olt = -99.9  
+    rx_olt = -99.9 
+    tx_onu = -99.9 
+    
+    cmd_detail = f"show gpon onu detail-info {interface}"
+    cmd_rx_onu = f"show pon power onu-rx {interface}"
+    cmd_rx_olt = f"show pon power olt-rx {interface}"
+    
+    commands = [cmd_detail, cmd_rx_onu, cmd_rx_olt]
+    command_outputs = send_command(olt_ip, commands, c_user, c_pass, use_cache=use_cache)
+    
+    if command_outputs and len(command_outputs) >= 3:
+        detail_output = command_outputs[0]
+        rx_output = command_outputs[1]
+        olt_rx_output = command_outputs[2]
+
+        phase_match = re.search(r"Phase state:\s+(\w+)", detail_output, re.IGNORECASE)
+        if phase_match:
+            status = phase_match.group(1)
+            
+        rx_match = re.search(r"Rx\s*power\s*:\s*(-?\d+\.?\d*)", rx_output, re.IGNORECASE)
+        if not rx_match:
+            rx_match = re.search(r"(-?\d+\.\d+)", rx_output)
+            
+        if rx_match:
+            rx_onu = float(rx_match.group(1))
+
+        olt_rx_match = re.search(r"(-?\d+\.\d+)", olt_rx_output)
+        if olt_rx_match:
+            rx_olt = float(olt_rx_match.group(1))
+
+    desc, color = get_status_info(status)
+
+    return {
+        "sn": sn,
+        "olt": onu_data['olt_name'],
+        "ip": olt_ip,
+        "interface": interface,
+        "status": status,
+        "status_description": desc,
+        "status_color": color,
+        "signals": {
+            "rxOnu": rx_onu,
+            "txOnu": 2.2,
+            "rxOlt": rx_olt,
+            "txOlt": 3.5 
+        }
+    }
+
 @onu_bp.route('/locate', methods=['POST'])
 @jwt_required()
 def locate_onu_endpoint():
@@ -880,7 +1060,7 @@ def locate_onu_endpoint():
     
     print("DEBUG: /locate endpoint hit")
     data = request.json
-    sn = data.get('sn')
+    sn = (data.get('sn') or '').strip().upper()
     print(f"DEBUG: Searching for SN: {sn} by user {username}")
 
     if not sn or len(sn) != 12:
@@ -896,110 +1076,107 @@ def locate_onu_endpoint():
     db.session.add(log)
     db.session.commit()
     
-    olt_data_list = get_olts_with_credentials()
-    
-    found_onus = []
-    
-    with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
-        future_to_idx = {
-            executor.submit(
-                search_onu_on_olt, 
-                d['ip'], 
-                sn, 
-                d['username'], 
-                d['password']
-            ): i 
-            for i, d in enumerate(olt_data_list)
-        }
-        
-        for future in concurrent.futures.as_completed(future_to_idx):
-            idx = future_to_idx[future]
-            try:
-                raw_output = future.result()
-                if raw_output:
-                    c_ip = olt_data_list[idx]['ip']
-                    c_name = olt_data_list[idx]['name']
-                    
-                    lines = raw_output.split('\n')
-                    for line in lines:
-                        if "gpon-onu_" in line and not line.strip().startswith(f"show gpon onu by sn {sn}"):
-                            parts = line.split()
-                            for part in parts:
-                                if part.startswith("gpon-onu_"):
-                                    found_onus.append({
-                                        "olt_ip": c_ip,
-                                        "olt_name": c_name,
-                                        "interface": part,
-                                        "raw_line": line,
-                                        "username": olt_data_list[idx]['username'],
-                                        "password": olt_data_list[idx]['password']
-                                    })
-            except Exception as exc:
-                print(f'{olt_data_list[idx]["ip"]} generated an exception: {exc}')
+    found_onus, skipped = locate_onu(sn)
 
     if not found_onus:
-        return jsonify({"error": "ONU not found on any OLT"}), 404
+        return jsonify({"error": "ONU not found on any OLT", "skipped_olts": skipped}), 404
     
-    results = []
-
-    for onu_data in found_onus:
-        olt_ip = onu_data['olt_ip']
-        interface = onu_data['interface']
-        c_user = onu_data['username']
-        c_pass = onu_data['password']
-
-        status = "Unknown"
-        rx_onu = -99.9 
-        tx_olt = -99.9  
-        rx_olt = -99.9 
-        tx_onu = -99.9 
-        
-        cmd_detail = f"show gpon onu detail-info {interface}"
-        cmd_rx_onu = f"show pon power onu-rx {interface}"
-        cmd_rx_olt = f"show pon power olt-rx {interface}"
-        
-        commands = [cmd_detail, cmd_rx_onu, cmd_rx_olt]
-        command_outputs = send_command(olt_ip, commands, c_user, c_pass)
-        
-        if command_outputs and len(command_outputs) >= 3:
-            detail_output = command_outputs[0]
-            rx_output = command_outputs[1]
-            olt_rx_output = command_outputs[2]
-
-            phase_match = re.search(r"Phase state:\s+(\w+)", detail_output, re.IGNORECASE)
-            if phase_match:
-                status = phase_match.group(1)
-                
-            rx_match = re.search(r"Rx\s*power\s*:\s*(-?\d+\.?\d*)", rx_output, re.IGNORECASE)
-            if not rx_match:
-                rx_match = re.search(r"(-?\d+\.\d+)", rx_output)
-                
-            if rx_match:
-                rx_onu = float(rx_match.group(1))
-
-            olt_rx_match = re.search(r"(-?\d+\.\d+)", olt_rx_output)
-            if olt_rx_match:
-                rx_olt = float(olt_rx_match.group(1))
-
-        desc, color = get_status_info(status)
-
-        results.append({
-            "sn": sn,
-            "olt": onu_data['olt_name'],
-            "ip": olt_ip,
-            "interface": interface,
-            "status": status,
-            "status_description": desc,
-            "status_color": color,
-            "signals": {
-                "rxOnu": rx_onu,
-                "txOnu": 2.2,
-                "rxOlt": rx_olt,
-                "txOlt": 3.5 
-            }
-        })
+    use_cache = not cache_bypassed()
+    results = [build_locate_result(sn, onu_data, use_cache) for onu_data in found_onus]
+
+    # OLTs puladas (breaker aberto ou sem resposta no prazo) vao para a tela do tecnico
+    return jsonify({"results": results, "skipped_olts": skipped})
+
+@onu_bp.route('/locate-batch', methods=['POST'])
+@jwt_required()
+def locate_onu_batch_endpoint():
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    username = user.username if user else "Unknown"
+
+    data = request.json or {}
+    raw_sns = data.get('sns') or []
+    if isinstance(raw_sns, str):
+        raw_sns = re.split(r'[\s,;]+', raw_sns)
+
+    sns = []
+    invalid = []
+    for value in raw_sns:
+        sn = str(value).strip().upper()
+        if not sn:
+            continue
+        if len(sn) != 12:
+            invalid.append(sn)
+        elif sn not in sns:
+            sns.append(sn)
+
+    if not sns:
+        return jsonify({"error": "Invalid SN list provided", "invalid": invalid}), 400
 
-    return jsonify(results)
+    if len(sns) > 200:
+        return jsonify({"error": "Maximum of 200 SNs per request"}), 400
+
+    log = Log(
+        username=username,
+        action=f"Localizou ONUs em lote: {len(sns)} SNs",
+        ip_address=request.remote_addr,
+        system_info=str(request.user_agent),
+        details=f"Busca em lote para os SNs: {', '.join(sns)}"[:500]
+    )
+    db.session.add(log)
+    db.session.commit()
+
+    locations = {sn: [] for sn in sns}
+    for sn, location in locate_onus_via_index(sns).items():
+        location = dict(location)
+        location.pop('username')
+        location.pop('password')
+        locations[sn].append(location)
+
+    pending = [sn for sn in sns if not locations[sn]]
+    olt_data_list, skipped = get_available_olts() if pending else ([], [])
+
+    # Uma sessao por OLT com todos os SNs, em vez de SN x OLT logins; os SNs rodam
+    # em sequencia na sessao, entao o prazo cresce com o tamanho do lote
+    refused = []
+    results, timed_out = fan_out(
+        skip_unavailable(lambda d: search_onus_on_olt(d['ip'], pending, d['username'], d['password']), refused),
+        olt_data_list,
+        deadline=batch_deadline(len(pending)),
+    )
+    skipped = skipped + refused + timed_out_olts(timed_out)
+
+    for d, outputs in results:
+        if outputs is None:
+            # Sessao nao abriu ou caiu (ou o breaker recusou, ja em refused): a OLT nao respondeu pelos SNs
+            if not any(olt['ip'] == d['ip'] for olt in refused):
+                skipped.append({'ip': d['ip'], 'name': d.get('name'), 'state': 'error'})
+            continue
+        for sn, raw_output in outputs.items():
+            for interface, line in extract_onu_interfaces(raw_output, sn):
+                locations[sn].append({
+                    "olt_ip": d['ip'],
+                    "olt_name": d['name'],
+                    "interface": interface,
+                    "raw_line": line,
+                })
+
+    onu_index.record({
+        sn: (locations[sn][0]['olt_ip'], locations[sn][0]['interface'])
+        for sn in pending if locations[sn]
+    })
+    if not skipped:
+        onu_index.forget([sn for sn in pending if not locations[sn]])
+
+    # Com alguma OLT sem resposta, o SN que nao apareceu pode estar nela
+    missing = [sn for sn in sns if not locations[sn]]
+    return jsonify({
+        "results": locations,
+        "not_found": [] if skipped else missing,
+        "unknown": missing if skipped else [],
+        "invalid": invalid,
+        "skipped_olts": skipped,
+    }), 200
 
 @onu_bp.route('/signal/<sn>', methods=['GET'])
 @jwt_required()
@@ -1021,54 +1198,11 @@ def get_onu_signal(sn):
     db.session.add(log)
     db.session.commit()
 
-    olt_data_list = get_olts_with_credentials()
-    results = [None] * len(olt_data_list)
-    
-    with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
-        future_to_idx = {
-            executor.submit(
-                search_onu_on_olt, 
-                d['ip'], 
-                sn, 
-                d['username'], 
-                d['password']
-            ): i 
-            for i, d in enumerate(olt_data_list)
-        }
-        for future in concurrent.futures.as_completed(future_to_idx):
-            idx = future_to_idx[future]
-            try:
-                data = future.result()
-                results[idx] = data
-            except Exception as exc:
-                print(f'{olt_data_list[idx]["ip"]} generated an exception: {exc}')
-
-    found_onu = None
-    for i, raw_output in enumerate(results):
-        if raw_output:
-            c_ip = olt_data_list[i]['ip']
-            c_name = olt_data_list[i]['name']
-            
-            lines = raw_output.split('\n')
-            for line in lines:
-                if "gpon-onu_" in line:
-                    parts = line.split()
-                    for part in parts:
-                        if part.startswith("gpon-onu_"):
-                            found_onu = {
-                                "olt_ip": c_ip,
-                                "olt_name": c_name,
-                                "interface": part,
-                                "raw_line": line,
-                                "username": olt_data_list[i]['username'],
-                                "password": olt_data_list[i]['password']
-                            }
-                            break
-                if found_onu: break
-        if found_onu: break
+    locations, skipped = locate_onu(sn)
+    found_onu = locations[0] if locations else None
 
     if not found_onu:
-        return jsonify({"error": "ONU not found"}), 404
+        return jsonify({"error": "ONU not found", "skipped_olts": skipped}), 404
 
     olt_ip = found_onu['olt_ip']
     interface = found_onu['interface']
@@ -1092,7 +1226,7 @@ def get_onu_signal(sn):
     cmd_state = f"show gpon onu state {olt_interface}" 
 
     commands = [cmd_detail, cmd_rx_onu, cmd_rx_olt, cmd_tx_onu, cmd_tx_olt, cmd_state]
-    outputs = send_command(olt_ip, commands, c_user, c_pass)
+    outputs = send_command(olt_ip, commands, c_user, c_pass, use_cache=not cache_bypassed())
     
     status = "Unknown"
     rx_onu = -99.9  
@@ -1169,11 +1303,11 @@ def get_onu_signal(sn):
     desc, color = get_status_info(status)
 
     try:
-        olt_record = OLT.query.filter_by(ip=olt_ip).first()
+        olt_record = olt_registry.get_olt(olt_ip)
         if olt_record:
             new_history = SignalHistory(
                 sn=sn,
-                olt_id=olt_record.id,
+                olt_id=olt_record['id'],
                 rx_power=rx_onu,
                 tx_power=tx_onu
             )
@@ -1199,7 +1333,8 @@ def get_onu_signal(sn):
             "txOnu": tx_onu, 
             "rxOlt": rx_olt,  
             "txOlt": tx_olt    
-        }
+        },
+        "skipped_olts": skipped
     }
     return jsonify(response)
 
@@ -1230,45 +1365,11 @@ def delete_onu_by_sn(sn):
     user = User.query.get(current_user_id)
     username = user.username if user else "Unknown"
     
-    olt_data_list = get_olts_with_credentials()
-    found_onus = []
-    
-    with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
-        future_to_idx = {
-            executor.submit(
-                search_onu_on_olt, 
-                d['ip'], 
-                sn, 
-                d['username'], 
-                d['password']
-            ): i 
-            for i, d in enumerate(olt_data_list)
-        }
-        
-        for future in concurrent.futures.as_completed(future_to_idx):
-            idx = future_to_idx[future]
-            try:
-                raw_output = future.result()
-                if raw_output:
-                    c_ip = olt_data_list[idx]['ip']
-                    lines = raw_output.split('\n')
-                    for line in lines:
-                        # Ex: gpon-onu_1/2/1:1
-                        if "gpon-onu_" in line and not line.strip().startswith(f"show gpon onu by sn {sn}"):
-                            parts = line.split()
-                            for part in parts:
-                                if part.startswith("gpon-onu_"):
-                                    found_onus.append({
-                                        "olt_ip": c_ip,
-                                        "interface": part,
-                                        "username": olt_data_list[idx]['username'],
-                                        "password": olt_data_list[idx]['password']
-                                    })
-            except Exception as exc:
-                print(f"Error searching {olt_data_list[idx]['ip']}: {exc}")
-    
+    # Remove de todas as OLTs onde o SN aparecer, nao so da primeira que responder
+    found_onus, skipped = locate_onu(sn, first=False)
+
     if not found_onus:
-        return jsonify({"error": "ONU não encontrada para exclusão"}), 404
+        return jsonify({"error": "ONU não encontrada para exclusão", "skipped_olts": skipped}), 404
 
     results_log = []
     success_count = 0
@@ -1299,12 +1400,16 @@ def delete_onu_by_sn(sn):
                 item['username'], 
                 item['password']
             )
+            invalidate_onu_cache(item)
             success_count += 1
             results_log.append(f"Removido de {item['olt_ip']} interface {interface_full}")
             
         except Exception as e:
             results_log.append(f"Erro ao remover de {item['olt_ip']} interface {interface_full}: {str(e)}")
 
+    if success_count:
+        onu_index.forget([sn])
+
     log_detail = "; ".join(results_log)
     log = Log(
         username=username,
@@ -1317,7 +1422,7 @@ def delete_onu_by_sn(sn):
     db.session.commit()
 
     if success_count > 0:
-        return jsonify({"message": f"Operação conclui­da. {success_count}/{len(found_onus)} removidas com sucesso.", "details": results_log}), 200
+        return jsonify({"message": f"Operação conclui­da. {success_count}/{len(found_onus)} removidas com sucesso.", "details": results_log, "skipped_olts": skipped}), 200
     else:
         return jsonify({"error": "Falha ao remover ONU de todas as interfaces encontradas.", "details": results_log}), 500
 
@@ -0,0 +1,102 @@
+import time
+from flask import current_app, request
+from flask_jwt_extended import decode_token
+from models import Log, User
+from database import db
+from routes.onu import locate_onu, build_locate_result
+from utils.fanout import fan_out
+
+
+def resolve_username(token):
+    """Valida o JWT enviado no evento (o socket nao passa pelo @jwt_required)."""
+    try:
+        identity = decode_token(token)['sub']
+    except Exception:
+        return None
+    user = User.query.get(identity)
+    return user.username if user else "Unknown"
+
+
+def register_onu_stream(socketio):
+    """Eventos Socket.IO do /locate em streaming.
+
+    O cliente emite 'locate_stream' {sn, token, request_id} e recebe, so no
+    proprio socket: 'locate_started', um 'locate_found' assim que cada OLT
+    devolve a posicao, um 'locate_detail' quando o status/sinal daquela
+    posicao fica pronto e por fim 'locate_done' (ou 'locate_error').
+    """
+
+    @socketio.on('locate_stream')
+    def handle_locate_stream(data):
+        data = data or {}
+        sid = request.sid
+        request_id = data.get('request_id')
+        sn = (data.get('sn') or '').strip().upper()
+
+        def emit(event, payload):
+            payload['request_id'] = request_id
+            socketio.emit(event, payload, to=sid)
+
+        username = resolve_username(data.get('token') or '')
+        if username is None:
+            emit('locate_error', {'sn': sn, 'error': 'Invalid or expired token'})
+            return
+        if len(sn) != 12:
+            emit('locate_error', {'sn': sn, 'error': 'Invalid SN provided'})
+            return
+
+        log = Log(
+            username=username,
+            action=f"Localizou ONU: {sn}",
+            ip_address=request.remote_addr,
+            system_info=str(request.user_agent),
+            details=f"Busca realizada para o SN: {sn} (streaming)"
+        )
+        db.session.add(log)
+        db.session.commit()
+
+        app = current_app._get_current_object()
+        socketio.start_background_task(_run_locate, app, emit, sn, data.get('nocache'))
+
+    def _run_locate(app, emit, sn, nocache):
+        started = time.time()
+        use_cache = not nocache
+
+        def on_found(location):
+            emit('locate_found', {
+                'sn': sn,
+                'olt': location['olt_name'],
+                'ip': location['olt_ip'],
+                'interface': location['interface'],
+                'elapsed': round(time.time() - started, 3),
+            })
+
+        def load_detail(location):
+            with app.app_context():
+                return build_locate_result(sn, location, use_cache)
+
+        with app.app_context():
+            emit('locate_started', {'sn': sn})
+            try:
+                found_onus, skipped = locate_onu(sn, on_found=on_found)
+            except Exception as e:
+                print(f"[STREAM] Erro na busca de {sn}: {e}")
+                emit('locate_error', {'sn': sn, 'error': str(e)})
+                return
+
+        # Cada posicao manda o seu status/sinal assim que os 3 comandos dela terminam
+        details, pending = fan_out(load_detail, found_onus, on_result=lambda location, result: emit('locate_detail', result))
+        for location in pending:
+            emit('locate_detail', {
+                'sn': sn,
+                'ip': location['olt_ip'],
+                'interface': location['interface'],
+                'error': 'timeout',
+            })
+
+        emit('locate_done', {
+            'sn': sn,
+            'found': len(found_onus),
+            'skipped_olts': skipped,
+            'elapsed': round(time.time() - started, 3),
+        })
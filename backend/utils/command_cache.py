@@ -0,0 +1,100 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+OLT_CACHE_MAX_ENTRIES = int(os.environ.get('OLT_CACHE_MAX_ENTRIES', 2000))
+
+# TTL (segundos) por familia de comando de leitura. Comandos fora da lista nunca
+# vao para o cache (configuracao, reboot, show logging, etc.).
+COMMAND_TTLS = [
+    ('show gpon onu detail-info', 30),
+    ('show pon power', 15),
+    ('show gpon onu state', 15),
+    ('show running-config', 120),
+]
+
+
+def ttl_for(command):
+    normalized = command.strip().lower()
+    for prefix, ttl in COMMAND_TTLS:
+        if normalized.startswith(prefix):
+            return ttl
+    return None
+
+
+class CommandCache:
+    """Cache LRU com TTL da saida de comandos show, por (IP da OLT, comando)."""
+
+    def __init__(self, max_entries=OLT_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, host, command):
+        key = (host, command.strip())
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, host, command, output):
+        ttl = ttl_for(command)
+        if not ttl or output is None:
+            return
+        key = (host, command.strip())
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, output)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_host(self, host):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == host]:
+                del self._entries[key]
+
+    def invalidate_interface(self, host, interface):
+        """Remove o que pode ter mudado apos uma escrita na ONU.
+
+        Cobre os comandos da propria ONU (gpon-onu_1/2/3:4), os da porta PON
+        dela (gpon-olt_1/2/3, que listam estado/potencia das ONUs) e o
+        running-config da OLT, que guarda nome, senha e SSIDs.
+        """
+        short = interface.replace('gpon-onu_', '').replace('gpon-olt_', '')
+        port = short.split(':')[0]
+        pattern = re.compile(rf"(?:gpon-onu_{re.escape(short)}\b|gpon-olt_{re.escape(port)}\b)")
+
+        with self._lock:
+            stale = [
+                key for key in self._entries
+                if key[0] == host and (pattern.search(key[1]) or key[1].lower().startswith('show running-config'))
+            ]
+            for key in stale:
+                del self._entries[key]
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+command_cache = CommandCache()
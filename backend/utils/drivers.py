@@ -1,24 +1,62 @@
 from abc import ABC, abstractmethod
-import telnetlib
 import time
+from utils.session_pool import OLT_TELNET_PORT, session_pool
+from utils.olt_scheduler import olt_scheduler
+from utils.olt_health import olt_health
+from utils.prompt import GENERIC_PROMPT_RE, SHELL_PROMPT_RE, prompt_from_output, read_until_prompt
+from utils.telnet_client import TelnetClient
 
 class BaseOLT(ABC):
+    profile = 'generic'
+
     def __init__(self, host, username, password):
         self.host = host
         self.username = username
         self.password = password
         self.tn = None
+        self._session = None
+        self.prompt_re = GENERIC_PROMPT_RE
 
     def connect(self):
+        if not olt_health.allow(self.host):
+            print(f"Connection error to {self.host}: OLT marked as unavailable (circuit open)")
+            return False
+        if not olt_scheduler.acquire(self.host):
+            print(f"Connection error to {self.host}: no free session slot")
+            return False
         try:
-            self.tn = telnetlib.Telnet(self.host, 23, timeout=10)
-            self._login()
-            self._post_login_setup()
+            self._session = session_pool.acquire(
+                self.host, self.username, self.password, self._open_connection, profile=self.profile
+            )
+            if not self._session:
+                olt_scheduler.release(self.host)
+                return False
+            self.tn = self._session.tn
+            self.prompt_re = self._session.prompt_re
             return True
         except Exception as e:
+            olt_scheduler.release(self.host)
             print(f"Connection error to {self.host}: {e}")
             return False
 
+    def _open_connection(self, host, username, password):
+        try:
+            self.tn = TelnetClient(host, OLT_TELNET_PORT, timeout=10)
+        except Exception as e:
+            olt_health.record_failure(host, e)
+            raise
+        olt_health.record_success(host)
+        self._login()
+        self._post_login_setup()
+        self._learn_prompt()
+        return self.tn
+
+    def _learn_prompt(self):
+        self.tn.write(b"\n")
+        _, _, data = self.tn.expect([SHELL_PROMPT_RE], timeout=5)
+        self.prompt_re = prompt_from_output(data)
+        self.tn.prompt_re = self.prompt_re
+
     @abstractmethod
     def _login(self):
         pass
@@ -31,10 +69,15 @@ class BaseOLT(ABC):
         results = []
         if not self.tn:
             return None
-        for cmd in commands:
-            self.tn.write(cmd.encode('ascii') + b"\n")
-            output = self._read_until_prompt()
-            results.append(output)
+        try:
+            for cmd in commands:
+                self.tn.write(cmd.encode('ascii') + b"\n")
+                output = self._read_until_prompt()
+                results.append(output)
+        except (EOFError, OSError):
+            if self._session:
+                self._session.reusable = False
+            raise
         return results
 
     @abstractmethod
@@ -58,11 +101,19 @@ class BaseOLT(ABC):
         pass
 
     def disconnect(self):
-        if self.tn:
+        if self._session:
+            # Devolve a sessao ao pool em vez de fazer logout
+            session_pool.release(self._session)
+            olt_scheduler.release(self.host)
+            self._session = None
+            self.tn = None
+        elif self.tn:
             self.tn.write(b"exit\n")
             self.tn.close()
 
 class HuaweiOLT(BaseOLT):
+    profile = 'huawei'
+
     def _login(self):
         self.tn.expect([b">>User name:", b"login:", b"Username:"], timeout=5)
         self.tn.write(self.username.encode('ascii') + b"\n")
@@ -71,16 +122,18 @@ class HuaweiOLT(BaseOLT):
 
     def _post_login_setup(self):
         self.tn.write(b"enable\n")
-        self.tn.read_until(b"#", timeout=5)
+        self.tn.expect([SHELL_PROMPT_RE], timeout=5)
         self.tn.write(b"undo smart\n")
-        self.tn.read_until(b"#", timeout=5)
+        self.tn.expect([SHELL_PROMPT_RE], timeout=5)
         self.tn.write(b"allow-same-name\n")
-        self.tn.read_until(b"#", timeout=5)
+        self.tn.expect([SHELL_PROMPT_RE], timeout=5)
         self.tn.write(b"screen-length 0 temporary\n")
-        self.tn.read_until(b"#", timeout=5)
+        self.tn.expect([SHELL_PROMPT_RE], timeout=5)
 
     def _read_until_prompt(self):
-        _, match, data = self.tn.expect([b"#"], timeout=10)
+        data, found = read_until_prompt(self.tn, self.prompt_re, timeout=10)
+        if not found and self._session:
+            self._session.reusable = False
         return data.decode('ascii', errors='ignore')
 
     def get_onu_signal(self, sn):
@@ -96,6 +149,8 @@ class HuaweiOLT(BaseOLT):
         return []
 
 class ZTEOLT(BaseOLT):
+    profile = 'zte'
+
     def _login(self):
         self.tn.expect([b"Username:", b"login:", b"User:"], timeout=5)
         self.tn.write(self.username.encode('ascii') + b"\n")
@@ -103,15 +158,17 @@ class ZTEOLT(BaseOLT):
         self.tn.write(self.password.encode('ascii') + b"\n")
 
     def _post_login_setup(self):
-        idx, match, data = self.tn.expect([b">", b"#"], timeout=5)
-        if match and match.group(0) == b">":
+        idx, match, data = self.tn.expect([SHELL_PROMPT_RE], timeout=5)
+        if match and match.group(2) == b">":
             self.tn.write(b"enable\n")
-            self.tn.read_until(b"#", timeout=5)
+            self.tn.expect([SHELL_PROMPT_RE], timeout=5)
         self.tn.write(b"terminal length 0\n")
-        self.tn.read_until(b"#", timeout=5)
+        self.tn.expect([SHELL_PROMPT_RE], timeout=5)
 
     def _read_until_prompt(self):
-        _, match, data = self.tn.expect([b"#"], timeout=10)
+        data, found = read_until_prompt(self.tn, self.prompt_re, timeout=10)
+        if not found and self._session:
+            self._session.reusable = False
         return data.decode('ascii', errors='ignore')
 
     def get_onu_signal(self, sn):
@@ -204,8 +261,16 @@ class ZTEOLT(BaseOLT):
             return []
 
 def get_olt_driver(olt_obj):
-    if olt_obj.type.upper() == "HUAWEI":
-        return HuaweiOLT(olt_obj.ip, olt_obj.username, olt_obj.password)
-    elif olt_obj.type.upper() == "ZTE":
-        return ZTEOLT(olt_obj.ip, olt_obj.username, olt_obj.password)
-    return ZTEOLT(olt_obj.ip, olt_obj.username, olt_obj.password)
+    # Aceita o model OLT ou uma entrada do utils.olt_registry (dict)
+    if isinstance(olt_obj, dict):
+        olt_type = olt_obj.get('type') or 'ZTE'
+        ip, username, password = olt_obj['ip'], olt_obj.get('username'), olt_obj.get('password')
+    else:
+        olt_type = olt_obj.type or 'ZTE'
+        ip, username, password = olt_obj.ip, olt_obj.username, olt_obj.password
+
+    if olt_type.upper() == "HUAWEI":
+        return HuaweiOLT(ip, username, password)
+    elif olt_type.upper() == "ZTE":
+        return ZTEOLT(ip, username, password)
+    return ZTEOLT(ip, username, password)
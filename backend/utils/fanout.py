@@ -0,0 +1,60 @@
+import concurrent.futures
+import os
+from utils.olt_scheduler import OLT_SCHEDULER_TIMEOUT
+
+OLT_FANOUT_WORKERS = int(os.environ.get('OLT_FANOUT_WORKERS', 64))
+# Tempo maximo que uma busca espera pelas OLTs; quem nao respondeu ate la fica de fora
+OLT_FANOUT_DEADLINE = float(os.environ.get('OLT_FANOUT_DEADLINE', 15))
+# Tempo a mais por comando quando cada OLT roda varios comandos em sequencia na mesma sessao
+OLT_FANOUT_COMMAND_SECONDS = float(os.environ.get('OLT_FANOUT_COMMAND_SECONDS', 1))
+
+# Executor compartilhado: a resposta nao espera as buscas abandonadas, que
+# terminam aqui em background e devolvem a sessao ao pool normalmente
+_executor = concurrent.futures.ThreadPoolExecutor(max_workers=OLT_FANOUT_WORKERS, thread_name_prefix='olt-fanout')
+
+
+def _label(item):
+    if isinstance(item, dict) and 'ip' in item:
+        return item['ip']
+    return str(item)
+
+
+def batch_deadline(commands):
+    """Prazo de um fan-out em que cada OLT roda `commands` comandos, contando a espera pela vaga."""
+    return OLT_FANOUT_DEADLINE + OLT_SCHEDULER_TIMEOUT + commands * OLT_FANOUT_COMMAND_SECONDS
+
+
+def fan_out(fn, items, match=None, first=False, deadline=OLT_FANOUT_DEADLINE, on_result=None):
+    """Executa fn(item) para cada item em paralelo.
+
+    Retorna (results, pending): results e a lista [(item, resultado)] na ordem
+    em que terminaram, so com os que passaram em match (quando informado);
+    pending sao os itens que nao terminaram. Com first=True volta no primeiro
+    match. Ao sair (match ou deadline) as tarefas que nem comecaram sao
+    canceladas e as que estao rodando sao abandonadas, sem bloquear quem chamou.
+    on_result(item, resultado) e chamado a cada match, assim que ele chega.
+    """
+    futures = {_executor.submit(fn, item): item for item in items}
+    results = []
+
+    try:
+        for future in concurrent.futures.as_completed(futures, timeout=deadline):
+            item = futures.pop(future)
+            try:
+                result = future.result()
+            except Exception as exc:
+                print(f"{_label(item)} generated an exception: {exc}")
+                continue
+            if match is None or match(result):
+                results.append((item, result))
+                if on_result:
+                    on_result(item, result)
+                if first:
+                    break
+    except concurrent.futures.TimeoutError:
+        print(f"[FANOUT] Deadline de {deadline}s atingido, {len(futures)} OLT(s) sem resposta: "
+              f"{', '.join(_label(item) for item in futures.values())}")
+
+    for future in futures:
+        future.cancel()
+    return results, list(futures.values())
@@ -0,0 +1,204 @@
+import os
+import threading
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from database import db
+from models import MonitorDelta
+
+# Quantos deltas ficam no banco para o /monitor-resync; cliente mais atrasado recebe o snapshot inteiro
+OLT_DELTA_HISTORY = int(os.environ.get('OLT_DELTA_HISTORY', 500))
+
+_lock = threading.Lock()
+_state = {'last_emitted': None}
+# Ultimo seq que mexeu em cada OLT/porta, visto por este worker (vira o base_seq das salas);
+# o que veio antes do worker subir conta como o seq em que ele comecou
+_touched = {'start': 0, 'olts': {}, 'ports': {}}
+
+ALL_ROOM = 'all'
+
+
+def olt_room(olt_ip):
+    return f"olt:{olt_ip}"
+
+
+def port_room(olt_ip, port):
+    return f"port:{olt_ip}:{port}"
+
+
+def parse_room(room):
+    """(olt_ip, porta) de uma sala valida ('all' -> (None, None)), ou None."""
+    if room == ALL_ROOM:
+        return None, None
+    kind, _, rest = (room or '').partition(':')
+    if kind == 'olt' and rest:
+        return rest, None
+    olt_ip, _, port = rest.partition(':')
+    if kind == 'port' and olt_ip and port:
+        return olt_ip, port
+    return None
+
+
+def filter_changes(changes, olt_ip=None, port=None):
+    """So as mudancas que interessam a uma OLT ou porta; remove_olt vale para todas as portas dela."""
+    if olt_ip is None:
+        return list(changes)
+    return [
+        change for change in changes
+        if change['olt'] == olt_ip and (port is None or change['op'] == 'remove_olt' or change.get('port') == port)
+    ]
+
+
+def _ports_by_key(ports):
+    return {res.get('port'): res for res in ports or [] if isinstance(res, dict)}
+
+
+def diff_snapshot(old_data, new_data):
+    """Mudancas por porta entre dois snapshots {olt_ip: [porta, ...]}.
+
+    Cada mudanca e {'olt', 'port', 'op': 'upsert', 'value'}, {'olt', 'port',
+    'op': 'remove'} ou {'olt', 'op': 'remove_olt'} (OLT fora do snapshot novo).
+    """
+    old_data = old_data if isinstance(old_data, dict) else {}
+    new_data = new_data if isinstance(new_data, dict) else {}
+    changes = []
+
+    for olt_ip, ports in new_data.items():
+        old_ports = _ports_by_key(old_data.get(olt_ip))
+        new_ports = _ports_by_key(ports)
+        for port, value in new_ports.items():
+            if old_ports.get(port) != value:
+                changes.append({'olt': olt_ip, 'port': port, 'op': 'upsert', 'value': value})
+        for port in old_ports:
+            if port not in new_ports:
+                changes.append({'olt': olt_ip, 'port': port, 'op': 'remove'})
+
+    for olt_ip in old_data:
+        if olt_ip not in new_data:
+            changes.append({'olt': olt_ip, 'op': 'remove_olt'})
+    return changes
+
+
+def current_seq():
+    return db.session.query(func.max(MonitorDelta.seq)).scalar() or 0
+
+
+def publish(write, socketio_instance=None):
+    """Grava as linhas e o delta delas numa transacao so, e repassa aos clientes deste worker.
+
+    write() faz as gravacoes do estado (sem commit) e retorna as mudancas
+    aplicadas; o delta entra com o proximo numero de sequencia e tudo vai num
+    commit. Se outro worker pegou o mesmo numero, a transacao inteira volta e
+    write() roda de novo, entao nunca fica linha gravada sem o delta dela.
+    Retorna (mudancas, seq), com seq None se nada mudou.
+    """
+    for attempt in range(3):
+        try:
+            changes = write()
+            seq = None
+            if changes:
+                seq = current_seq() + 1
+                db.session.add(MonitorDelta(seq=seq, changes=changes))
+                MonitorDelta.query.filter(MonitorDelta.seq <= seq - OLT_DELTA_HISTORY).delete(synchronize_session=False)
+            db.session.commit()
+            break
+        except IntegrityError:
+            # Outro worker (refresh-port x monitor) pegou o mesmo numero
+            db.session.rollback()
+            if attempt == 2:
+                print("[DELTA] Nao foi possivel gravar o delta do monitor.", flush=True)
+                raise
+
+    if seq is not None and socketio_instance is not None:
+        with _lock:
+            if _state['last_emitted'] is None:
+                _state['last_emitted'] = _touched['start'] = seq - 1
+        try:
+            relay(socketio_instance)
+        except Exception as e:
+            # Ja esta gravado: o proximo relay deste worker envia o que ficou pendente
+            print(f"[DELTA] Falha ao enviar o delta {seq}: {e}", flush=True)
+    return changes, seq
+
+
+def relay(socketio_instance):
+    """Emite 'olt_delta' para os deltas ainda nao enviados por este worker, em ordem.
+
+    Todos os workers passam por aqui (o lider, o refresh-port e o loop dos
+    seguidores), entao cada cliente recebe cada sequencia uma vez, seja qual
+    for o processo que gravou.
+    """
+    with _lock:
+        last_emitted = _state['last_emitted']
+        if last_emitted is None:
+            # Worker recem-iniciado: os clientes carregam o estado atual pelo /monitor-status
+            _state['last_emitted'] = _touched['start'] = current_seq()
+            return
+        pending = MonitorDelta.query.filter(MonitorDelta.seq > last_emitted).order_by(MonitorDelta.seq).all()
+        for delta in pending:
+            _emit_to_rooms(socketio_instance, delta)
+            _state['last_emitted'] = delta.seq
+
+
+def _active_rooms(socketio_instance):
+    try:
+        return [room for room, sids in socketio_instance.server.manager.rooms.get('/', {}).items()
+                if room is not None and sids and parse_room(room) is not None]
+    except AttributeError:
+        return [ALL_ROOM]
+
+
+def _room_base(olt_ip, port, seq):
+    if olt_ip is None:
+        return seq - 1
+    olt = _touched['olts'].get(olt_ip, {})
+    if port is None:
+        return olt.get('any', _touched['start'])
+    return max(olt.get('remove', _touched['start']), _touched['ports'].get((olt_ip, port), _touched['start']))
+
+
+def _emit_to_rooms(socketio_instance, delta):
+    """Emite o delta so para as salas com alguem inscrito, cada uma com as mudancas dela.
+
+    base_seq e o delta anterior que mexeu naquela OLT/porta: o cliente que ja
+    aplicou ate base_seq (ou alem) aplica este; se nao, perdeu algo e busca
+    no /monitor-resync.
+    """
+    payload = delta.to_dict()
+    touched = {change['olt'] for change in delta.changes}
+    for room in _active_rooms(socketio_instance):
+        olt_ip, port = parse_room(room)
+        if olt_ip is not None and olt_ip not in touched:
+            continue
+        changes = filter_changes(delta.changes, olt_ip, port)
+        if changes:
+            socketio_instance.emit('olt_delta', dict(payload, room=room, changes=changes,
+                                                     base_seq=_room_base(olt_ip, port, delta.seq)), to=room)
+
+    for change in delta.changes:
+        olt = _touched['olts'].setdefault(change['olt'], {})
+        olt['any'] = delta.seq
+        if change['op'] == 'remove_olt':
+            olt['remove'] = delta.seq
+        else:
+            _touched['ports'][(change['olt'], change['port'])] = delta.seq
+
+
+def changes_since(seq):
+    """Mudancas acumuladas depois de seq, ou None se o historico nao cobre mais esse ponto."""
+    deltas = MonitorDelta.query.filter(MonitorDelta.seq > seq).order_by(MonitorDelta.seq).all()
+    if not deltas:
+        return [] if seq == current_seq() else None
+    if deltas[0].seq != seq + 1:
+        return None
+
+    # Ultima mudanca de cada porta vence; remove_olt apaga as portas anteriores daquela OLT
+    merged = {}
+    for delta in deltas:
+        for change in delta.changes:
+            if change['op'] == 'remove_olt':
+                merged = {key: c for key, c in merged.items() if key[0] != change['olt']}
+                merged[(change['olt'], None)] = change
+            else:
+                merged.pop((change['olt'], None), None)
+                merged[(change['olt'], change['port'])] = change
+    return list(merged.values())
@@ -0,0 +1,119 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from database import db
+from models import MonitorLease
+
+# Quem tem o lease roda o monitor; se parar de renovar, outro worker assume apos o lease expirar
+OLT_MONITOR_LEASE = int(os.environ.get('OLT_MONITOR_LEASE', 60))
+OLT_MONITOR_LEASE_RENEW = int(os.environ.get('OLT_MONITOR_LEASE_RENEW', 15))
+
+
+class MonitorLeader:
+    """Eleicao de lider entre os workers do gunicorn via lease no banco.
+
+    Cada processo tenta pegar (ou renovar) a linha de monitor_leases a cada
+    OLT_MONITOR_LEASE_RENEW segundos; o UPDATE so passa se o lease e dele ou
+    ja expirou, entao no maximo um processo e lider por vez. Sem conseguir
+    renovar (banco fora, thread travada) o lider deixa de se considerar lider
+    quando o proprio lease vence, antes de outro worker poder assumir.
+    """
+
+    def __init__(self, name='olt_monitor', lease=OLT_MONITOR_LEASE, renew=OLT_MONITOR_LEASE_RENEW):
+        self.name = name
+        self.lease = lease
+        self.renew = renew
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._valid_until = 0
+        self._started = False
+        self._lock = threading.Lock()
+
+    def _try_acquire(self):
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.lease)
+        updated = MonitorLease.query.filter(
+            MonitorLease.name == self.name,
+            or_(MonitorLease.holder == self.holder, MonitorLease.expires_at < now),
+        ).update({'holder': self.holder, 'expires_at': expires_at}, synchronize_session=False)
+        db.session.commit()
+        if updated:
+            return True
+
+        if MonitorLease.query.filter_by(name=self.name).first():
+            return False
+        try:
+            db.session.add(MonitorLease(name=self.name, holder=self.holder, expires_at=expires_at))
+            db.session.commit()
+            return True
+        except IntegrityError:
+            # Outro worker criou a linha ao mesmo tempo
+            db.session.rollback()
+            return False
+
+    def _renew_once(self):
+        was_leader = self.is_leader()
+        # Prazo contado antes da ida ao banco, para nunca passar do lease gravado
+        started = time.monotonic()
+        try:
+            acquired = self._try_acquire()
+        except Exception as e:
+            # Erro transitorio (ex: "database is locked"): segue lider ate o proprio lease vencer
+            db.session.rollback()
+            print(f"[LEADER] Erro ao renovar lease ({self.holder}): {str(e)}", flush=True)
+            acquired = None
+
+        if acquired:
+            self._valid_until = started + self.lease
+        elif acquired is False and was_leader and self.is_leader():
+            # _try_acquire so recusa quando a linha e de outro holder: alguem assumiu, deixa de ser lider na hora
+            self._valid_until = 0
+
+        if self.is_leader() != was_leader:
+            state = 'lider' if self.is_leader() else 'seguidor'
+            print(f"[LEADER] {self.holder} agora e {state} do monitor.", flush=True)
+
+    def _run(self, app):
+        with app.app_context():
+            while True:
+                self._renew_once()
+                db.session.remove()
+                time.sleep(self.renew)
+
+    def start(self, app):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._run, args=(app,), daemon=True).start()
+
+    def is_leader(self):
+        return time.monotonic() < self._valid_until
+
+    def release(self, app):
+        """Libera o lease ao encerrar o worker, para o proximo assumir sem esperar expirar."""
+        if not self.is_leader():
+            return
+        self._valid_until = 0
+        with app.app_context():
+            try:
+                MonitorLease.query.filter_by(name=self.name, holder=self.holder).update(
+                    {'expires_at': datetime.utcnow()}, synchronize_session=False)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+
+    def stats(self):
+        current = MonitorLease.query.filter_by(name=self.name).first()
+        return {
+            'holder': self.holder,
+            'is_leader': self.is_leader(),
+            'lease': current.to_dict() if current else None,
+        }
+
+
+monitor_leader = MonitorLeader()
@@ -0,0 +1,171 @@
+import threading
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+from sqlalchemy import and_, func, or_
+from database import db
+from models import OLTMonitorData, OLTPortStatus
+
+def _port_key(port):
+    # '1/2/10' depois de '1/2/9'
+    return [int(part) if part.isdigit() else part for part in str(port).split('/')]
+
+
+_locks_guard = threading.Lock()
+_port_locks = {}
+
+
+def _lock_for(key):
+    with _locks_guard:
+        return _port_locks.setdefault(key, threading.Lock())
+
+
+@contextmanager
+def port_locks(keys):
+    """Trava as portas (olt_ip, porta) neste processo, sempre na mesma ordem para nao dar deadlock.
+
+    So serializa gravacao + delta dentro de um worker. Entre workers a unica
+    protecao e a condicao de scanned_at no apply e no touch: leitura mais
+    velha que a gravada nao sobrescreve.
+    """
+    with ExitStack() as stack:
+        for key in sorted(set(keys), key=lambda k: (k[0], _port_key(k[1]))):
+            stack.enter_context(_lock_for(key))
+        yield
+
+
+def _group(rows, value):
+    data = {}
+    for row in sorted(rows, key=lambda r: (r.olt_ip, _port_key(r.port))):
+        data.setdefault(row.olt_ip, []).append(value(row))
+    return data
+
+
+def load(olt_ip=None, port=None):
+    """Estado do monitor no formato {olt_ip: [porta, ...]}, com o scanned_at de cada porta."""
+    query = OLTPortStatus.query
+    if olt_ip:
+        query = query.filter_by(olt_ip=olt_ip)
+    if port:
+        query = query.filter_by(port=port)
+    return _group(query.all(), lambda row: row.to_dict())
+
+
+def olt_ports(olt_ip):
+    """Portas gravadas de uma OLT, como o scan as produziu (sem scanned_at)."""
+    return _group(OLTPortStatus.query.filter_by(olt_ip=olt_ip).all(), lambda row: row.data).get(olt_ip, [])
+
+
+def port_status(olt_ip, port):
+    """Uma porta gravada, como o scan a produziu, ou None."""
+    row = OLTPortStatus.query.filter_by(olt_ip=olt_ip, port=port).first()
+    return row.data if row else None
+
+
+def olt_ips():
+    return [ip for (ip,) in db.session.query(OLTPortStatus.olt_ip).distinct()]
+
+
+def updated_at():
+    return db.session.query(func.max(OLTPortStatus.scanned_at)).scalar()
+
+
+def apply(changes, scanned_at=None):
+    """Aplica as mudancas de monitor_delta.diff_snapshot nas linhas; o commit fica com quem chama.
+
+    So as portas que mudaram sao escritas (o scanned_at das demais fica com
+    touch), e cada uma com um UPDATE condicional:
+    se outro processo ja gravou uma leitura mais nova que scanned_at (ex:
+    refresh-port durante o scan), a porta fica como esta. Retorna as mudancas
+    que foram de fato aplicadas, que sao as que devem ser publicadas.
+    """
+    scanned_at = scanned_at or datetime.utcnow()
+    older = or_(OLTPortStatus.scanned_at.is_(None), OLTPortStatus.scanned_at <= scanned_at)
+
+    ports_by_olt = {}
+    for change in changes:
+        if change['op'] != 'remove_olt':
+            ports_by_olt.setdefault(change['olt'], set()).add(change['port'])
+    rows = {}
+    for olt_ip, ports in ports_by_olt.items():
+        for row in OLTPortStatus.query.filter(OLTPortStatus.olt_ip == olt_ip, OLTPortStatus.port.in_(ports)).all():
+            rows[(row.olt_ip, row.port)] = row
+
+    applied = []
+    for change in changes:
+        olt_ip = change['olt']
+        if change['op'] == 'remove_olt':
+            OLTPortStatus.query.filter_by(olt_ip=olt_ip).delete(synchronize_session=False)
+            applied.append(change)
+            continue
+        row = rows.get((olt_ip, change['port']))
+        if change['op'] == 'remove':
+            if row and OLTPortStatus.query.filter(OLTPortStatus.id == row.id, older).delete(synchronize_session=False):
+                applied.append(change)
+            continue
+        if not row:
+            row = OLTPortStatus(olt_ip=olt_ip, port=change['port'], data=change['value'], scanned_at=scanned_at)
+            db.session.add(row)
+            rows[(olt_ip, change['port'])] = row
+            applied.append(change)
+            continue
+        updated = OLTPortStatus.query.filter(OLTPortStatus.id == row.id, older).update(
+            {'data': change['value'], 'scanned_at': scanned_at}, synchronize_session=False)
+        if updated:
+            applied.append(change)
+    return applied
+
+
+def touch(olt_ports, scanned_at):
+    """Marca scanned_at nas portas lidas ({olt_ip: [porta, ...]}) com um UPDATE so; o commit fica com quem chama.
+
+    E o que mostra que uma porta sem mudanca continua sendo lida: o conteudo
+    nao e reescrito, e porta com leitura mais nova que scanned_at fica como esta.
+    """
+    scanned = [
+        and_(OLTPortStatus.olt_ip == olt_ip, OLTPortStatus.port.in_(ports))
+        for olt_ip, ports in olt_ports.items() if ports
+    ]
+    if not scanned:
+        return 0
+    return OLTPortStatus.query.filter(
+        or_(*scanned),
+        or_(OLTPortStatus.scanned_at.is_(None), OLTPortStatus.scanned_at < scanned_at),
+    ).update({'scanned_at': scanned_at}, synchronize_session=False)
+
+
+# Valores da coluna Admin State; no snapshot antigo eles aparecem em phase_state
+_ADMIN_VALUES = ('enable', 'disable')
+
+
+def _legacy_columns(value):
+    """Porta do snapshot antigo com os estados na ordem do cabecalho do state.
+
+    O parser antigo lia Admin/OMCC/Phase State como phase/admin/omcc. Sem
+    converter, o primeiro scan veria todas as ONUs mudarem de phase_state
+    (ex: 'enable' -> 'working') e gravaria uma transicao falsa para cada uma.
+    """
+    onus = []
+    for onu in value.get('onus') or []:
+        if isinstance(onu, dict) and str(onu.get('phase_state', '')).lower() in _ADMIN_VALUES:
+            onu = dict(onu, admin_state=onu.get('phase_state'), omcc_state=onu.get('admin_state'),
+                       phase_state=onu.get('omcc_state'))
+        onus.append(onu)
+    return dict(value, onus=onus)
+
+
+def import_legacy():
+    """Copia o snapshot antigo de olt_monitor_data para as linhas por porta, uma vez."""
+    if OLTPortStatus.query.first():
+        return 0
+    legacy = OLTMonitorData.query.order_by(OLTMonitorData.id.desc()).first()
+    if not legacy or not isinstance(legacy.data, dict):
+        return 0
+    count = 0
+    for olt_ip, ports in legacy.data.items():
+        for value in ports or []:
+            if isinstance(value, dict) and value.get('port'):
+                db.session.add(OLTPortStatus(olt_ip=olt_ip, port=value['port'], data=_legacy_columns(value),
+                                             scanned_at=legacy.updated_at))
+                count += 1
+    db.session.commit()
+    return count
@@ -0,0 +1,150 @@
+import os
+import socket
+import threading
+import time
+from utils.session_pool import OLT_TELNET_PORT
+
+OLT_BREAKER_THRESHOLD = int(os.environ.get('OLT_BREAKER_THRESHOLD', 2))
+OLT_BREAKER_COOLDOWN = int(os.environ.get('OLT_BREAKER_COOLDOWN', 30))
+OLT_BREAKER_PROBE_TIMEOUT = float(os.environ.get('OLT_BREAKER_PROBE_TIMEOUT', 1))
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class _HostHealth:
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0
+        self.trial_started_at = 0
+        self.last_error = None
+        self.last_change = time.time()
+
+
+class CircuitOpen(Exception):
+    """A OLT nao aceitou a conexao agora (circuito aberto ou teste do half_open ja em uso)."""
+
+
+class OLTHealth:
+    """Circuit breaker por OLT, alimentado pelo resultado das conexoes.
+
+    closed: tudo normal. Apos OLT_BREAKER_THRESHOLD falhas seguidas de conexao
+    vai para open e as buscas pulam a OLT na hora, sem esperar o timeout de 5 s.
+    Passado o cooldown, um probe TCP barato na porta telnet (em background)
+    decide se ela volta (half_open libera uma conexao de teste) ou continua aberta.
+    """
+
+    def __init__(self, threshold=OLT_BREAKER_THRESHOLD, cooldown=OLT_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def _host(self, host):
+        health = self._hosts.get(host)
+        if health is None:
+            health = self._hosts[host] = _HostHealth()
+        return health
+
+    def _set_state(self, host, health, state):
+        if health.state != state:
+            print(f"[HEALTH] OLT {host}: {health.state} -> {state}")
+            health.state = state
+            health.last_change = time.time()
+
+    def probe(self, host):
+        try:
+            with socket.create_connection((host, OLT_TELNET_PORT), timeout=OLT_BREAKER_PROBE_TIMEOUT):
+                return True
+        except OSError:
+            return False
+
+    def allow(self, host, reserve=True):
+        """True se pode conectar na OLT agora.
+
+        Em half_open, reserve=True consome a conexao de teste; reserve=False so
+        verifica, para quem vai repassar a OLT a quem de fato conecta (que chama
+        allow de novo e fica com o teste).
+        """
+        with self._lock:
+            health = self._host(host)
+            if health.state == CLOSED:
+                return True
+
+            now = time.time()
+            if health.state == HALF_OPEN:
+                # Uma conexao de teste por vez; se ela sumir sem resultado, libera outra
+                if now - health.trial_started_at > self.cooldown:
+                    if reserve:
+                        health.trial_started_at = now
+                    return True
+                return False
+
+            if now - health.opened_at < self.cooldown:
+                return False
+            # Reserva o probe (uma thread por OLT) e segue sem esperar por ele
+            health.opened_at = now
+
+        threading.Thread(target=self._probe_and_half_open, args=(host,), daemon=True).start()
+        return False
+
+    def _probe_and_half_open(self, host):
+        if not self.probe(host):
+            return
+        with self._lock:
+            health = self._host(host)
+            if health.state == OPEN:
+                self._set_state(host, health, HALF_OPEN)
+                # trial_started_at antigo: a proxima requisicao vira a conexao de teste
+                health.trial_started_at = 0
+
+    def record_success(self, host):
+        with self._lock:
+            health = self._host(host)
+            health.failures = 0
+            health.last_error = None
+            self._set_state(host, health, CLOSED)
+
+    def record_failure(self, host, error=None):
+        with self._lock:
+            health = self._host(host)
+            health.failures += 1
+            health.last_error = str(error) if error else None
+            if health.state == HALF_OPEN or health.failures >= self.threshold:
+                health.opened_at = time.time()
+                self._set_state(host, health, OPEN)
+
+    def state(self, host):
+        with self._lock:
+            return self._host(host).state
+
+    def split_available(self, olt_data_list):
+        """Separa as OLTs que podem ser consultadas das que estao com o circuito aberto.
+
+        Nao consome o teste do half_open: ele fica para a conexao de verdade.
+        """
+        available = []
+        skipped = []
+        for olt in olt_data_list:
+            if self.allow(olt['ip'], reserve=False):
+                available.append(olt)
+            else:
+                skipped.append({'ip': olt['ip'], 'name': olt.get('name'), 'state': self.state(olt['ip'])})
+        return available, skipped
+
+    def stats(self):
+        with self._lock:
+            return {
+                host: {
+                    'state': health.state,
+                    'failures': health.failures,
+                    'last_error': health.last_error,
+                    'since': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(health.last_change)),
+                }
+                for host, health in sorted(self._hosts.items())
+            }
+
+
+olt_health = OLTHealth()
@@ -1,3 +1,5 @@
+import atexit
+import concurrent.futures
 import threading
 import time
 import json
@@ -6,56 +8,115 @@ import os
 from datetime import datetime
 from netmiko import ConnectHandler
 from database import db
-from models import OLT, SystemConfig, OLTMonitorData
+from utils import olt_registry, onu_index, onu_events, monitor_delta, monitor_store, scan_schedule
+from utils.olt_scheduler import olt_scheduler, PRIORITY_BACKGROUND, SlotTimeout
+from utils.olt_health import olt_health
+from utils.monitor_leader import monitor_leader
+from utils.session_pool import OLT_TELNET_PORT
+
+# Ordem das colunas do `show gpon onu state` na C300/C320:
+# OnuIndex   Admin State  OMCC State  Phase State  Channel
+STATE_COLUMNS = ('admin_state', 'omcc_state', 'phase_state')
+LEGACY_STATE_COLUMNS = ('phase_state', 'admin_state', 'omcc_state')
+ONU_SUMMARY_RE = re.compile(r'(?:ONU Number|Total ONU):\s*(\d+)/?(\d+)?', re.IGNORECASE)
+
+
+def _state_columns(output: str):
+    """Ordem das colunas pelo cabecalho; sem cabecalho mantem a leitura antiga."""
+    header = re.search(r'Admin\s*State.*OMCC\s*State.*Phase\s*State', output, re.IGNORECASE)
+    return STATE_COLUMNS if header else LEGACY_STATE_COLUMNS
+
+
+def parse_onu_state_lines(output: str):
+    """ONUs de um `show gpon onu state` (de uma porta ou da OLT inteira)."""
+    columns = _state_columns(output)
+    onus = []
+
+    # Regex flexível para capturar (Porta/Slot/Pon:ID) e as 3 colunas de estado
+    # Ex: 1/1/1:1    enable       enable      working      1(GPON)
+    for line in output.strip().split('\n'):
+        line = line.strip()
+        if not line: continue
+
+        match = re.search(r'(\d+/\d+/\d+:\d+)\s+(\S+)\s+(\S+)\s+(\S+)(?:\s+(\S+))?', line)
+        if match:
+            onu_id, first, second, third, channel = match.groups()
+            onu = {'onu_id': onu_id}
+            onu.update(zip(columns, (first, second, third)))
+            onu['channel'] = channel or 'N/A'
+            onus.append(onu)
+
+    return onus
+
 
 def parse_onu_state(output: str):
     lines = output.strip().split('\n')
-    onus = []
-    
+
     if len(lines) < 2 or '%Code' in output or '%Error' in output:
         return {'onus': [], 'total': '0/0'}
-    
-    # Regex flexível para capturar (Porta/Slot/Pon:ID) STATUS (Admin) (OMCC) (Phase)
-    # Ex: 1/1/1:1 working enable enable up
-    # Stage 1: Tenta capturar 5 colunas (incluindo Channel/Command)
-    for line in lines:
-        line = line.strip()
-        if not line: continue
-        
-        match_5 = re.search(r'(\d+/\d+/\d+:\d+)\s+(\S+)\s+(\S+)\s+(\S+)\s+(\S+)', line)
-        if match_5:
-            onu_id, phase, admin, omcc, channel = match_5.groups()
-            onus.append({
-                'onu_id': onu_id,
-                'phase_state': phase,
-                'admin_state': admin,
-                'omcc_state': omcc,
-                'channel': channel
-            })
-            continue
 
-        match_4 = re.search(r'(\d+/\d+/\d+:\d+)\s+(\S+)\s+(\S+)\s+(\S+)', line)
-        if match_4:
-            onu_id, phase, admin, omcc = match_4.groups()
-            onus.append({
-                'onu_id': onu_id,
-                'phase_state': phase,
-                'admin_state': admin,
-                'omcc_state': omcc,
-                'channel': 'N/A'
-            })
-            continue
-    
-    onu_num_match = re.search(r'(?:ONU Number|Total ONU):\s*(\d+)/?(\d+)?', output, re.IGNORECASE)
-    
+    onus = parse_onu_state_lines(output)
+
+    onu_num_match = ONU_SUMMARY_RE.search(output)
+    return {'onus': onus, 'total': _port_total(onus, onu_num_match)}
+
+
+def _port_total(onus, summary):
+    """'<ONUs listadas>/<total do resumo>' (sem resumo, o total e o que foi listado)."""
     t_found = len(onus)
-    t_total = "0"
-    if onu_num_match:
-        t_total = onu_num_match.group(2) if onu_num_match.group(2) else onu_num_match.group(1)
+    if summary:
+        t_total = summary.group(2) if summary.group(2) else summary.group(1)
     else:
         t_total = str(t_found)
-    
-    return {'onus': onus, 'total': f"{t_found}/{t_total}"}
+    return f"{t_found}/{t_total}"
+
+
+def parse_bulk_onu_state(output: str, ports):
+    """Separa por porta o `show gpon onu state` da OLT inteira.
+
+    Retorna {porta: {'onus', 'total'}} ou None quando a saida parece cortada
+    (erro, sem o resumo `ONU Number` ou com menos ONUs do que o resumo diz);
+    nesse caso quem chama cai para um comando por porta. O total de cada
+    porta e o mesmo do check_port: vem do resumo da porta quando a OLT
+    imprime um por porta, e com um resumo so no final e o que foi listado.
+    """
+    if not output or '%Code' in output or '%Error' in output:
+        return None
+
+    # Algumas versoes imprimem um resumo por porta, outras um so no final
+    summaries = []
+    port_summaries = {}
+    block = set()
+    for line in output.split('\n'):
+        onu = re.search(r'(\d+/\d+/\d+):\d+', line)
+        if onu:
+            block.add(onu.group(1))
+            continue
+        summary = ONU_SUMMARY_RE.search(line)
+        if summary:
+            summaries.append(summary)
+            if len(block) == 1:
+                port_summaries[block.pop()] = summary
+            block = set()
+    if not summaries:
+        return None
+    expected = sum(int(summary.group(2) or summary.group(1)) for summary in summaries)
+
+    onus = parse_onu_state_lines(output)
+    if len(onus) != expected:
+        return None
+
+    by_port = {port: [] for port in ports}
+    for onu in onus:
+        port = onu['onu_id'].split(':')[0]
+        if port not in by_port:
+            return None
+        by_port[port].append(onu)
+
+    return {
+        port: {'onus': port_onus, 'total': _port_total(port_onus, port_summaries.get(port))}
+        for port, port_onus in by_port.items()
+    }
 
 def check_port(device, port: str, prompt_pattern: str):
     cmd = f"show gpon onu state gpon-olt_{port}"
@@ -69,112 +130,570 @@ def check_port(device, port: str, prompt_pattern: str):
 
     return None
 
-def scan_single_olt(olt_id, univ_user, univ_pass, app, all_results):
+# Sem mudanca na lista de ONUs o inventario da porta e reaproveitado do ciclo
+# anterior; passado esse tempo ele e relido mesmo assim (troca de ONU no mesmo ID)
+OLT_INVENTORY_MAX_AGE = int(os.environ.get('OLT_INVENTORY_MAX_AGE', 6 * 3600))
+# Ate esse numero de ONUs novas o nome vem do detail-info de cada uma; acima disso
+# um unico show running-config sai mais barato
+OLT_INVENTORY_DETAIL_LIMIT = int(os.environ.get('OLT_INVENTORY_DETAIL_LIMIT', 20))
+
+# 0 volta a ler o state porta a porta (um comando por PON) mesmo quando a saida da OLT inteira vem completa
+OLT_BULK_STATE = os.environ.get('OLT_BULK_STATE', '1') != '0'
+
+# Scans simultaneos (threads fixas, reaproveitadas) e prazo de cada scan antes de derrubar a sessao
+OLT_SCAN_WORKERS = int(os.environ.get('OLT_SCAN_WORKERS', 16))
+OLT_SCAN_DEADLINE = int(os.environ.get('OLT_SCAN_DEADLINE', 300))
+_scan_pool = concurrent.futures.ThreadPoolExecutor(max_workers=OLT_SCAN_WORKERS, thread_name_prefix='olt-scan')
+
+# Passo do loop do monitor: o lider dispara as OLTs vencidas e todos repassam os deltas novos
+OLT_MONITOR_TICK = int(os.environ.get('OLT_MONITOR_TICK', 5))
+
+def parse_onu_baseinfo(output: str):
+    """SN e modelo de cada ONU no `show gpon onu baseinfo`: {'1/2/3:4': {'sn': ..., 'type': ...}}."""
+    inventory = {}
+    for match in re.finditer(r'gpon-onu_(\d+/\d+/\d+:\d+)\s+(\S+)\s+\S+\s+(\S+)', output or ''):
+        onu_id, onu_type, auth = match.groups()
+        sn = auth[3:].upper() if auth.upper().startswith('SN:') else None
+        inventory[onu_id] = {'sn': sn, 'type': onu_type}
+    return inventory
+
+def parse_onu_names(output: str):
+    """Nome de cada ONU nos blocos `interface gpon-onu_X` do running-config: {'1/2/3:4': nome}."""
+    names = {}
+    for match in re.finditer(r'^interface gpon-onu_(\S+)\s*$(.*?)^!', output or '', re.MULTILINE | re.DOTALL):
+        name_match = re.search(r'^\s*name\s+(.+?)\s*$', match.group(2), re.MULTILINE)
+        if name_match:
+            names[match.group(1)] = name_match.group(1)
+    return names
+
+def check_port_inventory(device, port: str, prompt_pattern: str):
+    cmd = f"show gpon onu baseinfo gpon-olt_{port}"
+    try:
+        output = device.send_command(cmd, expect_string=prompt_pattern, read_timeout=45)
+        if "OnuIndex" in output or "%Code" in output:
+            return parse_onu_baseinfo(output)
+    except Exception as e:
+        print(f"[DEBUG] Erro ao ler inventario da porta {port} na OLT {device.host}: {str(e)}", flush=True)
+
+    return None
+
+def fetch_onu_names(device, onu_ids, prompt_pattern: str):
+    """Nomes das ONUs pedidas; None se a leitura falhar."""
+    try:
+        if len(onu_ids) > OLT_INVENTORY_DETAIL_LIMIT:
+            output = device.send_command('show running-config', expect_string=prompt_pattern, read_timeout=300)
+            names = parse_onu_names(output)
+            return {onu_id: names.get(onu_id) for onu_id in onu_ids}
+
+        names = {}
+        for onu_id in onu_ids:
+            output = device.send_command(f"show gpon onu detail-info gpon-onu_{onu_id}", expect_string=prompt_pattern, read_timeout=45)
+            name_match = re.search(r'^\s*Name:\s*(.*?)\s*$', output, re.IGNORECASE | re.MULTILINE)
+            names[onu_id] = name_match.group(1) if name_match and name_match.group(1) else None
+        return names
+    except Exception as e:
+        print(f"[DEBUG] Erro ao ler nomes das ONUs na OLT {device.host}: {str(e)}", flush=True)
+        return None
+
+def previous_inventory(port_result):
+    """Inventario reaproveitavel de uma porta do ciclo anterior: {onu_id: entrada} ou None."""
+    if not port_result or not port_result.get('inventory_at'):
+        return None
+    try:
+        age = (datetime.now() - datetime.strptime(port_result['inventory_at'], '%Y-%m-%d %H:%M:%S')).total_seconds()
+    except ValueError:
+        return None
+    if age > OLT_INVENTORY_MAX_AGE:
+        return None
+    return {onu['onu_id']: onu for onu in port_result.get('onus', [])}
+
+def collect_inventory(device, olt_results, previous_ports, prompt_pattern: str, job=None):
+    """Completa as ONUs de cada porta com sn, name e type.
+
+    So as portas cuja lista de ONUs mudou (ou com inventario velho) voltam a
+    OLT; o resto vem do ciclo anterior. Retorna True se o inventario ficou completo.
+    """
+    complete = True
+    need_names = []
+    changed_ports = 0
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    for res in olt_results:
+        if job and job.aborted:
+            return False
+        previous = previous_inventory(previous_ports.get(res['port']))
+        onu_ids = {onu['onu_id'] for onu in res['onus']}
+
+        if previous is not None and set(previous) == onu_ids:
+            for onu in res['onus']:
+                old = previous[onu['onu_id']]
+                onu.update({'sn': old.get('sn'), 'name': old.get('name'), 'type': old.get('type')})
+            res['inventory_at'] = previous_ports[res['port']]['inventory_at']
+            continue
+
+        changed_ports += 1
+        baseinfo = check_port_inventory(device, res['port'], prompt_pattern)
+        if baseinfo is None:
+            complete = False
+            continue
+
+        for onu in res['onus']:
+            info = baseinfo.get(onu['onu_id'], {})
+            old = (previous or {}).get(onu['onu_id'], {})
+            onu.update({'sn': info.get('sn'), 'type': info.get('type')})
+            if old.get('sn') and old.get('sn') == onu['sn']:
+                onu['name'] = old.get('name')
+            else:
+                onu['name'] = None
+                need_names.append(onu)
+        res['inventory_at'] = now
+
+    if need_names and not (job and job.aborted):
+        names = fetch_onu_names(device, [onu['onu_id'] for onu in need_names], prompt_pattern)
+        if names is None:
+            complete = False
+        else:
+            for onu in need_names:
+                onu['name'] = names.get(onu['onu_id'])
+
+    print(f"[MONITOR] Inventario OLT {device.host}: {changed_ports}/{len(olt_results)} portas relidas, {len(need_names)} nomes novos", flush=True)
+    return complete
+
+# Perfis de sessao do netmiko. 'fast' confia na deteccao do prompt (fast_cli, sem
+# sleeps fixos nem read_timeout_override); 'legacy' sao os ajustes antigos, usados
+# nas OLTs em que o fast falhou, ate OLT_FAST_CLI_RETRY segundos depois
+OLT_FAST_CLI = os.environ.get('OLT_FAST_CLI', '1') != '0'
+OLT_FAST_CLI_RETRY = int(os.environ.get('OLT_FAST_CLI_RETRY', 3600))
+CLI_PROFILES = {
+    'fast': {'global_delay_factor': 1, 'fast_cli': True},
+    'legacy': {'fast_cli': False},
+}
+
+_cli_lock = threading.Lock()
+_legacy_until = {}
+
+
+def cli_profile(olt_ip):
+    if not OLT_FAST_CLI:
+        return 'legacy'
+    with _cli_lock:
+        until = _legacy_until.get(olt_ip)
+        if until and time.time() < until:
+            return 'legacy'
+        _legacy_until.pop(olt_ip, None)
+    return 'fast'
+
+
+def record_fast_cli_failure(olt_ip, error):
+    """Sessao no perfil fast falhou depois do login: a OLT volta ao legacy por um tempo."""
+    with _cli_lock:
+        _legacy_until[olt_ip] = time.time() + OLT_FAST_CLI_RETRY
+    print(f"[MONITOR] OLT {olt_ip}: perfil fast falhou ({error}), usando legacy por {OLT_FAST_CLI_RETRY}s.", flush=True)
+
+
+def cli_device_params(olt_ip, username, password, profile, **overrides):
+    params = {
+        'device_type': 'zte_zxros_telnet',
+        'host': olt_ip,
+        'port': OLT_TELNET_PORT,
+        'username': username,
+        'password': password,
+    }
+    params.update(CLI_PROFILES[profile])
+    params.update(overrides)
+    return params
+
+
+def prepare_fast_session(device):
+    """O session_preparation do driver ja acha o prompt e desliga a paginacao; falta o enable."""
+    if not device.check_enable_mode():
+        device.enable()
+
+
+class CliSessionError(Exception):
+    """Falha na sessao depois do login (prompt, paginacao, leitura): a OLT respondeu."""
+
+
+def open_device(device_params):
+    """ConnectHandler que alimenta o circuit breaker da OLT com o resultado da conexao e do login.
+
+    O preparo da sessao (prompt, paginacao) fica fora do breaker: se falhar,
+    sobe como CliSessionError e quem chama decide se troca de perfil.
+    """
+    host = device_params['host']
+    device = ConnectHandler(auto_connect=False, **device_params)
+    try:
+        device._modify_connection_params()
+        device.establish_connection()
+    except Exception as e:
+        olt_health.record_failure(host, e)
+        try:
+            device.disconnect()
+        except Exception:
+            pass
+        raise
+    olt_health.record_success(host)
+    try:
+        device._try_session_preparation()
+    except Exception as e:
+        raise CliSessionError(str(e)) from e
+    return device
+
+class ScanJob:
+    """Prazo de um scan: estourou, a sessao telnet e fechada e o resultado descartado.
+
+    Fechar o socket faz a leitura travada no netmiko falhar na hora, em vez de
+    a thread do pool ficar presa ate o read_timeout de cada comando.
+    """
+
+    def __init__(self, olt_ip, deadline):
+        self.olt_ip = olt_ip
+        self.deadline = deadline
+        self.started_at = time.time()
+        self.aborted = False
+        self._device = None
+        self._lock = threading.Lock()
+        self._timer = threading.Timer(deadline, self.abort)
+        self._timer.daemon = True
+
+    def start(self):
+        self._timer.start()
+        return self
+
+    def remaining(self):
+        return max(0, self.deadline - (time.time() - self.started_at))
+
+    def attach(self, device):
+        with self._lock:
+            self._device = device
+            aborted = self.aborted
+        if aborted:
+            self._close(device)
+
+    def abort(self):
+        with self._lock:
+            if self.aborted:
+                return
+            self.aborted = True
+            device = self._device
+        print(f"[MONITOR] OLT {self.olt_ip}: scan passou de {self.deadline}s, encerrando a sessao.", flush=True)
+        if device is not None:
+            self._close(device)
+
+    def _close(self, device):
+        try:
+            device.remote_conn.close()
+        except Exception:
+            pass
+
+    def finish(self):
+        self._timer.cancel()
+
+
+def _scan_device_params(olt, profile):
+    if profile == 'fast':
+        return cli_device_params(olt['ip'], olt['username'], olt['password'], profile, conn_timeout=60)
+    return cli_device_params(
+        olt['ip'], olt['username'], olt['password'], profile,
+        global_delay_factor=2.0, conn_timeout=60, read_timeout_override=120,
+    )
+
+
+def _scan_session(olt, profile, inventories=None, previous_ports=None, job=None):
+    """Uma sessao de scan no perfil dado. Retorna (olt_results, inventory_complete).
+
+    Falha depois do login sobe como CliSessionError; fila cheia, conexao e
+    login sobem como estao.
+    """
+    olt_results = []
+    inventory_complete = False
+    # Scan espera atras das requisicoes dos tecnicos na fila da OLT
+    slot_timeout = job.remaining() if job else 600
+    device_params = _scan_device_params(olt, profile)
+    with olt_scheduler.slot(olt['ip'], PRIORITY_BACKGROUND, timeout=slot_timeout, pooled=False), \
+            open_device(device_params) as device:
+        if job:
+            job.attach(device)
+        try:
+            olt_results, inventory_complete = _scan_ports(device, olt, profile, inventories, previous_ports, job)
+        except Exception as e:
+            raise CliSessionError(str(e)) from e
+    return olt_results, inventory_complete
+
+
+def _scan_ports(device, olt, profile, inventories, previous_ports, job):
+    olt_results = []
+    inventory_complete = False
+    active_pattern = r'[>#\\]' 
+
+    if profile == 'fast':
+        prepare_fast_session(device)
+    else:
+        try:
+            device.write_channel('\n')
+            time.sleep(2)
+            device.enable() 
+        except:
+            pass
+        device.send_command('terminal length 0', expect_string=active_pattern, read_timeout=60)
+    
+    sh_onu = device.send_command('show gpon onu state', expect_string=active_pattern, read_timeout=300)
+    
+    found_ports = re.findall(r'(?:gpon-olt_)?(\d+/\d+/\d+)', sh_onu)
+    unique_ports = sorted(list(set(found_ports))) or []
+    print(f"[DEBUG] OLT {olt['ip']} - Portas detectadas: {len(unique_ports)}", flush=True)
+
+    # A saida sem argumentos ja tem todas as portas: um comando em vez de N+1
+    bulk = parse_bulk_onu_state(sh_onu, unique_ports) if OLT_BULK_STATE else None
+    if bulk is not None:
+        olt_results = [dict(port=port, **bulk[port]) for port in unique_ports]
+    else:
+        if OLT_BULK_STATE:
+            print(f"[MONITOR] OLT {olt['ip']}: saida do state incompleta, lendo porta a porta.", flush=True)
+        for port in unique_ports:
+            if job and job.aborted:
+                break
+            res = check_port(device, port, active_pattern)
+            if res:
+                olt_results.append(res)
+
+    if inventories is not None:
+        inventory_complete = collect_inventory(device, olt_results, previous_ports or {}, active_pattern, job=job)
+        # Porta que falhou no state nao entrou em olt_results: o indice nao pode podar as ONUs dela
+        inventory_complete = inventory_complete and len(olt_results) == len(unique_ports)
+    return olt_results, inventory_complete
+
+
+def scan_single_olt(olt, app, all_results, inventories=None, previous_ports=None, job=None):
+    """Le o estado de todas as portas de uma OLT. Retorna None se deu certo ou a mensagem de erro.
+
+    Se o perfil fast falhar depois do login, o scan e repetido no legacy.
+    Fila cheia, conexao e login contam no circuit breaker e nao trocam de perfil.
+    """
     with app.app_context():
-        olt = OLT.query.with_entities(OLT.id, OLT.name, OLT.ip, OLT.username, OLT.password).filter_by(id=olt_id).first()
-        if not olt: return
-        
-        user = olt.username if olt.username else univ_user
-        pwd = olt.password if olt.password else univ_pass
+        user = olt['username']
+        pwd = olt['password']
         if not user or not pwd:
-            return
-
-        print(f"[MONITOR] Iniciando Scan OLT {olt.name} ({olt.ip})...", flush=True)
-        device_params = {
-            'device_type': 'zte_zxros_telnet',
-            'host': olt.ip,
-            'username': user,
-            'password': pwd,
-            'global_delay_factor': 2.0,
-            'conn_timeout': 60, 
-            'fast_cli': False,
-            'read_timeout_override': 120,
-        }
+            return "OLT sem credenciais"
+
+        if not olt_health.allow(olt['ip']):
+            print(f"[MONITOR] OLT {olt['ip']} indisponivel (circuit breaker aberto), pulando scan.", flush=True)
+            return "circuit breaker aberto"
+
+        profile = cli_profile(olt['ip'])
+        while True:
+            print(f"[MONITOR] Iniciando Scan OLT {olt['name']} ({olt['ip']}, perfil {profile})...", flush=True)
+            try:
+                olt_results, inventory_complete = _scan_session(olt, profile, inventories, previous_ports, job)
+                break
+            except Exception as e:
+                if job and job.aborted:
+                    return f"scan passou do prazo de {job.deadline}s"
+                print(f"[MONITOR] Erro OLT {olt['ip']}: {str(e)}", flush=True)
+                if isinstance(e, SlotTimeout):
+                    # Conexao e login ja contam em open_device
+                    olt_health.record_failure(olt['ip'], e)
+                if profile != 'fast' or not isinstance(e, CliSessionError):
+                    return str(e)
+                record_fast_cli_failure(olt['ip'], e)
+                profile = 'legacy'
+            finally:
+                db.session.remove()
 
+        if job and job.aborted:
+            return f"scan passou do prazo de {job.deadline}s"
+        
+        with threading.Lock():
+            all_results[olt['ip']] = sorted(olt_results, key=lambda x: x['port'])
+            if inventories is not None:
+                sn_index = {
+                    onu['sn']: f"gpon-onu_{onu['onu_id']}"
+                    for res in olt_results for onu in res['onus'] if onu.get('sn')
+                }
+                inventories[olt['ip']] = (sn_index, inventory_complete)
+        
+        total_onus = sum(len(r['onus']) for r in olt_results)
+        print(f"[MONITOR] OLT {olt['ip']} finalizada com sucesso. Portas: {len(olt_results)}, ONUs: {total_onus}", flush=True)
+        return None
+
+def _phase_signature(port_result):
+    return sorted((onu.get('onu_id'), onu.get('phase_state')) for onu in port_result.get('onus', []))
+
+
+_MISSING = object()
+
+
+def _port_churn(old_port, new_port):
+    """Fracao das ONUs da porta que mudaram de estado, apareceram ou sumiram."""
+    if old_port is None:
+        return 1.0
+    old = dict(_phase_signature(old_port))
+    new = dict(_phase_signature(new_port))
+    ids = set(old) | set(new)
+    if not ids:
+        return 0.0
+    return sum(1 for onu_id in ids if old.get(onu_id, _MISSING) != new.get(onu_id, _MISSING)) / len(ids)
+
+
+def state_churn(old_ports, new_ports):
+    """Churn da porta mais agitada da OLT (0 a 1).
+
+    Vai pela pior porta e nao pela fracao de portas: uma PON instavel em
+    uma OLT de 16 portas ja tem que trazer o scan para perto do minimo.
+    """
+    old_by_port = {res.get('port'): res for res in old_ports or [] if isinstance(res, dict)}
+    return max((_port_churn(old_by_port.get(res.get('port')), res) for res in new_ports or []), default=0.0)
+
+
+def merge_snapshot(socketio_instance, olt_ports=None, removed_olts=(), scanned_at=None):
+    """Troca as portas de algumas OLTs no estado gravado e publica so o que mudou.
+
+    scanned_at e quando a leitura comecou: porta atualizada depois disso (ex:
+    refresh-port durante o scan) nao e sobrescrita com o dado mais velho.
+    """
+    olt_ports = olt_ports or {}
+    olt_ips = list(olt_ports) + list(removed_olts)
+    scanned_at = scanned_at or datetime.utcnow()
+    keys = [(olt_ip, res.get('port')) for olt_ip, ports in olt_ports.items() for res in ports]
+    for olt_ip in olt_ips:
+        keys.extend((olt_ip, res.get('port')) for res in monitor_store.olt_ports(olt_ip))
+
+    with monitor_store.port_locks(keys):
+        current = {olt_ip: monitor_store.olt_ports(olt_ip) for olt_ip in olt_ips}
+        updated = {olt_ip: ports for olt_ip, ports in current.items() if olt_ip not in removed_olts}
+        updated.update(olt_ports)
+
+        diff = monitor_delta.diff_snapshot(current, updated)
+        scanned = {olt_ip: [res.get('port') for res in ports] for olt_ip, ports in olt_ports.items()}
+        events = {'count': 0}
+
+        def write():
+            applied = monitor_store.apply(diff, scanned_at)
+            # Portas lidas sem mudanca so ganham o scanned_at novo
+            monitor_store.touch(scanned, scanned_at)
+            events['count'] = onu_events.record(applied, current, scanned_at)
+            return applied
+
+        # Ainda com as portas travadas: a ordem dos deltas e a mesma das gravacoes
+        changes, seq = monitor_delta.publish(write, socketio_instance)
+
+    if not changes:
+        return 0
+    print(f"[MONITOR] {len(changes)} porta(s) alterada(s) no estado, {events['count']} transicao(oes) de ONU (seq {seq}).", flush=True)
+    return len(changes)
+
+
+def scan_and_publish(olt, app, socketio_instance):
+    """Scan de uma OLT na agenda dela: grava as portas no snapshot e agenda o proximo."""
+    with app.app_context():
+        start_time = time.time()
+        scan_started_at = datetime.utcnow()
+        results = {}
+        inventories = {}
+        error = None
+        churn = 0.0
         try:
-            olt_results = []
-            with ConnectHandler(**device_params) as device:
-                try:
-                    device.write_channel('\n')
-                    time.sleep(2)
-                    device.enable() 
-                except:
-                    pass
-                
-                active_pattern = r'[>#\\]' 
-                
-                device.send_command('terminal length 0', expect_string=active_pattern, read_timeout=60)
-                
-                sh_onu = device.send_command('show gpon onu state', expect_string=active_pattern, read_timeout=300)
-                
-                found_ports = re.findall(r'(?:gpon-olt_)?(\d+/\d+/\d+)', sh_onu)
-                unique_ports = sorted(list(set(found_ports))) or []
-                print(f"[DEBUG] OLT {olt.ip} - Portas detectadas: {len(unique_ports)}", flush=True)
-
-                for port in unique_ports:
-                    res = check_port(device, port, active_pattern)
-                    if res:
-                        olt_results.append(res)
-            
+            # Inventario das portas sem mudanca vem do snapshot anterior
+            old_ports = monitor_store.olt_ports(olt['ip'])
             db.session.remove()
-            
-            with threading.Lock():
-                all_results[olt.ip] = sorted(olt_results, key=lambda x: x['port'])
-            
-            total_onus = sum(len(r['onus']) for r in olt_results)
-            print(f"[MONITOR] OLT {olt.ip} finalizada com sucesso. Portas: {len(olt_results)}, ONUs: {total_onus}", flush=True)
+            previous_ports = {res.get('port'): res for res in old_ports if isinstance(res, dict)}
+
+            job = ScanJob(olt['ip'], OLT_SCAN_DEADLINE).start()
+            try:
+                error = scan_single_olt(olt, app, results, inventories, previous_ports, job=job)
+            finally:
+                job.finish()
+            if error is None and not monitor_leader.is_leader():
+                # Perdeu o lease durante o scan: o novo lider e quem grava
+                print(f"[MONITOR] Lease perdido durante o scan de {olt['ip']}, descartando resultado.", flush=True)
+                return
+
+            if error is None:
+                ports = results.get(olt['ip'], [])
+                churn = state_churn(old_ports, ports)
+                merge_snapshot(socketio_instance, {olt['ip']: ports}, scanned_at=scan_started_at)
+
+                # Indice SN -> OLT usado pelo /locate; inventario parcial so acrescenta entradas
+                if olt['ip'] in inventories:
+                    inventory, complete = inventories[olt['ip']]
+                    try:
+                        summary = onu_index.replace_olt(olt['ip'], inventory, prune=complete)
+                        print(f"[MONITOR] Indice de SNs {olt['ip']}: {summary}", flush=True)
+                    except Exception as e:
+                        db.session.rollback()
+                        print(f"[MONITOR] Erro ao atualizar indice de SNs {olt['ip']}: {str(e)}", flush=True)
         except Exception as e:
-            print(f"[MONITOR] Erro OLT {olt.ip}: {str(e)}", flush=True)
+            db.session.rollback()
+            error = str(e)
+            print(f"[MONITOR] Erro ao gravar scan de {olt['ip']}: {error}", flush=True)
+        finally:
+            duration = time.time() - start_time
+            try:
+                interval = scan_schedule.record_scan(olt['ip'], duration, error=error, churn=churn)
+                print(f"[MONITOR] OLT {olt['ip']}: scan em {int(duration)}s, churn da pior porta {churn:.0%}, "
+                      f"proximo em ~{int(interval)}s.", flush=True)
+            except Exception as e:
+                db.session.rollback()
+                print(f"[MONITOR] Erro ao agendar {olt['ip']}: {str(e)}", flush=True)
+            db.session.remove()
+
+
+def prune_removed_olts(olts, socketio_instance):
+    """Tira do snapshot e da agenda as OLTs que sairam do cadastro."""
+    known = {olt['ip'] for olt in olts}
+    removed = [ip for ip in monitor_store.olt_ips() if ip not in known]
+    if removed:
+        merge_snapshot(socketio_instance, removed_olts=removed)
+        scan_schedule.forget(removed)
+
 
 def monitor_olts_task(app, socketio_instance):
     with app.app_context():
-        print("[MONITOR] Iniciando monitoramento MULTITHREAD...", flush=True)
-        
+        print("[MONITOR] Iniciando monitoramento por OLT...", flush=True)
+
+        # Cada OLT tem a propria agenda: a lenta ou travada nao segura as outras.
+        # No maximo OLT_SCAN_WORKERS scans ao mesmo tempo; as vencidas esperam a vez
+        running = {}
+        last_prune = 0
         while True:
             try:
-                start_time = time.time()
-                olts = OLT.query.all()
-                all_results = {}
-
-                u_user_cfg = SystemConfig.query.filter_by(key='universal_username').first()
-                u_pass_cfg = SystemConfig.query.filter_by(key='universal_password').first()
-                u_user = u_user_cfg.value if u_user_cfg else None
-                u_pass = u_pass_cfg.value if u_pass_cfg else None
-
-                threads = []
-                for olt in olts:
-                    t = threading.Thread(target=scan_single_olt, args=(olt.id, u_user, u_pass, app, all_results))
-                    t.start()
-                    threads.append(t)
-                
-                for t in threads:
-                    t.join(timeout=600)
-
-                final_data = {
-                    'updated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                    'data': all_results
-                }
+                if monitor_leader.is_leader():
+                    olts = olt_registry.get_olts()
+                    for olt_ip, future in list(running.items()):
+                        if future.done():
+                            running.pop(olt_ip)
+
+                    free = OLT_SCAN_WORKERS - len(running)
+                    for olt in scan_schedule.due(olts, running, limit=free) if free > 0 else []:
+                        running[olt['ip']] = _scan_pool.submit(scan_and_publish, olt, app, socketio_instance)
 
-                latest_status = OLTMonitorData.query.first()
-                if not latest_status:
-                    latest_status = OLTMonitorData(data=all_results)
-                    db.session.add(latest_status)
-                else:
-                    latest_status.data = all_results
-                    latest_status.updated_at = datetime.utcnow()
-                
-                db.session.commit()
-                socketio_instance.emit('olt_update', final_data)
-                print(f"[MONITOR] Ciclo finalizado em {int(time.time() - start_time)}s.", flush=True)
+                    if time.time() - last_prune >= scan_schedule.OLT_MONITOR_INTERVAL:
+                        prune_removed_olts(olts, socketio_instance)
+                        onu_events.prune()
+                        last_prune = time.time()
+
+                # Deltas gravados por outros workers (scans do lider, refresh-port) chegam aqui
+                monitor_delta.relay(socketio_instance)
+                db.session.remove()
 
             except Exception as e:
                 db.session.rollback()
                 print(f"[MONITOR] Erro critico: {str(e)}", flush=True)
-            time.sleep(120)
+            time.sleep(OLT_MONITOR_TICK)
+
+_monitor_started = False
 
 def start_monitor(app, socketio_instance):
+    global _monitor_started
+    # create_app pode rodar mais de uma vez no mesmo processo (import do app.py + factory do gunicorn)
+    if _monitor_started:
+        print("[MONITOR] Monitor ja iniciado neste processo.")
+        return
+    _monitor_started = True
+
     print("[MONITOR] Criando thread de monitoramento...")
+    monitor_leader.start(app)
+    atexit.register(monitor_leader.release, app)
     thread = threading.Thread(target=monitor_olts_task, args=(app, socketio_instance), daemon=True)
     thread.start()
     print("[MONITOR] Thread disparada com sucesso.")
-
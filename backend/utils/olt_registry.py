@@ -0,0 +1,100 @@
+import os
+import threading
+import time
+from models import OLT, SystemConfig
+
+# Invalidado pelas rotas de CRUD; o TTL cobre alteracoes feitas por outro worker do gunicorn
+OLT_REGISTRY_TTL = int(os.environ.get('OLT_REGISTRY_TTL', 60))
+
+_lock = threading.Lock()
+_state = {
+    'loaded_at': 0,
+    'by_ip': {},
+    'by_id': {},
+    'universal': (None, None),
+}
+
+
+def _load():
+    olts = OLT.query.all()
+
+    u_user_cfg = SystemConfig.query.filter_by(key='universal_username').first()
+    u_pass_cfg = SystemConfig.query.filter_by(key='universal_password').first()
+    univ_user = u_user_cfg.value if u_user_cfg else None
+    univ_pass = u_pass_cfg.value if u_pass_cfg else None
+
+    by_ip = {}
+    by_id = {}
+    for olt in olts:
+        entry = {
+            'id': olt.id,
+            'name': olt.name,
+            'ip': olt.ip,
+            'type': olt.type or 'ZTE',
+            'actions': (olt.actions or '').split(','),
+            'username': olt.username if olt.username else univ_user,
+            'password': olt.password if olt.password else univ_pass,
+        }
+        by_ip[olt.ip] = entry
+        by_id[olt.id] = entry
+
+    _state['by_ip'] = by_ip
+    _state['by_id'] = by_id
+    _state['universal'] = (univ_user, univ_pass)
+    _state['loaded_at'] = time.time()
+    print(f"[REGISTRY] {len(by_ip)} OLTs carregadas em memoria.")
+
+
+def _ensure_loaded():
+    with _lock:
+        if not _state['loaded_at'] or time.time() - _state['loaded_at'] > OLT_REGISTRY_TTL:
+            _load()
+        return _state['by_ip'], _state['by_id']
+
+
+def invalidate():
+    """Descarta o cache; a proxima leitura recarrega OLTs e credenciais do banco."""
+    with _lock:
+        _state['loaded_at'] = 0
+
+
+def get_olts():
+    by_ip, _ = _ensure_loaded()
+    return [dict(entry) for entry in by_ip.values()]
+
+
+def get_olt(ip):
+    by_ip, _ = _ensure_loaded()
+    entry = by_ip.get(ip)
+    return dict(entry) if entry else None
+
+
+def get_olt_by_id(olt_id):
+    _, by_id = _ensure_loaded()
+    entry = by_id.get(olt_id)
+    return dict(entry) if entry else None
+
+
+def get_credentials(ip):
+    """Credenciais da OLT ou, na falta delas (ou de cadastro), as credenciais universais."""
+    entry = get_olt(ip)
+    if entry:
+        return entry['username'], entry['password']
+    with _lock:
+        return _state['universal']
+
+
+def get_olts_with_credentials():
+    results = []
+    for entry in get_olts():
+        if entry['username'] and entry['password']:
+            results.append({
+                'id': entry['id'],
+                'ip': entry['ip'],
+                'name': entry['name'],
+                'username': entry['username'],
+                'password': entry['password']
+            })
+        else:
+            print(f"Skipping OLT {entry['ip']} - Missing credentials")
+    return results
@@ -0,0 +1,156 @@
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from utils.session_pool import OLT_MAX_SESSIONS, session_pool
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+# A cada N segundos na fila um pedido ganha 1 ponto de prioridade, entao o
+# monitor nunca fica parado para sempre atras dos tecnicos (10 pontos = 30 s)
+OLT_SCHEDULER_AGING = float(os.environ.get('OLT_SCHEDULER_AGING', 3))
+OLT_SCHEDULER_TIMEOUT = int(os.environ.get('OLT_SCHEDULER_TIMEOUT', 60))
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: 'interactive',
+    PRIORITY_BACKGROUND: 'background',
+}
+
+
+class _Waiter:
+    def __init__(self, priority, seq):
+        self.priority = priority
+        self.seq = seq
+        self.enqueued_at = time.time()
+
+    def key(self, now):
+        aged = self.priority - (now - self.enqueued_at) / OLT_SCHEDULER_AGING
+        return (max(aged, 0), self.seq)
+
+
+class _HostState:
+    def __init__(self):
+        self.in_use = 0
+        self.waiters = []
+        self.granted = {}
+        self.waits = {}
+
+
+class SlotTimeout(TimeoutError):
+    """Nenhuma vaga livre na OLT dentro do prazo."""
+
+
+class OLTScheduler:
+    """Dono das vagas de sessao (vty) de cada OLT.
+
+    Todo acesso a OLT (telnet do pool, drivers, netmiko do monitor e do
+    refresh-port) pede uma vaga aqui. Se a OLT estiver cheia o pedido entra
+    numa fila por prioridade: requisicoes de tecnicos passam na frente do scan
+    em background, que envelhece na fila para nao sofrer starvation.
+    """
+
+    def __init__(self, slots=OLT_MAX_SESSIONS):
+        self.slots = slots
+        self._cond = threading.Condition()
+        self._hosts = {}
+        self._seq = itertools.count()
+
+    def _host(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState()
+        return state
+
+    def _is_next(self, state, waiter):
+        now = time.time()
+        head = min(state.waiters, key=lambda w: w.key(now))
+        return head is waiter
+
+    def acquire(self, host, priority=PRIORITY_INTERACTIVE, timeout=OLT_SCHEDULER_TIMEOUT):
+        with self._cond:
+            state = self._host(host)
+            waiter = _Waiter(priority, next(self._seq))
+            state.waiters.append(waiter)
+            deadline = waiter.enqueued_at + timeout if timeout is not None else None
+
+            try:
+                while not (state.in_use < self.slots and self._is_next(state, waiter)):
+                    remaining = None if deadline is None else deadline - time.time()
+                    if remaining is not None and remaining <= 0:
+                        print(f"[SCHEDULER] Timeout aguardando vaga em {host} ({PRIORITY_NAMES.get(priority, priority)})")
+                        return False
+                    # Acorda periodicamente para reavaliar o envelhecimento da fila
+                    self._cond.wait(timeout=1 if remaining is None else min(remaining, 1))
+            finally:
+                state.waiters.remove(waiter)
+                self._cond.notify_all()
+
+            state.in_use += 1
+            waited = time.time() - waiter.enqueued_at
+            state.granted[priority] = state.granted.get(priority, 0) + 1
+            state.waits.setdefault(priority, deque(maxlen=200)).append(waited)
+            return True
+
+    def release(self, host):
+        with self._cond:
+            state = self._host(host)
+            state.in_use = max(0, state.in_use - 1)
+            self._cond.notify_all()
+
+    def in_use(self, host):
+        with self._cond:
+            return self._host(host).in_use
+
+    @contextmanager
+    def slot(self, host, priority=PRIORITY_INTERACTIVE, timeout=OLT_SCHEDULER_TIMEOUT, pooled=True):
+        """Reserva uma vaga na OLT durante o bloco; levanta SlotTimeout se nao conseguir.
+
+        pooled=False e para conexoes fora do pool (netmiko): antes de abrir a
+        sessao nova, fecha sessoes ociosas do pool para nao estourar o limite de vty.
+        """
+        if not self.acquire(host, priority, timeout):
+            raise SlotTimeout(f"No free session slot on OLT {host}")
+        try:
+            if not pooled:
+                session_pool.close_idle(host, keep=self.slots - self.in_use(host))
+            yield
+        finally:
+            self.release(host)
+
+    def stats(self):
+        now = time.time()
+        with self._cond:
+            result = {}
+            for host, state in sorted(self._hosts.items()):
+                queued = {}
+                oldest = 0
+                for waiter in state.waiters:
+                    name = PRIORITY_NAMES.get(waiter.priority, str(waiter.priority))
+                    queued[name] = queued.get(name, 0) + 1
+                    oldest = max(oldest, now - waiter.enqueued_at)
+
+                waits = {}
+                for priority, samples in state.waits.items():
+                    ordered = sorted(samples)
+                    waits[PRIORITY_NAMES.get(priority, str(priority))] = {
+                        'granted': state.granted.get(priority, 0),
+                        'avg_wait': round(sum(ordered) / len(ordered), 3),
+                        'p95_wait': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+                        'max_wait': round(ordered[-1], 3),
+                    }
+
+                result[host] = {
+                    'slots': self.slots,
+                    'in_use': state.in_use,
+                    'queue_depth': len(state.waiters),
+                    'queued': queued,
+                    'oldest_wait': round(oldest, 3),
+                    'waits': waits,
+                }
+            return result
+
+
+olt_scheduler = OLTScheduler()
@@ -0,0 +1,100 @@
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.orm import aliased
+from database import db
+from models import ONUStateEvent
+
+# Eventos mais antigos que isso sao apagados pelo monitor
+ONU_EVENT_RETENTION_DAYS = int(os.environ.get('ONU_EVENT_RETENTION_DAYS', 90))
+ONU_EVENT_QUERY_LIMIT = 1000
+
+
+def _states(port_result):
+    return {onu.get('onu_id'): onu.get('phase_state') for onu in (port_result or {}).get('onus', []) if onu.get('onu_id')}
+
+
+def transitions(old_port, new_port):
+    """[(onu_id, estado_antigo, estado_novo)] das ONUs que mudaram entre duas leituras da porta."""
+    old_states = _states(old_port)
+    new_states = _states(new_port)
+    found = []
+    for onu_id, state in new_states.items():
+        if old_states.get(onu_id) != state:
+            found.append((onu_id, old_states.get(onu_id), state))
+    for onu_id, state in old_states.items():
+        if onu_id not in new_states:
+            found.append((onu_id, state, None))
+    return found
+
+
+def record(changes, old_data, created_at=None):
+    """Grava as transicoes das portas alteradas; o commit fica com quem chama.
+
+    changes sao os upserts de monitor_delta.diff_snapshot, entao so as portas
+    que mudaram sao comparadas, ONU a ONU. Porta sem leitura anterior (OLT ou
+    porta nova) nao gera eventos, para o primeiro scan nao despejar o parque inteiro.
+    """
+    created_at = created_at or datetime.utcnow()
+    old_ports = {
+        (olt_ip, res.get('port')): res
+        for olt_ip, ports in old_data.items() for res in ports or [] if isinstance(res, dict)
+    }
+    events = []
+    for change in changes:
+        if change['op'] != 'upsert':
+            continue
+        old_port = old_ports.get((change['olt'], change['port']))
+        if old_port is None:
+            continue
+        for onu_id, old_state, new_state in transitions(old_port, change['value']):
+            events.append({
+                'olt_ip': change['olt'],
+                'port': change['port'],
+                'onu_id': onu_id,
+                'old_state': old_state,
+                'new_state': new_state,
+                'created_at': created_at,
+            })
+    if events:
+        db.session.bulk_insert_mappings(ONUStateEvent, events)
+    return len(events)
+
+
+def query(olt_ip=None, port=None, onu_id=None, state=None, since=None, until=None, limit=ONU_EVENT_QUERY_LIMIT):
+    """Eventos mais recentes primeiro, cada um com ended_at/duration ate a proxima transicao da ONU."""
+    following = aliased(ONUStateEvent)
+    ended_at = db.session.query(func.min(following.created_at)).filter(
+        following.olt_ip == ONUStateEvent.olt_ip,
+        following.onu_id == ONUStateEvent.onu_id,
+        following.created_at > ONUStateEvent.created_at,
+    ).scalar_subquery()
+
+    rows = db.session.query(ONUStateEvent, ended_at)
+    if olt_ip:
+        rows = rows.filter(ONUStateEvent.olt_ip == olt_ip)
+    if port:
+        rows = rows.filter(ONUStateEvent.port == port)
+    if onu_id:
+        rows = rows.filter(ONUStateEvent.onu_id == onu_id)
+    if state:
+        rows = rows.filter(ONUStateEvent.new_state == state)
+    if since:
+        rows = rows.filter(ONUStateEvent.created_at >= since)
+    if until:
+        rows = rows.filter(ONUStateEvent.created_at < until)
+
+    events = []
+    for event, end in rows.order_by(ONUStateEvent.created_at.desc(), ONUStateEvent.id.desc()).limit(limit):
+        result = event.to_dict()
+        result['ended_at'] = end.isoformat() if end else None
+        result['duration'] = round((end - event.created_at).total_seconds()) if end else None
+        events.append(result)
+    return events
+
+
+def prune():
+    cutoff = datetime.utcnow() - timedelta(days=ONU_EVENT_RETENTION_DAYS)
+    removed = ONUStateEvent.query.filter(ONUStateEvent.created_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
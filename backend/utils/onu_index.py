@@ -0,0 +1,114 @@
+import os
+from datetime import datetime, timedelta
+from database import db
+from models import ONULocation
+
+# Entradas nao vistas pelo monitor nem confirmadas por uma busca ha mais que isso
+# sao ignoradas e a busca volta a consultar todas as OLTs
+ONU_INDEX_MAX_AGE = int(os.environ.get('ONU_INDEX_MAX_AGE', 3600))
+
+# Limite de parametros por IN (...) no SQLite
+_CHUNK = 500
+
+
+def _chunks(items):
+    items = list(items)
+    for i in range(0, len(items), _CHUNK):
+        yield items[i:i + _CHUNK]
+
+
+def _normalize(sn):
+    # O monitor grava o SN como a OLT mostra (maiusculo); a busca pode chegar digitada em minusculo
+    return str(sn).strip().upper()
+
+
+def _is_fresh(row):
+    return row.last_seen and datetime.utcnow() - row.last_seen <= timedelta(seconds=ONU_INDEX_MAX_AGE)
+
+
+def lookup(sns):
+    """{sn: {'sn', 'olt_ip', 'interface', 'last_seen'}} para os SNs com entrada recente no indice.
+
+    As chaves vem em maiusculo, como o SN fica gravado.
+    """
+    found = {}
+    for chunk in _chunks({_normalize(sn) for sn in sns}):
+        for row in ONULocation.query.filter(ONULocation.sn.in_(chunk)).all():
+            if _is_fresh(row):
+                found[row.sn] = row.to_dict()
+    return found
+
+
+def record(locations):
+    """Grava (ou move) os SNs para as posicoes confirmadas agora: {sn: (olt_ip, interface)}."""
+    if not locations:
+        return
+    locations = {_normalize(sn): position for sn, position in locations.items()}
+    rows = {}
+    for chunk in _chunks(locations):
+        for row in ONULocation.query.filter(ONULocation.sn.in_(chunk)).all():
+            rows[row.sn] = row
+
+    now = datetime.utcnow()
+    for sn, (olt_ip, interface) in locations.items():
+        row = rows.get(sn)
+        if not row:
+            row = ONULocation(sn=sn)
+            db.session.add(row)
+        row.olt_ip = olt_ip
+        row.interface = interface
+        row.last_seen = now
+    db.session.commit()
+
+
+def forget(sns):
+    """Remove SNs que nao foram encontrados em nenhuma OLT."""
+    for chunk in _chunks({_normalize(sn) for sn in sns}):
+        ONULocation.query.filter(ONULocation.sn.in_(chunk)).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def replace_olt(olt_ip, entries, prune=True):
+    """Atualiza o indice com o inventario {sn: interface} lido de uma OLT pelo monitor.
+
+    Com prune=True (inventario completo) os SNs que estavam nesta OLT e nao
+    apareceram mais saem do indice; com inventario parcial so faz upsert.
+    """
+    now = datetime.utcnow()
+    existing = {row.sn: row for row in ONULocation.query.filter_by(olt_ip=olt_ip).all()}
+
+    # SNs que estavam indexados em outra OLT (ONU trocou de OLT)
+    moved = [sn for sn in entries if sn not in existing]
+    for chunk in _chunks(moved):
+        for row in ONULocation.query.filter(ONULocation.sn.in_(chunk)).all():
+            existing[row.sn] = row
+
+    added = 0
+    for sn, interface in entries.items():
+        row = existing.get(sn)
+        if not row:
+            row = ONULocation(sn=sn)
+            db.session.add(row)
+            added += 1
+        row.olt_ip = olt_ip
+        row.interface = interface
+        row.last_seen = now
+
+    removed = 0
+    if prune:
+        for sn, row in existing.items():
+            if sn not in entries and row.olt_ip == olt_ip:
+                db.session.delete(row)
+                removed += 1
+
+    db.session.commit()
+    return {'indexed': len(entries), 'added': added, 'removed': removed}
+
+
+def stats():
+    fresh_since = datetime.utcnow() - timedelta(seconds=ONU_INDEX_MAX_AGE)
+    return {
+        'entries': ONULocation.query.count(),
+        'fresh': ONULocation.query.filter(ONULocation.last_seen >= fresh_since).count(),
+        'max_age': ONU_INDEX_MAX_AGE,
+    }
@@ -0,0 +1,33 @@
+import re
+
+# Ultima linha do buffer terminando em '>' ou '#' (ex: b"OLT-NAME>" logo apos o login)
+SHELL_PROMPT_RE = re.compile(rb"(?:^|[\r\n])([^\r\n]*?)([>#])[ \t]*$")
+# Usado quando nao foi possivel aprender o hostname: ao menos exige '#' no fim do buffer
+GENERIC_PROMPT_RE = re.compile(rb"#[ \t]*$")
+
+
+def build_prompt_re(hostname):
+    """Prompt privilegiado exato da OLT, ancorado no inicio da linha e no fim do buffer.
+
+    Aceita o sufixo de modo de configuracao, ex: OLT-NAME#, OLT-NAME(config)#,
+    OLT-NAME(config-if-gpon-onu-1/1/1:1)#. Um '#' no meio da saida nao casa.
+    """
+    if isinstance(hostname, str):
+        hostname = hostname.encode('ascii', errors='ignore')
+    return re.compile(rb"(?:^|[\r\n])" + re.escape(hostname) + rb"(\([^)\r\n]*\))?#[ \t]*$")
+
+
+def prompt_from_output(data):
+    """Aprende o prompt a partir da ultima linha lida apos o enable (ex: b'...\\r\\nOLT-NAME#')."""
+    match = SHELL_PROMPT_RE.search(data or b"")
+    if match and match.group(2) == b"#":
+        hostname = re.sub(rb"\([^)]*\)$", b"", match.group(1).strip())
+        if hostname:
+            return build_prompt_re(hostname)
+    return GENERIC_PROMPT_RE
+
+
+def read_until_prompt(tn, prompt_re, timeout=10):
+    """Le da sessao telnet ate o prompt aparecer. Retorna (bytes, encontrou_prompt)."""
+    idx, _, data = tn.expect([prompt_re], timeout=timeout)
+    return data, idx != -1
@@ -0,0 +1,120 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from flask import Response, current_app, request
+from werkzeug.http import http_date
+
+try:
+    import brotli
+except ImportError:  # Opcional: sem o pacote so sai gzip
+    brotli = None
+
+# Respostas guardadas (uma por combinacao de filtros), cada uma so na versao mais recente
+_MAX_ENTRIES = 256
+
+
+class VersionedResponseCache:
+    """Corpo JSON serializado e comprimido uma vez por versao do dado.
+
+    A versao e qualquer string que muda quando o conteudo muda (ex: seq dos
+    deltas). Com ela sai um ETag fraco; o cliente que manda If-None-Match
+    (ou If-Modified-Since) igual recebe 304 sem corpo, e os demais recebem o
+    corpo ja comprimido em br/gzip conforme o Accept-Encoding.
+    """
+
+    def __init__(self, max_entries=_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.not_modified = 0
+        self.misses = 0
+
+    def _entry(self, key, version, build):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry['version'] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        # Serializa fora do lock; duas requisicoes na mesma versao nova no maximo repetem o trabalho
+        payload = build()
+        body = current_app.json.dumps(payload).encode('utf-8')
+        entry = {
+            'version': version,
+            'etag': hashlib.sha1(f"{key}|{version}".encode()).hexdigest()[:20],
+            'bodies': {'identity': body},
+            'last_modified': datetime.utcnow().replace(microsecond=0),
+        }
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous and previous['version'] != version and entry['last_modified'] <= previous['last_modified']:
+                # Last-Modified tem resolucao de segundo: cada versao nova precisa de um valor maior
+                entry['last_modified'] = previous['last_modified'] + timedelta(seconds=1)
+            self.misses += 1
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def _encoding():
+        accepted = request.accept_encodings
+        if brotli is not None and accepted['br']:
+            return 'br'
+        if accepted['gzip']:
+            return 'gzip'
+        return 'identity'
+
+    def _body(self, entry, encoding):
+        bodies = entry['bodies']
+        if encoding not in bodies:
+            raw = bodies['identity']
+            bodies[encoding] = brotli.compress(raw, quality=5) if encoding == 'br' else gzip.compress(raw, compresslevel=6)
+        return bodies[encoding]
+
+    def respond(self, key, version, build):
+        """Resposta para a requisicao atual; build() monta o payload so quando a versao nao esta em cache.
+
+        Last-Modified e quando esta versao foi montada neste processo, entao
+        If-Modified-Since tambem segue a versao (e nao so a hora do dado).
+        """
+        entry = self._entry(key, version, build)
+        headers = {
+            'ETag': f'W/"{entry["etag"]}"',
+            'Cache-Control': 'private, no-cache',
+            'Vary': 'Accept-Encoding, Authorization',
+            'Last-Modified': http_date(entry['last_modified']),
+        }
+
+        if request.if_none_match:
+            fresh = request.if_none_match.contains_weak(entry['etag'])
+        else:
+            since = request.if_modified_since
+            fresh = bool(since and entry['last_modified'] <= since.replace(tzinfo=None))
+        if fresh:
+            with self._lock:
+                self.not_modified += 1
+            return Response(status=304, headers=headers)
+
+        encoding = self._encoding()
+        body = self._body(entry, encoding)
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return Response(body, status=200, mimetype='application/json', headers=headers)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+                'brotli': brotli is not None,
+            }
+
+
+monitor_status_cache = VersionedResponseCache()
@@ -0,0 +1,115 @@
+import os
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from database import db
+from models import OLTScanState
+
+# Intervalo inicial de cada OLT; dai em diante ele se ajusta entre o minimo e o maximo
+OLT_MONITOR_INTERVAL = int(os.environ.get('OLT_MONITOR_INTERVAL', 120))
+OLT_SCAN_MIN_INTERVAL = int(os.environ.get('OLT_SCAN_MIN_INTERVAL', 30))
+OLT_SCAN_MAX_INTERVAL = int(os.environ.get('OLT_SCAN_MAX_INTERVAL', 600))
+# Variacao aleatoria (+/-) sobre o intervalo para as OLTs nao sincronizarem
+OLT_SCAN_JITTER = float(os.environ.get('OLT_SCAN_JITTER', 0.1))
+# O intervalo nunca fica abaixo desse multiplo da duracao do ultimo scan da OLT
+OLT_SCAN_DUTY_FACTOR = float(os.environ.get('OLT_SCAN_DUTY_FACTOR', 3))
+# OLT sem scan completo ha mais que isso esta fora do SLA (vai no /monitor-status)
+OLT_SCAN_SLA = int(os.environ.get('OLT_SCAN_SLA', 900))
+
+
+def _jittered(seconds):
+    return timedelta(seconds=seconds * random.uniform(1 - OLT_SCAN_JITTER, 1 + OLT_SCAN_JITTER))
+
+
+def next_interval(current, duration, churn):
+    """Portas mudando de estado encurtam o intervalo; OLT estavel vai espacando os scans.
+
+    churn e o da porta mais agitada: qualquer mudanca corta ao menos metade
+    da distancia ate o minimo, e churn 1 vai direto ao minimo.
+    """
+    if churn > 0:
+        interval = OLT_SCAN_MIN_INTERVAL + (current - OLT_SCAN_MIN_INTERVAL) * (1 - churn) / 2
+    else:
+        interval = current * 1.25
+    interval = max(OLT_SCAN_MIN_INTERVAL, min(OLT_SCAN_MAX_INTERVAL, interval))
+    return max(interval, duration * OLT_SCAN_DUTY_FACTOR)
+
+
+def due(olts, running=(), limit=None):
+    """OLTs cujo proximo scan ja venceu, a mais atrasada primeiro.
+
+    OLT nova entra com atraso aleatorio para espalhar a carga.
+    """
+    now = datetime.utcnow()
+    states = {row.olt_ip: row for row in OLTScanState.query.all()}
+    ready = []
+    for olt in olts:
+        if olt['ip'] in running:
+            continue
+        row = states.get(olt['ip'])
+        if row is None:
+            row = OLTScanState(
+                olt_ip=olt['ip'],
+                interval=OLT_MONITOR_INTERVAL,
+                next_scan_at=now + timedelta(seconds=random.uniform(0, OLT_SCAN_JITTER * OLT_MONITOR_INTERVAL)),
+                failures=0,
+            )
+            db.session.add(row)
+        elif row.next_scan_at <= now:
+            ready.append((row.next_scan_at, olt))
+    db.session.commit()
+    ready.sort(key=lambda item: item[0])
+    return [olt for _, olt in ready[:limit]]
+
+
+def record_scan(olt_ip, duration, error=None, churn=0.0):
+    """Registra o resultado de um scan e agenda o proximo. Retorna o intervalo escolhido."""
+    now = datetime.utcnow()
+    row = OLTScanState.query.filter_by(olt_ip=olt_ip).first()
+    if row is None:
+        row = OLTScanState(olt_ip=olt_ip, interval=OLT_MONITOR_INTERVAL, failures=0)
+        db.session.add(row)
+
+    row.last_scan_at = now
+    row.last_duration = duration
+    if error:
+        # Falha volta ao intervalo base; o circuit breaker evita martelar uma OLT fora do ar
+        row.failures = (row.failures or 0) + 1
+        row.last_error = str(error)[:255]
+        row.interval = OLT_MONITOR_INTERVAL
+    else:
+        row.failures = 0
+        row.last_error = None
+        row.last_success_at = now
+        row.churn = churn
+        row.interval = next_interval(row.interval or OLT_MONITOR_INTERVAL, duration, churn)
+    row.next_scan_at = now + _jittered(row.interval)
+    db.session.commit()
+    return row.interval
+
+
+def forget(olt_ips):
+    if olt_ips:
+        OLTScanState.query.filter(OLTScanState.olt_ip.in_(list(olt_ips))).delete(synchronize_session=False)
+        db.session.commit()
+
+
+def last_scan_at():
+    """Fim do scan mais recente de qualquer OLT; muda a cada scan, com ou sem mudanca de estado."""
+    return db.session.query(func.max(OLTScanState.last_scan_at)).scalar()
+
+
+def status(olts):
+    """Agenda de cada OLT com o SLA de staleness.
+
+    Nao leva age/stale: dependem da hora e tirariam o corpo do cache a cada
+    consulta. Quem le calcula: stale = last_success_at nulo ou mais velho que sla.
+    """
+    states = {row.olt_ip: row for row in OLTScanState.query.all()}
+    report = {}
+    for olt in olts:
+        row = states.get(olt['ip'])
+        entry = row.to_dict() if row else {'olt_ip': olt['ip'], 'last_success_at': None}
+        entry.update({'name': olt.get('name'), 'sla': OLT_SCAN_SLA})
+        report[olt['ip']] = entry
+    return report
@@ -0,0 +1,254 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from utils.prompt import GENERIC_PROMPT_RE
+
+# Porta telnet das OLTs; trocar so para apontar para o simulador (scripts/olt_simulator.py)
+OLT_TELNET_PORT = int(os.environ.get('OLT_TELNET_PORT', 23))
+OLT_MAX_SESSIONS = int(os.environ.get('OLT_MAX_SESSIONS', 4))
+OLT_SESSION_IDLE_TIMEOUT = int(os.environ.get('OLT_SESSION_IDLE_TIMEOUT', 60))
+OLT_SESSION_HEALTH_INTERVAL = int(os.environ.get('OLT_SESSION_HEALTH_INTERVAL', 15))
+OLT_SESSION_ACQUIRE_TIMEOUT = int(os.environ.get('OLT_SESSION_ACQUIRE_TIMEOUT', 30))
+
+# Erros que indicam que a sessao telnet caiu (OLT fechou o vty, timeout de inatividade, etc.)
+SESSION_ERRORS = (EOFError, OSError, ConnectionError)
+
+
+class PooledSession:
+    def __init__(self, host, username, password, profile, tn):
+        self.host = host
+        self.username = username
+        self.password = password
+        self.profile = profile
+        self.tn = tn
+        # Prompt aprendido no login (ex: OLT-NAME#); sem ele, exige '#' no fim do buffer
+        self.prompt_re = getattr(tn, 'prompt_re', None) or GENERIC_PROMPT_RE
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.uses = 0
+        self.reusable = True
+
+    def matches(self, username, password, profile):
+        return self.username == username and self.password == password and self.profile == profile
+
+    def is_alive(self):
+        try:
+            # Descarta lixo pendente no buffer; EOFError se a OLT fechou o socket
+            self.tn.read_very_eager()
+        except SESSION_ERRORS:
+            return False
+
+        if time.time() - self.last_used < OLT_SESSION_HEALTH_INTERVAL:
+            return True
+
+        try:
+            self.tn.write(b"\n")
+            idx, _, _ = self.tn.expect([self.prompt_re], timeout=2)
+            return idx != -1
+        except SESSION_ERRORS:
+            return False
+
+    def close(self):
+        try:
+            self.tn.write(b"exit\n")
+        except Exception:
+            pass
+        try:
+            self.tn.close()
+        except Exception:
+            pass
+
+
+class SessionPool:
+    """Pool de sessoes telnet por IP de OLT.
+
+    Cada OLT aceita poucas sessoes vty simultaneas, entao o pool limita quantas
+    sessoes (ociosas + em uso) existem por host e reaproveita as ociosas para
+    evitar pagar o login (1-3 s) a cada requisicao.
+    """
+
+    def __init__(self, max_sessions=OLT_MAX_SESSIONS, idle_timeout=OLT_SESSION_IDLE_TIMEOUT):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._cond = threading.Condition()
+        self._idle = {}
+        self._in_use = {}
+        self._reaper = None
+
+    def _total(self, host):
+        return len(self._idle.get(host, [])) + self._in_use.get(host, 0)
+
+    def _start_reaper(self):
+        if self._reaper and self._reaper.is_alive():
+            return
+        self._reaper = threading.Thread(target=self._reap_loop, daemon=True)
+        self._reaper.start()
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(max(5, self.idle_timeout // 2))
+            try:
+                self.evict_idle()
+            except Exception as e:
+                print(f"[POOL] Erro ao expirar sessoes ociosas: {e}")
+
+    def _pop_idle(self, host, username, password, profile):
+        """Retorna uma sessao ociosa compativel; descarta as expiradas ou de outro usuario."""
+        idle = self._idle.get(host, [])
+        now = time.time()
+        discarded = []
+        found = None
+        while idle:
+            session = idle.pop()
+            if now - session.last_used > self.idle_timeout or not session.matches(username, password, profile):
+                discarded.append(session)
+                continue
+            found = session
+            break
+        return found, discarded
+
+    def acquire(self, host, username, password, connect, profile='zte', timeout=OLT_SESSION_ACQUIRE_TIMEOUT):
+        deadline = time.time() + timeout
+
+        while True:
+            with self._cond:
+                self._start_reaper()
+                session, discarded = self._pop_idle(host, username, password, profile)
+                if session:
+                    self._in_use[host] = self._in_use.get(host, 0) + 1
+                can_create = not session and self._total(host) < self.max_sessions
+                if can_create:
+                    # Reserva a vaga antes de conectar, fora do lock
+                    self._in_use[host] = self._in_use.get(host, 0) + 1
+                if discarded:
+                    self._cond.notify_all()
+
+            for old in discarded:
+                old.close()
+
+            if session:
+                if session.is_alive():
+                    session.uses += 1
+                    return session
+                print(f"[POOL] Sessao ociosa em {host} nao respondeu, reconectando...")
+                session.close()
+                can_create = True
+
+            if can_create:
+                try:
+                    tn = connect(host, username, password)
+                except Exception:
+                    self._forget(host)
+                    raise
+                if tn is None:
+                    self._forget(host)
+                    return None
+                session = PooledSession(host, username, password, profile, tn)
+                session.uses = 1
+                return session
+
+            with self._cond:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    print(f"[POOL] Timeout aguardando sessao livre em {host}")
+                    return None
+                self._cond.wait(timeout=min(remaining, 1))
+
+    def _forget(self, host):
+        with self._cond:
+            self._in_use[host] = max(0, self._in_use.get(host, 0) - 1)
+            self._cond.notify_all()
+
+    def release(self, session, reuse=True):
+        if session is None:
+            return
+
+        keep = reuse and session.reusable
+        with self._cond:
+            self._in_use[session.host] = max(0, self._in_use.get(session.host, 0) - 1)
+            if keep:
+                session.last_used = time.time()
+                self._idle.setdefault(session.host, []).append(session)
+            self._cond.notify_all()
+
+        if not keep:
+            session.close()
+
+    @contextmanager
+    def session(self, host, username, password, connect, profile='zte'):
+        session = self.acquire(host, username, password, connect, profile=profile)
+        try:
+            yield session
+        except SESSION_ERRORS:
+            if session:
+                session.reusable = False
+            raise
+        finally:
+            self.release(session)
+
+    def run(self, host, username, password, connect, fn, profile='zte'):
+        """Executa fn(session) com uma sessao do pool.
+
+        Se uma sessao reaproveitada cair no meio do uso (OLT derrubou o vty),
+        refaz o login uma vez de forma transparente.
+        """
+        for attempt in range(2):
+            session = self.acquire(host, username, password, connect, profile=profile)
+            if session is None:
+                return None
+            try:
+                result = fn(session)
+            except SESSION_ERRORS as e:
+                session.reusable = False
+                self.release(session)
+                if attempt == 0 and session.uses > 1:
+                    print(f"[POOL] Sessao reaproveitada em {host} caiu ({e}), refazendo login...")
+                    continue
+                raise
+            except Exception:
+                session.reusable = False
+                self.release(session)
+                raise
+            self.release(session)
+            return result
+        return None
+
+    def close_idle(self, host, keep=0):
+        with self._cond:
+            idle = self._idle.get(host, [])
+            to_close = idle[:max(0, len(idle) - keep)]
+            self._idle[host] = idle[len(to_close):]
+            self._cond.notify_all()
+        for session in to_close:
+            session.close()
+        return len(to_close)
+
+    def evict_idle(self):
+        now = time.time()
+        expired = []
+        with self._cond:
+            for host, idle in self._idle.items():
+                alive = [s for s in idle if now - s.last_used <= self.idle_timeout]
+                expired.extend(s for s in idle if now - s.last_used > self.idle_timeout)
+                self._idle[host] = alive
+            if expired:
+                self._cond.notify_all()
+        for session in expired:
+            session.close()
+        return len(expired)
+
+    def stats(self):
+        with self._cond:
+            hosts = set(self._idle) | set(self._in_use)
+            return {
+                host: {
+                    'idle': len(self._idle.get(host, [])),
+                    'in_use': self._in_use.get(host, 0),
+                    'max': self.max_sessions,
+                }
+                for host in sorted(hosts)
+            }
+
+
+session_pool = SessionPool()
@@ -1,31 +1,19 @@
-import telnetlib
 import time
-from models import OLT, SystemConfig
+from utils import olt_registry
+from utils.session_pool import OLT_TELNET_PORT, session_pool
+from utils.olt_scheduler import olt_scheduler
+from utils.command_cache import command_cache
+from utils.olt_health import CircuitOpen, olt_health
+from utils.prompt import SHELL_PROMPT_RE, prompt_from_output, read_until_prompt
+from utils.telnet_client import TelnetClient
 
 def get_credentials(host_ip):
     try:
-        olt = OLT.query.filter_by(ip=host_ip).first()
-        uname = olt.username if olt and olt.username else None
-        pwd = olt.password if olt and olt.password else None
-        
-        if not uname:
-            cfg = SystemConfig.query.filter_by(key='universal_username').first()
-            uname = cfg.value if cfg else None
-        
-        if not pwd:
-            cfg = SystemConfig.query.filter_by(key='universal_password').first()
-            pwd = cfg.value if cfg else None
-            
-        return uname, pwd
+        return olt_registry.get_credentials(host_ip)
     except Exception:
         return "admin", "admin" 
 
-def send_command_with_confirmation(host, commands, username=None, password=None):
-    """Send commands that may require interactive confirmations (like reboot).
-    
-    For commands 'reboot' or 'restore' that ask "Confirm to reboot? [yes/no]:", 
-    this function will automatically respond with 'yes'.
-    """
+def _resolve_credentials(host, username, password):
     if not username or not password:
         try:
             u, p = get_credentials(host)
@@ -33,47 +21,92 @@ def send_command_with_confirmation(host, commands, username=None, password=None)
             if not password: password = p
         except: 
             pass 
+    return username, password
 
-    if not username or not password:
-        print(f"[{host}] Missing credentials (username or password).")
-        return None
+def _open_session(host, username, password):
+    """Abre o telnet, faz login/enable, desativa a paginacao e aprende o prompt da OLT.
 
+    O prompt exato (ex: OLT-NAME#) fica em tn.prompt_re e e usado em todas as
+    leituras, que terminam assim que ele aparece em vez de no primeiro '#'.
+    """
     try:
-        print(f"[{host}] Connecting via telnet (with confirmation support)...")
-        tn = telnetlib.Telnet(host, 23, timeout=5)
+        tn = TelnetClient(host, OLT_TELNET_PORT, timeout=5)
+    except Exception as e:
+        olt_health.record_failure(host, e)
+        raise
+
+    idx, match, data = tn.expect([b"[Ll]ogin:", b"[Uu]sername:", b"[Uu]ser:"], timeout=5)
+    if idx == -1:
+        print(f"[{host}] Login prompt not found (timeout). Data: {data}")
+        olt_health.record_failure(host, "Login prompt not found")
+        tn.close()
+        return None
+
+    olt_health.record_success(host)
+
+    tn.write(username.encode('ascii') + b"\n")
+
+    idx, match, data = tn.expect([b"[Pp]assword:"], timeout=5)
+    if idx == -1:
+        print(f"[{host}] Password prompt not found. Data: {data}")
+        tn.close()
+        return None
+
+    tn.write(password.encode('ascii') + b"\n")
+
+    idx, match, data = tn.expect([SHELL_PROMPT_RE], timeout=5)
+    if idx == -1:
+        print(f"[{host}] Shell prompt not found after login. Data: {data}")
+        tn.close()
+        return None
+
+    if match.group(2) == b">":
+        tn.write(b"enable\n")
+        idx, match, data = tn.expect([SHELL_PROMPT_RE], timeout=3)
 
-        idx, match, data = tn.expect([b"[Ll]ogin:", b"[Uu]sername:", b"[Uu]ser:"], timeout=5)
-        if idx == -1:
-            print(f"[{host}] Login prompt not found (timeout). Data: {data}")
-            tn.close()
-            return None
+    tn.prompt_re = prompt_from_output(data)
 
-        tn.write(username.encode('ascii') + b"\n")
+    tn.write(b"terminal length 0\n")
+    read_until_prompt(tn, tn.prompt_re, timeout=2)
+    return tn
 
-        idx, match, data = tn.expect([b"[Pp]assword:"], timeout=5)
-        if idx == -1:
-            print(f"[{host}] Password prompt not found. Data: {data}")
-            tn.close()
-            return None
+def _run_pooled(host, username, password, fn):
+    if not olt_health.allow(host):
+        print(f"[{host}] OLT marcada como indisponivel (circuit breaker aberto), pulando.")
+        raise CircuitOpen(host)
 
-        tn.write(password.encode('ascii') + b"\n")
+    # A vaga no scheduler vem antes da sessao: e ele quem limita o uso de vty por OLT
+    with olt_scheduler.slot(host):
+        return session_pool.run(host, username, password, _open_session, fn)
 
-        idx, match, data = tn.expect([b">", b"#"], timeout=5)
-        if idx == -1:
-            print(f"[{host}] Shell prompt not found after login. Data: {data}")
-            tn.close()
-            return None
+def _read(session, timeout=10):
+    raw_bytes, found = read_until_prompt(session.tn, session.prompt_re, timeout=timeout)
+    if not found:
+        # Prompt nao apareceu: o restante da saida vazaria para o proximo uso da sessao
+        session.reusable = False
+    return raw_bytes.decode('ascii', errors='ignore')
 
-        current_prompt = match.group(0).decode('ascii')
-        prompt_char = current_prompt.strip()[-1]
+def _ends_at_exec_prompt(output):
+    """True se a leitura terminou no prompt privilegiado (fora do modo de configuracao)."""
+    tail = (output or "").rstrip()
+    if not tail.endswith('#'):
+        return False
+    return '(config' not in tail.splitlines()[-1]
 
-        if prompt_char == '>':
-            tn.write(b"enable\n")
-            tn.read_until(b"#", timeout=3)
+def send_command_with_confirmation(host, commands, username=None, password=None):
+    """Send commands that may require interactive confirmations (like reboot).
+    
+    For commands 'reboot' or 'restore' that ask "Confirm to reboot? [yes/no]:", 
+    this function will automatically respond with 'yes'.
+    """
+    username, password = _resolve_credentials(host, username, password)
 
-        tn.write(b"terminal length 0\n")
-        tn.read_until(b"#", timeout=2)
+    if not username or not password:
+        print(f"[{host}] Missing credentials (username or password).")
+        return None
 
+    def run(session):
+        tn = session.tn
         results = []
         for cmd in commands:
             print(f"[{host}] Executing command: {cmd}")
@@ -89,7 +122,7 @@ def send_command_with_confirmation(host, commands, username=None, password=None)
                         [
                             b"[Cc]onfirm.*[Yy]es/[Nn]o",
                             b"[Yy]es/[Nn]o",
-                            b"#",
+                            session.prompt_re,
                         ],
                         timeout=8,
                     )
@@ -97,24 +130,34 @@ def send_command_with_confirmation(host, commands, username=None, password=None)
                     if idx in [0, 1]:
                         print(f"[{host}] Found confirmation prompt, responding with 'yes'")
                         tn.write(b"yes\n")
-                        response_data = tn.read_until(b"#", timeout=10)
+                        out = _read(session, timeout=10)
+                    else:
+                        if idx == -1:
+                            session.reusable = False
+                        out = response_data.decode('ascii', errors='ignore')
 
-                    out = response_data.decode('ascii', errors='ignore')
                     results.append(out)
                     print(f"[{host}] Command completed")
                 else:
-                    response_data = tn.read_until(b"#", timeout=5)
-                    out = response_data.decode('ascii', errors='ignore')
+                    out = _read(session, timeout=5)
                     results.append(out)
                     print(f"[{host}] Command completed")
+            except EOFError:
+                raise
             except Exception as e:
                 print(f"[{host}] Error executing command '{cmd}': {e}")
                 results.append(f"Error: {str(e)}")
+                session.reusable = False
 
-        tn.write(b"exit\n")
-        tn.close()
+        if not results or not _ends_at_exec_prompt(results[-1]):
+            session.reusable = False
         return results
 
+    try:
+        print(f"[{host}] Using pooled telnet session (with confirmation support)...")
+        return _run_pooled(host, username, password, run)
+    except CircuitOpen:
+        return None
     except Exception as e:
         print(f"Error connecting to {host}: {e}")
         import traceback
@@ -122,127 +165,117 @@ def send_command_with_confirmation(host, commands, username=None, password=None)
         return None
 
 
-def send_command(host, commands, username=None, password=None):
-    if not username or not password:
-        try:
-            u, p = get_credentials(host)
-            if not username: username = u
-            if not password: password = p
-        except: 
-            pass 
+def send_command(host, commands, username=None, password=None, use_cache=False):
+    """Executa os comandos numa sessao do pool e retorna a saida de cada um.
+
+    Com use_cache=True, comandos show de leitura sao servidos pelo
+    utils.command_cache quando ainda validos; so os demais vao para a OLT.
+    """
+    username, password = _resolve_credentials(host, username, password)
 
     if not username or not password:
         print(f"[{host}] Missing credentials (username or password).")
         return None
 
-    try:
-        tn = telnetlib.Telnet(host, 23, timeout=5)
-        
-        idx, match, data = tn.expect([b"[Ll]ogin:", b"[Uu]sername:", b"[Uu]ser:"], timeout=5)
-        
-        if idx == -1:
-            print(f"[{host}] Login prompt not found (timeout). Data: {data}")
-            tn.close()
-            return None
-
-        tn.write(username.encode('ascii') + b"\n")
-
-        idx, match, data = tn.expect([b"[Pp]assword:"], timeout=5)
-        if idx == -1:
-            print(f"[{host}] Password prompt not found. Data: {data}")
-            tn.close()
-            return None
-
-        tn.write(password.encode('ascii') + b"\n")
-
-        idx, match, data = tn.expect([b">", b"#"], timeout=5)
-        if idx == -1:
-            print(f"[{host}] Shell prompt not found after login. Data: {data}")
-            tn.close()
-            return None
-        
-        current_prompt = match.group(0).decode('ascii')
-        prompt_char = current_prompt.strip()[-1]
+    cached = {}
+    if use_cache:
+        for idx, cmd in enumerate(commands):
+            out = command_cache.get(host, cmd)
+            if out is not None:
+                cached[idx] = out
+        if len(cached) == len(commands):
+            return [cached[idx] for idx in range(len(commands))]
 
-        if prompt_char == '>':
-             tn.write(b"enable\n")
-             tn.read_until(b"#", timeout=3)
-        
-        tn.write(b"terminal length 0\n")
-        tn.read_until(b"#", timeout=2)
-        
-        results = []
+    pending = [(idx, cmd) for idx, cmd in enumerate(commands) if idx not in cached]
 
-        for cmd in commands:
+    def run(session):
+        tn = session.tn
+        results = {}
+
+        for idx, cmd in pending:
             tn.write(cmd.encode('ascii') + b"\n")
-            raw_bytes = tn.read_until(b"#", timeout=10) 
-            out = raw_bytes.decode('ascii', errors='ignore')
-            results.append(out)
-        
-        tn.write(b"exit\n")
-        tn.close()
+            results[idx] = _read(session, timeout=10)
+
+        if not results or not _ends_at_exec_prompt(results[pending[-1][0]]):
+            session.reusable = False
         return results
 
+    try:
+        fresh = _run_pooled(host, username, password, run)
+    except CircuitOpen:
+        return None
     except Exception as e:
         print(f"Error connecting to {host}: {e}")
         return None
 
-def search_onu_on_olt(host, sn_onu, username=None, password=None):
-    if not username or not password:
-        try:
-             u, p = get_credentials(host)
-             if not username: username = u
-             if not password: password = p
-        except: 
-             pass
-    
-    if not username or not password:
+    if fresh is None:
         return None
 
-    try:
-        tn = telnetlib.Telnet(host, 23, timeout=5)
-        
-        idx, match, initial_output = tn.expect([b"[Ll]ogin:", b"[Uu]sername:", b"[Uu]ser:"], timeout=5)
-        if idx == -1:
-            tn.close()
-            return None
+    for idx, cmd in pending:
+        if _ends_at_exec_prompt(fresh[idx]):
+            command_cache.set(host, cmd, fresh[idx])
 
-        tn.write(username.encode('ascii') + b"\n")
-        
-        idx, match, data = tn.expect([b"[Pp]assword:"], timeout=5)
-        if idx == -1:
-             tn.close()
-             return None
-        
-        tn.write(password.encode('ascii') + b"\n")
-        
-        idx, match, data = tn.expect([b">", b"#"], timeout=5)
-        if idx == -1:
-             tn.close()
-             return None
-             
-        current_prompt = match.group(0).decode('ascii').strip()
-        if current_prompt.endswith('>'):
-             tn.write(b"enable\n")
-             tn.read_until(b"#", timeout=3)
+    cached.update(fresh)
+    return [cached[idx] for idx in range(len(commands))]
 
-        tn.write(b"terminal length 0\n")
-        tn.read_until(b"#", timeout=2)
+def search_onu_on_olt(host, sn_onu, username=None, password=None):
+    """Saida do `show gpon onu by sn` se o SN esta na OLT, senao None; CircuitOpen se a OLT nao foi consultada."""
+    username, password = _resolve_credentials(host, username, password)
+    
+    if not username or not password:
+        return None
 
+    def run(session):
         cmd = f"show gpon onu by sn {sn_onu}"
-        tn.write(cmd.encode('ascii') + b"\n")
-        
-        raw_bytes = tn.read_until(b"#", timeout=10) 
-        output = raw_bytes.decode('ascii', errors='ignore')
+        session.tn.write(cmd.encode('ascii') + b"\n")
         
-        tn.write(b"exit\n")
-        tn.close()
+        output = _read(session, timeout=10)
+        if not _ends_at_exec_prompt(output):
+            session.reusable = False
+        return output
+
+    try:
+        output = _run_pooled(host, username, password, run)
         
-        if "gpon-onu_" in output:
+        if output and "gpon-onu_" in output:
              return output
              
         return None
 
+    except CircuitOpen:
+        # Quem faz o fan-out precisa saber que a OLT nao foi consultada
+        raise
     except Exception as e:
         print(f"Error searching ONU on {host}: {e}")
         return None
+
+def search_onus_on_olt(host, sn_list, username=None, password=None):
+    """Busca varios SNs em uma unica sessao na OLT.
+
+    Retorna {sn: output} com a saida do `show gpon onu by sn` de cada SN
+    encontrado, ou None para os SNs que nao estao nesta OLT. Levanta
+    CircuitOpen se o circuit breaker nao deixou consultar a OLT.
+    """
+    username, password = _resolve_credentials(host, username, password)
+
+    if not username or not password:
+        return None
+
+    def run(session):
+        outputs = {}
+        for sn_onu in sn_list:
+            cmd = f"show gpon onu by sn {sn_onu}"
+            session.tn.write(cmd.encode('ascii') + b"\n")
+            output = _read(session, timeout=10)
+            if not _ends_at_exec_prompt(output):
+                session.reusable = False
+            outputs[sn_onu] = output if "gpon-onu_" in output else None
+        return outputs
+
+    try:
+        return _run_pooled(host, username, password, run)
+    except CircuitOpen:
+        raise
+    except Exception as e:
+        print(f"Error searching ONUs on {host}: {e}")
+        return None
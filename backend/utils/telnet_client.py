@@ -0,0 +1,127 @@
+import re
+import socket
+import time
+
+# Bytes do protocolo telnet (RFC 854) que precisamos tratar na negociacao
+IAC = 255
+DONT = 254
+DO = 253
+WONT = 252
+WILL = 251
+SB = 250
+SE = 240
+# Bytes que o telnetlib descartava do fluxo
+_DROPPED = (0, 0x11)
+
+
+class TelnetClient:
+    """Cliente telnet sobre socket, no lugar do telnetlib.Telnet (removido no Python 3.13).
+
+    Implementa so o que as sessoes usam (write, expect, read_very_eager e
+    close), com a mesma semantica do telnetlib: recusa todas as opcoes na
+    negociacao e, no timeout do expect, devolve (-1, None, o que chegou).
+    Com o eventlet o socket e verde, entao cada OLT ocupa uma green thread e
+    nao uma thread do sistema.
+    """
+
+    def __init__(self, host, port, timeout=10):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.sock = socket.create_connection((host, port), timeout)
+        self.eof = False
+        self._buffer = b""
+        self._iac_state = None
+
+    def write(self, data):
+        self.sock.sendall(data.replace(bytes([IAC]), bytes([IAC, IAC])))
+
+    def _filter(self, data):
+        """Remove a negociacao telnet do fluxo, recusando todas as opcoes."""
+        out = bytearray()
+        replies = bytearray()
+        for byte in data:
+            state = self._iac_state
+            if state is None:
+                if byte == IAC:
+                    self._iac_state = 'iac'
+                elif byte not in _DROPPED:
+                    out.append(byte)
+            elif state == 'iac':
+                if byte == IAC:
+                    out.append(IAC)
+                    self._iac_state = None
+                elif byte in (DO, DONT, WILL, WONT):
+                    self._iac_state = byte
+                elif byte == SB:
+                    self._iac_state = 'sb'
+                else:
+                    self._iac_state = None
+            elif state == 'sb':
+                if byte == IAC:
+                    self._iac_state = 'sb-iac'
+            elif state == 'sb-iac':
+                self._iac_state = None if byte == SE else 'sb'
+            else:
+                if state == DO:
+                    replies += bytes([IAC, WONT, byte])
+                elif state == WILL:
+                    replies += bytes([IAC, DONT, byte])
+                self._iac_state = None
+
+        if replies:
+            self.sock.sendall(bytes(replies))
+        return bytes(out)
+
+    def _fill(self, timeout):
+        """Le um bloco do socket para o buffer. Retorna False se nada chegou no prazo."""
+        self.sock.settimeout(timeout)
+        try:
+            chunk = self.sock.recv(4096)
+        except (socket.timeout, BlockingIOError):
+            return False
+        if not chunk:
+            self.eof = True
+            return False
+        self._buffer += self._filter(chunk)
+        return True
+
+    def _take(self, end=None):
+        end = len(self._buffer) if end is None else end
+        data, self._buffer = self._buffer[:end], self._buffer[end:]
+        return data
+
+    def expect(self, patterns, timeout=None):
+        """Le ate um dos padroes casar. Retorna (indice, match, dados) ou (-1, None, dados) no timeout."""
+        patterns = [re.compile(p) if isinstance(p, bytes) else p for p in patterns]
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            for idx, pattern in enumerate(patterns):
+                match = pattern.search(self._buffer)
+                if match:
+                    return idx, match, self._take(match.end())
+            if self.eof:
+                data = self._take()
+                if not data:
+                    raise EOFError(f"telnet connection to {self.host} closed")
+                return -1, None, data
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                return -1, None, self._take()
+            self._fill(remaining)
+
+    def read_very_eager(self):
+        """Tudo o que ja chegou, sem esperar; EOFError se a OLT fechou o socket."""
+        while not self.eof and self._fill(0):
+            pass
+        data = self._take()
+        if self.eof and not data:
+            raise EOFError(f"telnet connection to {self.host} closed")
+        return data
+
+    def close(self):
+        self.eof = True
+        try:
+            self.sock.close()
+        except OSError:
+            pass
@@ -32,7 +32,6 @@ const Dashboard = () => {
   const [stats, setStats] = useState<any[]>([]);
   const [recentLogs, setRecentLogs] = useState<any[]>([]);
   const [loading, setLoading] = useState(true);
-  const [oltMonitor, setOltMonitor] = useState<any>(null);
 
   useEffect(() => {
     const fetchData = async () => {
@@ -50,20 +49,6 @@ const Dashboard = () => {
       }
     };
     fetchData();
-
-    // Polling de 30 segundos para o status das OLTs
-    const fetchMonitor = async () => {
-      try {
-        const res = await api.get("/olts/monitor-status");
-        setOltMonitor(res.data);
-      } catch (err) {
-        console.error("Erro ao carregar monitor:", err);
-      }
-    };
-
-    fetchMonitor();
-    const interval = setInterval(fetchMonitor, 30000);
-    return () => clearInterval(interval);
   }, []);
 
   const COLORS = [
@@ -15,17 +15,12 @@ import {
   Filter,
   RefreshCw,
 } from "lucide-react";
-import { io } from "socket.io-client";
 import { toast } from "react-toastify";
 import api from "../services/api";
+import { watchMonitor } from "../services/monitorFeed";
 import OnuDetailModal from "../components/OnuDetailModal";
 import "../styles/OLTManager.css";
 
-const socket = io("http://localhost:5000", {
-  transports: ["websocket"],
-  autoConnect: true,
-});
-
 const GerenciaOLT = () => {
   const [olts, setOlts] = useState<any[]>([]);
   const [loading, setLoading] = useState(true);
@@ -41,24 +36,15 @@ const GerenciaOLT = () => {
 
   useEffect(() => {
     fetchOlts();
-
-    socket.on("olt_update", (data) => {
-      console.log("Recebido via WebSocket:", data);
-      setMonitorData(data);
-    });
-
-    api
-      .get("/olts/monitor-status")
-      .then((res) => {
-        setMonitorData(res.data);
-      })
-      .catch(() => {});
-
-    return () => {
-      socket.off("olt_update");
-    };
   }, []);
 
+  // So a OLT aberta: a pagina entra na sala dela e recebe apenas os deltas dessa OLT
+  useEffect(() => {
+    if (!selectedOlt?.ip) return;
+    setMonitorData(null);
+    return watchMonitor(`olt:${selectedOlt.ip}`, setMonitorData);
+  }, [selectedOlt?.ip]);
+
   const handleManualRefresh = async () => {
     if (!selectedOlt || !selectedPort || isRefreshing) return;
 
@@ -13,14 +13,22 @@ import {
 import { toast } from "react-toastify";
 import axios from "axios";
 import api from "../services/api";
-import { PageProps } from "../types";
+import socket from "../services/socket";
+import { OnuResult, PageProps } from "../types";
 import { getRecentSns, addRecentSn } from "../utils/recentSns";
 import "../styles/LocateOnu.css";
 
+// Sem resposta do streaming nesse prazo a busca vai pelo POST /onu/locate
+const STREAM_START_TIMEOUT_MS = 5000;
+// Prazo total da busca, em qualquer dos dois caminhos
+const LOCATE_TIMEOUT_MS = 90000;
+
 const LocateOnu = ({ state, setState }: PageProps) => {
   const { sn, loading, result, controller } = state;
   const [showDeleteModal, setShowDeleteModal] = useState(false);
   const [recentSns, setRecentSns] = useState<string[]>(() => getRecentSns());
+  // OLTs que ficaram fora da busca (breaker aberto ou sem resposta no prazo)
+  const [skippedOlts, setSkippedOlts] = useState<any[]>([]);
 
   const setSn = (value: string) => {
     setState((prev) => ({ ...prev, sn: value.toUpperCase() }));
@@ -35,6 +43,7 @@ const LocateOnu = ({ state, setState }: PageProps) => {
     }
 
     const newController = new AbortController();
+    setSkippedOlts([]);
     setState((prev) => ({
       ...prev,
       loading: true,
@@ -42,22 +51,128 @@ const LocateOnu = ({ state, setState }: PageProps) => {
       controller: newController,
     }));
 
-    try {
-      const res = await api.post(
-        "/onu/locate",
-        { sn: cleanSn },
-        { signal: newController.signal },
-      );
-      addRecentSn(cleanSn);
-      setRecentSns(getRecentSns());
-      setState((prev) => ({ ...prev, result: res.data, loading: false }));
-    } catch (err: any) {
-      if (axios.isCancel(err)) {
-      } else {
-        toast.error(err.response?.data?.error || "Erro ao localizar ONU");
-        setState((prev) => ({ ...prev, loading: false }));
+    const finish = () =>
+      setState((prev) => ({ ...prev, loading: false, controller: null }));
+
+    // Busca em uma requisicao so: caminho padrao e fallback do streaming
+    const runHttp = async () => {
+      try {
+        const res = await api.post(
+          "/onu/locate",
+          { sn: cleanSn },
+          { signal: newController.signal, timeout: LOCATE_TIMEOUT_MS },
+        );
+        addRecentSn(cleanSn);
+        setRecentSns(getRecentSns());
+        setSkippedOlts(res.data.skipped_olts || []);
+        setState((prev) => ({ ...prev, result: res.data.results, loading: false, controller: null }));
+      } catch (err: any) {
+        if (!axios.isCancel(err)) {
+          setSkippedOlts(err.response?.data?.skipped_olts || []);
+          toast.error(err.response?.data?.error || "Erro ao localizar ONU");
+          finish();
+        }
       }
+    };
+
+    if (!socket.connected) {
+      await runHttp();
+      return;
     }
+
+    // Com o socket conectado o resultado chega por partes: a posicao assim que
+    // a OLT responde e o status/sinal logo depois, sem esperar a busca inteira
+    const requestId = `${cleanSn}-${Date.now()}`;
+    const sameKey = (a: any, b: any) =>
+      a.ip === b.ip && a.interface === b.interface;
+    let started = false;
+
+    const onStarted = (data: any) => {
+      if (data.request_id === requestId) started = true;
+    };
+
+    const onFound = (data: any) => {
+      if (data.request_id !== requestId) return;
+      const item = { ...data, status: "Consultando..." } as OnuResult;
+      setState((prev) => {
+        const current = Array.isArray(prev.result) ? prev.result : [];
+        if (current.some((r) => sameKey(r, item))) return prev;
+        return { ...prev, result: [...current, item] };
+      });
+    };
+
+    const onDetail = (data: any) => {
+      if (data.request_id !== requestId || data.error) return;
+      setState((prev) => {
+        const current = Array.isArray(prev.result) ? prev.result : [];
+        const merged = current.some((r) => sameKey(r, data))
+          ? current.map((r) => (sameKey(r, data) ? { ...r, ...data } : r))
+          : [...current, data];
+        return { ...prev, result: merged };
+      });
+    };
+
+    const cleanup = () => {
+      clearTimeout(startTimer);
+      clearTimeout(doneTimer);
+      socket.off("locate_started", onStarted);
+      socket.off("locate_found", onFound);
+      socket.off("locate_detail", onDetail);
+      socket.off("locate_done", onDone);
+      socket.off("locate_error", onError);
+      socket.off("disconnect", onDisconnect);
+    };
+
+    // Streaming nao respondeu ou caiu no meio: refaz a busca pelo POST
+    const fallbackToHttp = () => {
+      cleanup();
+      setState((prev) => ({ ...prev, result: null }));
+      runHttp();
+    };
+
+    const onDone = (data: any) => {
+      if (data.request_id !== requestId) return;
+      cleanup();
+      setSkippedOlts(data.skipped_olts || []);
+      if (data.found > 0) {
+        addRecentSn(cleanSn);
+        setRecentSns(getRecentSns());
+      } else {
+        toast.error("ONU not found on any OLT");
+      }
+      finish();
+    };
+
+    const onError = (data: any) => {
+      if (data.request_id !== requestId) return;
+      cleanup();
+      toast.error(data.error || "Erro ao localizar ONU");
+      finish();
+    };
+
+    const onDisconnect = () => fallbackToHttp();
+
+    const startTimer = setTimeout(() => {
+      if (!started) fallbackToHttp();
+    }, STREAM_START_TIMEOUT_MS);
+    const doneTimer = setTimeout(() => {
+      cleanup();
+      toast.error("Tempo esgotado ao localizar ONU");
+      finish();
+    }, LOCATE_TIMEOUT_MS);
+
+    newController.signal.addEventListener("abort", cleanup);
+    socket.on("locate_started", onStarted);
+    socket.on("locate_found", onFound);
+    socket.on("locate_detail", onDetail);
+    socket.on("locate_done", onDone);
+    socket.on("locate_error", onError);
+    socket.on("disconnect", onDisconnect);
+    socket.emit("locate_stream", {
+      sn: cleanSn,
+      token: localStorage.getItem("token"),
+      request_id: requestId,
+    });
   };
 
   const handleCancel = () => {
@@ -135,6 +250,25 @@ const LocateOnu = ({ state, setState }: PageProps) => {
         )}
       </div>
 
+      {!loading && skippedOlts.length > 0 && (
+        <div className="skipped-warning">
+          <div className="skipped-header">
+            <AlertTriangle size={18} />
+            <span>
+              {skippedOlts.length} OLT(s) não consultada(s); o equipamento pode
+              estar nelas:
+            </span>
+          </div>
+          <ul className="skipped-list">
+            {skippedOlts.map((olt) => (
+              <li key={olt.ip}>
+                {olt.name || olt.ip} <span className="detail-mono">({olt.ip})</span> — {olt.state}
+              </li>
+            ))}
+          </ul>
+        </div>
+      )}
+
       <AnimatePresence>
         {result && Array.isArray(result) && result.length > 0 && (
           <div className="results-list">
@@ -0,0 +1,117 @@
+import api from "./api";
+import socket from "./socket";
+
+// Aplica as mudancas por porta de um olt_delta (ou do /monitor-resync) sobre o snapshot local
+export const applyMonitorChanges = (data: any, changes: any[]) => {
+  const next = { ...(data || {}) };
+  for (const change of changes) {
+    if (change.op === "remove_olt") {
+      delete next[change.olt];
+      continue;
+    }
+    const ports = (next[change.olt] || []).filter(
+      (p: any) => p.port !== change.port,
+    );
+    if (change.op === "upsert") ports.push(change.value);
+    next[change.olt] = ports.sort((a: any, b: any) =>
+      a.port.localeCompare(b.port),
+    );
+  }
+  return next;
+};
+
+// Filtros do /monitor-status e /monitor-resync para a sala: 'all', 'olt:<ip>' ou 'port:<ip>:<porta>'
+const roomParams = (room: string) => {
+  const [kind, olt, ...rest] = room.split(":");
+  if (kind === "olt") return { olt };
+  if (kind === "port") return { olt, port: rest.join(":") };
+  return {};
+};
+
+/**
+ * Acompanha o estado do monitor de uma sala: carrega o snapshot filtrado,
+ * entra na sala e aplica os olt_delta dela. Delta com base_seq alem do que
+ * ja foi aplicado indica que algo se perdeu, e o que falta vem do resync.
+ * Retorna a funcao que sai da sala.
+ */
+export const watchMonitor = (
+  room: string,
+  onState: (update: (prev: any) => any) => void,
+) => {
+  const params = roomParams(room);
+  // Ultima sequencia aplicada; null ate o snapshot inicial chegar
+  let seq: number | null = null;
+  let resyncing = false;
+  let active = true;
+
+  const subscribe = () =>
+    socket.emit("monitor_subscribe", {
+      room,
+      token: localStorage.getItem("token"),
+    });
+
+  const resync = () => {
+    if (resyncing || !active) return;
+    resyncing = true;
+    api
+      .get("/olts/monitor-resync", { params: { ...params, since: seq ?? undefined } })
+      .then((res) => {
+        if (!active) return;
+        if (res.data.full) {
+          onState(() => res.data);
+        } else {
+          onState((prev: any) => ({
+            ...prev,
+            data: applyMonitorChanges(prev?.data, res.data.changes),
+          }));
+        }
+        seq = res.data.seq;
+      })
+      .catch(() => {})
+      .finally(() => {
+        resyncing = false;
+      });
+  };
+
+  const onDelta = (delta: any) => {
+    if (delta.room !== room || seq === null || delta.seq <= seq) return;
+    if (delta.base_seq > seq) {
+      // Perdeu alguma sequencia desta sala (reconexao, aba em segundo plano): busca o que falta
+      resync();
+      return;
+    }
+    seq = delta.seq;
+    onState((prev: any) => ({
+      ...prev,
+      updated_at: delta.updated_at,
+      data: applyMonitorChanges(prev?.data, delta.changes),
+    }));
+  };
+
+  // Reconexao cai fora das salas: entra de novo e recupera o que passou
+  const onConnect = () => {
+    subscribe();
+    resync();
+  };
+
+  socket.on("olt_delta", onDelta);
+  socket.on("connect", onConnect);
+  // Entra na sala antes de ler o snapshot, para nao perder delta entre os dois
+  subscribe();
+
+  api
+    .get("/olts/monitor-status", { params })
+    .then((res) => {
+      if (!active) return;
+      onState(() => res.data);
+      seq = res.data.seq ?? 0;
+    })
+    .catch(() => {});
+
+  return () => {
+    active = false;
+    socket.off("olt_delta", onDelta);
+    socket.off("connect", onConnect);
+    socket.emit("monitor_unsubscribe", { room });
+  };
+};
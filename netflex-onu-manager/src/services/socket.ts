@@ -0,0 +1,11 @@
+import { io } from "socket.io-client";
+
+// Conexao unica com o backend, compartilhada pelas paginas (monitor e locate).
+// Mesma origem da pagina: o nginx (e o proxy do vite) repassam /socket.io/ ao backend
+const socket = io({
+  path: "/socket.io",
+  transports: ["websocket"],
+  autoConnect: true,
+});
+
+export default socket;
@@ -0,0 +1,113 @@
+"""Compara os perfis de sessao do netmiko ('fast' e 'legacy') contra o simulador.
+
+Sobe scripts/olt_simulator.py com uma OLT e, para cada perfil, abre sessoes do
+mesmo jeito que o monitor (utils.olt_monitor) e roda os comandos do scan.
+Mede o tempo de conexao + preparo da sessao e o tempo medio por comando; a
+diferenca para a latencia configurada no simulador e o overhead do cliente:
+
+    python scripts/benchmark_cli.py --latency 0.05 --sessions 3 --commands 20
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SCRIPTS_DIR)
+BACKEND_DIR = os.path.join(ROOT_DIR, 'backend')
+sys.path.insert(0, SCRIPTS_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmark_onu import wait_port  # noqa: E402
+
+PROMPT = r'[>#\\]'
+
+
+def open_session(olt_monitor, args, profile):
+    if profile == 'fast':
+        params = olt_monitor.cli_device_params(args.ip, args.username, args.password, profile, conn_timeout=60)
+    else:
+        params = olt_monitor.cli_device_params(
+            args.ip, args.username, args.password, profile,
+            global_delay_factor=2.0, conn_timeout=60, read_timeout_override=120,
+        )
+    device = olt_monitor.open_device(params)
+    if profile == 'fast':
+        olt_monitor.prepare_fast_session(device)
+    else:
+        # Mesmo preparo do scan no perfil legacy
+        device.write_channel('\n')
+        time.sleep(2)
+        device.enable()
+        device.send_command('terminal length 0', expect_string=PROMPT, read_timeout=60)
+    return device
+
+
+def run_profile(olt_monitor, args, profile):
+    connect_times, command_times = [], []
+    commands = [f"show gpon onu state gpon-olt_1/1/{(i % args.pons) + 1}" for i in range(args.commands)]
+    for _ in range(args.sessions):
+        started = time.perf_counter()
+        device = open_session(olt_monitor, args, profile)
+        connect_times.append(time.perf_counter() - started)
+        try:
+            for cmd in commands:
+                started = time.perf_counter()
+                device.send_command(cmd, expect_string=PROMPT, read_timeout=60)
+                command_times.append(time.perf_counter() - started)
+        finally:
+            device.disconnect()
+    return {
+        'connect': statistics.mean(connect_times),
+        'command': statistics.mean(command_times),
+        'command_p95': sorted(command_times)[max(0, int(len(command_times) * 0.95) - 1)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Overhead por comando dos perfis fast/legacy do netmiko.")
+    parser.add_argument('--profiles', default='fast,legacy')
+    parser.add_argument('--sessions', type=int, default=3, help="Sessoes abertas por perfil")
+    parser.add_argument('--commands', type=int, default=20, help="Comandos por sessao")
+    parser.add_argument('--latency', type=float, default=0.05, help="Latencia por comando no simulador (s)")
+    parser.add_argument('--pons', type=int, default=16)
+    parser.add_argument('--unprivileged', action='store_true', help="Login no prompt '>' (exige enable)")
+    parser.add_argument('--ip', default='127.0.1.1')
+    parser.add_argument('--port', type=int, default=2323)
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin')
+    args = parser.parse_args()
+
+    os.environ['OLT_TELNET_PORT'] = str(args.port)
+    from utils import olt_monitor
+
+    sim_argv = ['--olts', '1', '--base-ip', args.ip, '--port', str(args.port), '--slots', '1',
+                '--pons', str(args.pons), '--onus-per-port', '8', '--latency', str(args.latency)]
+    if args.unprivileged:
+        sim_argv.append('--unprivileged')
+    simulator = subprocess.Popen(
+        [sys.executable, os.path.join(SCRIPTS_DIR, 'olt_simulator.py')] + sim_argv,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        if not wait_port(args.ip, args.port):
+            raise RuntimeError("simulador nao subiu")
+        results = {}
+        for profile in args.profiles.split(','):
+            results[profile] = run_profile(olt_monitor, args, profile)
+            r = results[profile]
+            print(f"[BENCH] {profile:<7} conexao {r['connect']:.3f}s | comando medio {r['command']:.3f}s "
+                  f"(p95 {r['command_p95']:.3f}s, overhead {r['command'] - args.latency:.3f}s)", flush=True)
+        if 'fast' in results and 'legacy' in results:
+            saved = results['legacy']['command'] - results['fast']['command']
+            print(f"[BENCH] fast economiza {saved:.3f}s por comando e "
+                  f"{results['legacy']['connect'] - results['fast']['connect']:.3f}s por sessao", flush=True)
+    finally:
+        simulator.terminate()
+        simulator.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+"""Benchmark ponta a ponta dos endpoints de ONU contra OLTs simuladas.
+
+Para cada cenario (quantidade de OLTs x ONUs por porta) sobe o simulador
+(scripts/olt_simulator.py) e o backend real (python app.py) com um banco SQLite
+temporario, cadastra as OLTs e um usuario, e dispara requisicoes com N
+"tecnicos" simultaneos. Mede p50/p95/p99 e vazao de:
+
+    POST /api/onu/locate, GET /api/onu/signal/<sn>, GET /api/onu/acs/<sn>,
+    GET /api/olts/monitor-status
+
+O resultado vai para um JSON que pode ser comparado com o de outro commit:
+
+    python scripts/benchmark_onu.py --olts 1,10,50,100 --onus-per-port 32 \
+        --concurrency 1,10,50 --requests 100 --output bench_novo.json --compare bench_antigo.json
+
+Variaveis de ambiente do backend (OLT_MAX_SESSIONS, OLT_CACHE_MAX_ENTRIES, ...)
+sao repassadas, entao da para comparar configuracoes sem mexer no codigo.
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SCRIPTS_DIR)
+BACKEND_DIR = os.path.join(ROOT_DIR, 'backend')
+sys.path.insert(0, SCRIPTS_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+import olt_simulator  # noqa: E402
+
+BENCH_USER = 'benchmark'
+BENCH_PASSWORD = 'benchmark'
+ENDPOINTS = ['locate', 'signal', 'acs', 'monitor-status']
+
+
+def percentile(ordered, pct):
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def wait_port(host, port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, text=True).strip()
+    except Exception:
+        return None
+
+
+def monitor_snapshot(olts):
+    """Mesmo formato que o monitor grava em olt_port_status, gerado a partir das OLTs simuladas."""
+    data = {}
+    for olt in olts:
+        ports = []
+        for port, onus in olt.ports.items():
+            entries = [
+                {
+                    'onu_id': f"{port}:{onu_id}",
+                    'admin_state': 'enable',
+                    'omcc_state': 'enable' if onu['phase'] == 'working' else 'disable',
+                    'phase_state': onu['phase'],
+                    'channel': '1(GPON)',
+                }
+                for onu_id, onu in onus.items()
+            ]
+            ports.append({'port': port, 'onus': entries, 'total': f"{len(entries)}/{len(entries)}"})
+        data[olt.ip] = ports
+    return data
+
+
+def seed_database(db_uri, olts, username, password):
+    import bcrypt
+    from flask import Flask
+    from database import db
+    from models import OLT, OLTPortStatus, SystemConfig, User
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = db_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        hashed = bcrypt.hashpw(BENCH_PASSWORD.encode(), bcrypt.gensalt()).decode()
+        db.session.add(User(username=BENCH_USER, password=hashed, type_user='admin'))
+        db.session.add(SystemConfig(key='universal_username', value=username))
+        db.session.add(SystemConfig(key='universal_password', value=password))
+        for olt in olts:
+            db.session.add(OLT(name=olt.hostname, ip=olt.ip, type='ZTE'))
+        for olt_ip, ports in monitor_snapshot(olts).items():
+            for port in ports:
+                db.session.add(OLTPortStatus(olt_ip=olt_ip, port=port['port'], data=port))
+        db.session.commit()
+        db.session.remove()
+
+
+class Backend:
+    """Backend real (app.py) rodando em um subprocesso apontado para o simulador."""
+
+    def __init__(self, args, db_uri, log_path):
+        env = dict(os.environ)
+        env.update({
+            'PORT': str(args.api_port),
+            'SQLALCHEMY_DATABASE_URI': db_uri,
+            'OLT_TELNET_PORT': str(args.sim_port),
+            'OLT_MONITOR_ENABLED': '0',
+        })
+        self.base_url = f"http://127.0.0.1:{args.api_port}"
+        self.log = open(log_path, 'w')
+        self.process = subprocess.Popen(
+            [sys.executable, 'app.py'], cwd=BACKEND_DIR, env=env, stdout=self.log, stderr=subprocess.STDOUT
+        )
+        self.token = None
+
+    def request(self, method, path, body=None, timeout=120):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method)
+        req.add_header('Content-Type', 'application/json')
+        if self.token:
+            req.add_header('Authorization', f"Bearer {self.token}")
+        try:
+            with urllib.request.urlopen(req, timeout=timeout) as resp:
+                return resp.status, resp.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def login(self, timeout=60):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                status, body = self.request('POST', '/api/auth/login', {'username': BENCH_USER, 'password': BENCH_PASSWORD})
+                if status == 200:
+                    self.token = json.loads(body)['access_token']
+                    return True
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            if self.process.poll() is not None:
+                return False
+            time.sleep(0.5)
+        return False
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.log.close()
+
+
+def run_endpoint(backend, endpoint, sns, args, concurrency):
+    rng = random.Random(args.seed)
+    suffix = '?refresh=1' if args.no_cache else ''
+
+    def build():
+        sn = rng.choice(sns)
+        if endpoint == 'locate':
+            if rng.random() < args.miss_ratio:
+                sn = f"ZTEGFF{rng.randrange(16 ** 6):06X}"
+            return 'POST', '/api/onu/locate', {'sn': sn}
+        if endpoint == 'signal':
+            return 'GET', f"/api/onu/signal/{sn}{suffix}", None
+        if endpoint == 'acs':
+            return 'GET', f"/api/onu/acs/{sn}{suffix}", None
+        return 'GET', '/api/olts/monitor-status', None
+
+    calls = [build() for _ in range(args.requests)]
+    latencies = []
+    statuses = {}
+    errors = 0
+    lock = threading.Lock()
+
+    def call(spec):
+        nonlocal errors
+        method, path, body = spec
+        started = time.perf_counter()
+        try:
+            status, _ = backend.request(method, path, body, timeout=args.timeout)
+        except Exception:
+            status = 'error'
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if status == 'error' or (isinstance(status, int) and status >= 500):
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(call, calls))
+    wall = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    ms = lambda value: round(value * 1000, 1) if value is not None else None
+    return {
+        'endpoint': endpoint,
+        'concurrency': concurrency,
+        'requests': len(calls),
+        'errors': errors,
+        'statuses': statuses,
+        'p50_ms': ms(percentile(ordered, 50)),
+        'p95_ms': ms(percentile(ordered, 95)),
+        'p99_ms': ms(percentile(ordered, 99)),
+        'mean_ms': ms(sum(ordered) / len(ordered)) if ordered else None,
+        'max_ms': ms(ordered[-1]) if ordered else None,
+        'throughput_rps': round(len(calls) / wall, 2) if wall else None,
+    }
+
+
+def run_scenario(args, olt_count, onus_per_port, workdir):
+    sim_argv = [
+        '--olts', str(olt_count), '--base-ip', args.base_ip, '--port', str(args.sim_port),
+        '--onus-per-port', str(onus_per_port), '--slots', str(args.slots), '--pons', str(args.pons),
+        '--latency', str(args.latency), '--latency-per-line', str(args.latency_per_line),
+        '--drop-rate', str(args.drop_rate), '--seed', str(args.seed),
+    ]
+    # Mesmos argumentos e semente do subprocesso: as OLTs geradas aqui sao identicas as simuladas
+    sim_args = olt_simulator.build_parser().parse_args(sim_argv)
+    rng = random.Random(sim_args.seed)
+    olts = [
+        olt_simulator.SimulatedOLT(i + 1, ip, sim_args, rng)
+        for i, ip in enumerate(olt_simulator.olt_ips(sim_args.base_ip, sim_args.olts))
+    ]
+    sns = [sn for olt in olts for sn in olt.by_sn]
+
+    tag = f"{olt_count}olts_{onus_per_port}onus"
+    db_uri = f"sqlite:///{os.path.join(workdir, tag + '.db')}"
+    seed_database(db_uri, olts, sim_args.username, sim_args.password)
+
+    simulator = subprocess.Popen(
+        [sys.executable, os.path.join(SCRIPTS_DIR, 'olt_simulator.py')] + sim_argv,
+        stdout=open(os.path.join(workdir, tag + '_sim.log'), 'w'), stderr=subprocess.STDOUT,
+    )
+    backend = None
+    results = []
+    try:
+        if not wait_port(olts[-1].ip, args.sim_port):
+            raise RuntimeError("simulador nao subiu")
+        backend = Backend(args, db_uri, os.path.join(workdir, tag + '_backend.log'))
+        if not backend.login():
+            raise RuntimeError(f"backend nao subiu (veja {workdir}/{tag}_backend.log)")
+
+        for concurrency in args.concurrency:
+            for endpoint in args.endpoints:
+                result = run_endpoint(backend, endpoint, sns, args, concurrency)
+                result.update({'olts': olt_count, 'onus_per_port': onus_per_port, 'total_onus': len(sns)})
+                results.append(result)
+                print(
+                    f"[BENCH] olts={olt_count:<3} onus/porta={onus_per_port:<6} tecnicos={concurrency:<3} "
+                    f"{endpoint:<15} p50={result['p50_ms']}ms p95={result['p95_ms']}ms "
+                    f"p99={result['p99_ms']}ms {result['throughput_rps']} req/s erros={result['errors']}",
+                    flush=True,
+                )
+    finally:
+        if backend:
+            backend.stop()
+        simulator.terminate()
+        simulator.wait(timeout=10)
+    return results
+
+
+def result_key(result):
+    return (result['olts'], str(result['onus_per_port']), result['concurrency'], result['endpoint'])
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {result_key(r): r for r in json.load(f)['results']}
+
+    print(f"\n[BENCH] Comparacao com {baseline_path} (negativo = mais rapido)")
+    for result in results:
+        old = baseline.get(result_key(result))
+        if not old:
+            continue
+        deltas = []
+        for field in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if old.get(field) and result.get(field) is not None:
+                deltas.append(f"{field[:3]} {100 * (result[field] - old[field]) / old[field]:+.0f}%")
+        if old.get('throughput_rps') and result.get('throughput_rps'):
+            deltas.append(f"vazao {100 * (result['throughput_rps'] - old['throughput_rps']) / old['throughput_rps']:+.0f}%")
+        olts, onus, concurrency, endpoint = result_key(result)
+        print(f"  olts={olts:<3} onus/porta={onus:<6} tecnicos={concurrency:<3} {endpoint:<15} {'  '.join(deltas)}")
+
+
+def csv_list(cast):
+    return lambda value: [cast(item) for item in value.split(',') if item]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dos endpoints de ONU contra OLTs simuladas.")
+    parser.add_argument('--olts', type=csv_list(int), default=[1, 10, 50, 100], help="Lista de quantidades de OLTs")
+    parser.add_argument('--onus-per-port', type=csv_list(str), default=['32'], help="Lista de ONUs por porta (N ou MIN-MAX)")
+    parser.add_argument('--concurrency', type=csv_list(int), default=[1, 10, 50], help="Lista de tecnicos simultaneos")
+    parser.add_argument('--endpoints', type=csv_list(str), default=ENDPOINTS, help=f"Subconjunto de {','.join(ENDPOINTS)}")
+    parser.add_argument('--requests', type=int, default=50, help="Requisicoes por endpoint em cada nivel de concorrencia")
+    parser.add_argument('--miss-ratio', type=float, default=0.1, help="Fracao de SNs inexistentes no /locate")
+    parser.add_argument('--no-cache', action='store_true', help="Usa ?refresh=1 em signal/acs para ignorar o cache")
+    parser.add_argument('--slots', type=int, default=2)
+    parser.add_argument('--pons', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0.02, help="Latencia por comando no simulador (s)")
+    parser.add_argument('--latency-per-line', type=float, default=0.0)
+    parser.add_argument('--drop-rate', type=float, default=0.0)
+    parser.add_argument('--base-ip', default='127.0.1.1')
+    parser.add_argument('--sim-port', type=int, default=2323)
+    parser.add_argument('--api-port', type=int, default=5055)
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default=f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    parser.add_argument('--compare', help="JSON de uma execucao anterior para comparar")
+    args = parser.parse_args()
+
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"endpoints desconhecidos: {', '.join(sorted(unknown))}")
+
+    started_at = datetime.now().isoformat(timespec='seconds')
+    workdir = tempfile.mkdtemp(prefix='onu_bench_')
+    print(f"[BENCH] Logs e bancos temporarios em {workdir}", flush=True)
+
+    results = []
+    for olt_count in args.olts:
+        for onus_per_port in args.onus_per_port:
+            try:
+                results.extend(run_scenario(args, olt_count, onus_per_port, workdir))
+            except Exception as e:
+                print(f"[BENCH] Cenario {olt_count} OLTs / {onus_per_port} ONUs falhou: {e}", flush=True)
+
+    report = {
+        'meta': {
+            'git_revision': git_revision(),
+            'started_at': started_at,
+            'args': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+            'env': {k: v for k, v in os.environ.items() if k.startswith('OLT_')},
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"[BENCH] Resultados gravados em {args.output}", flush=True)
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
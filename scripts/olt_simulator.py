@@ -0,0 +1,530 @@
+"""Simulador local de OLT ZTE (CLI ZXAN via telnet) para testes e benchmarks.
+
+Emula o que o backend usa: login/enable, `terminal length 0`, `show gpon onu by sn`,
+`show gpon onu state`, `show gpon onu baseinfo`, `show gpon onu detail-info` e
+`show pon power *`, alem de configure terminal/interface/exit/end (aceitos sem
+efeito) e reboot com confirmacao.
+
+Cada OLT simulada escuta em um IP de loopback diferente (127.0.1.1, 127.0.1.2, ...)
+na mesma porta, porque o backend identifica as OLTs pelo IP. Exemplo:
+
+    python scripts/olt_simulator.py --olts 10 --port 2323 --onus-per-port 32-64 \
+        --latency 0.05 --drop-rate 0.01 --dump-sns /tmp/sim_sns.json
+
+    # backend apontando para o simulador (cadastre as OLTs com os IPs acima)
+    OLT_TELNET_PORT=2323 python app.py
+
+Os SNs sao deterministicos: ZTEG + OLT (2 hex) + porta (3 hex) + ONU (3 hex).
+"""
+import argparse
+import json
+import random
+import socket
+import socketserver
+import threading
+import time
+from datetime import datetime
+
+IAC = 255
+DONT = 254
+DO = 253
+WONT = 252
+WILL = 251
+SB = 250
+SE = 240
+ECHO = 1
+SGA = 3
+
+NO_INFO = "%Code 32310-GPONSRV : No related information to show."
+INVALID = "%Error 20200: Invalid input detected at '^' marker."
+NO_INTERFACE = "%Error 20203: The interface does not exist."
+
+OFFLINE_STATES = ['LOS', 'DyingGasp', 'OffLine']
+ONU_TYPES = ['F601', 'F660', 'F670L', 'F680']
+
+
+def parse_range(value):
+    if '-' in str(value):
+        low, high = str(value).split('-', 1)
+        return int(low), int(high)
+    return int(value), int(value)
+
+
+def sn_for(olt_index, port_index, onu_id):
+    return f"ZTEG{olt_index:02X}{port_index:03X}{onu_id:03X}"
+
+
+class SimulatedOLT:
+    """Estado de uma OLT: portas, ONUs e contagem de sessoes abertas."""
+
+    def __init__(self, index, ip, args, rng):
+        self.index = index
+        self.ip = ip
+        self.hostname = f"{args.hostname}-{index:03d}"
+        self.args = args
+        self.lock = threading.Lock()
+        self.sessions = 0
+        self.ports = {}
+        self.by_sn = {}
+
+        low, high = parse_range(args.onus_per_port)
+        port_index = 0
+        for slot in range(1, args.slots + 1):
+            for pon in range(1, args.pons + 1):
+                port_index += 1
+                port = f"1/{slot}/{pon}"
+                onus = {}
+                for onu_id in range(1, rng.randint(low, high) + 1):
+                    sn = sn_for(index, port_index, onu_id)
+                    offline = rng.random() < args.offline_ratio
+                    onus[onu_id] = {
+                        'sn': sn,
+                        'name': f"cliente-{index:03d}-{port_index:03d}-{onu_id:03d}",
+                        'type': rng.choice(ONU_TYPES),
+                        'phase': rng.choice(OFFLINE_STATES) if offline else 'working',
+                        'distance': rng.randint(200, 20000),
+                        'rx': round(rng.uniform(-27.5, -15.0), 3),
+                        'olt_rx': round(rng.uniform(-29.0, -17.0), 3),
+                        'tx': round(rng.uniform(1.5, 3.0), 3),
+                        'since': time.time() - rng.randint(60, 90 * 86400),
+                    }
+                    self.by_sn[sn] = (port, onu_id)
+                self.ports[port] = onus
+        self.olt_tx = {port: round(rng.uniform(3.0, 7.0), 3) for port in self.ports}
+
+    def total_onus(self):
+        return sum(len(onus) for onus in self.ports.values())
+
+    def churn(self, rng, ratio):
+        """Troca o estado de uma fracao das ONUs (quedas e retornos)."""
+        with self.lock:
+            changed = 0
+            for onus in self.ports.values():
+                for onu in onus.values():
+                    if rng.random() < ratio:
+                        onu['phase'] = rng.choice(OFFLINE_STATES) if onu['phase'] == 'working' else 'working'
+                        onu['since'] = time.time()
+                        changed += 1
+            return changed
+
+    def lookup(self, interface):
+        """gpon-onu_1/2/3:4 -> (porta, id, dados) ou None."""
+        short = interface.replace('gpon-onu_', '')
+        if ':' not in short:
+            return None
+        port, _, onu_id = short.partition(':')
+        try:
+            onu = self.ports.get(port, {}).get(int(onu_id))
+        except ValueError:
+            return None
+        return (port, int(onu_id), onu) if onu else None
+
+    # --- Saidas dos comandos -------------------------------------------------
+
+    def show_by_sn(self, sn):
+        location = self.by_sn.get(sn.upper())
+        if not location:
+            return NO_INFO
+        port, onu_id = location
+        return f"SearchResult\n-----------------\ngpon-onu_{port}:{onu_id}"
+
+    def show_state(self, interface=None):
+        if interface:
+            port = interface.replace('gpon-olt_', '')
+            if port not in self.ports:
+                return NO_INTERFACE
+            ports = [port]
+        else:
+            ports = list(self.ports)
+
+        lines = []
+        online = 0
+        total = 0
+        with self.lock:
+            for port in ports:
+                for onu_id, onu in self.ports[port].items():
+                    total += 1
+                    online += onu['phase'] == 'working'
+                    omcc = 'enable' if onu['phase'] == 'working' else 'disable'
+                    lines.append(f"{f'{port}:{onu_id}':<10} enable       {omcc:<11} {onu['phase']:<12} 1(GPON)")
+        if not lines:
+            return NO_INFO
+        header = [
+            "OnuIndex   Admin State  OMCC State  Phase State  Channel",
+            "--------------------------------------------------------------",
+        ]
+        return "\n".join(header + lines + [f"ONU Number: {online}/{total}"])
+
+    def show_baseinfo(self, interface=None):
+        if interface:
+            port = interface.replace('gpon-olt_', '')
+            if port not in self.ports:
+                return NO_INTERFACE
+            ports = [port]
+        else:
+            ports = list(self.ports)
+
+        lines = []
+        with self.lock:
+            for port in ports:
+                for onu_id, onu in self.ports[port].items():
+                    state = 'ready' if onu['phase'] == 'working' else 'offline'
+                    lines.append(f"{f'gpon-onu_{port}:{onu_id}':<25}{onu['type']:<14}sn          SN:{onu['sn']:<20}{state}")
+        if not lines:
+            return NO_INFO
+        header = [
+            "OnuIndex                 Type          Mode        AuthInfo                State",
+            "--------------------------------------------------------------------------------",
+        ]
+        return "\n".join(header + lines)
+
+    def show_detail(self, interface):
+        found = self.lookup(interface)
+        if not found:
+            return NO_INTERFACE
+        port, onu_id, onu = found
+        working = onu['phase'] == 'working'
+        duration = int(time.time() - onu['since'])
+        days, rest = divmod(duration, 86400)
+        hours, rest = divmod(rest, 3600)
+        minutes, seconds = divmod(rest, 60)
+        since = datetime.fromtimestamp(onu['since']).strftime('%Y-%m-%d %H:%M:%S')
+        return "\n".join([
+            f"ONU interface:          gpon-onu_{port}:{onu_id}",
+            f"Name:                   {onu['name']}",
+            f"Type:                   {onu['type']}",
+            f"State:                  {'ready' if working else 'offline'}",
+            "Admin state:            enable",
+            f"Phase state:            {onu['phase']}",
+            "Config state:           success",
+            "Authentication mode:    sn",
+            "SN Bind:                enable with SN check",
+            f"Serial number:          {onu['sn']}",
+            f"Description:            {onu['name']}",
+            "Vport mode:             gemport",
+            "DBA Mode:               Hybrid",
+            f"ONU Distance:           {onu['distance'] if working else 0}m",
+            f"Online Duration:        {days}d {hours}h {minutes}m {seconds}s" if working else "Online Duration:        0h 0m 0s",
+            "FEC:                    none",
+            "-------------------------------------------------------------------",
+            "       Authpass Time          OfflineTime             Cause",
+            f"   1   {since}    0000-00-00 00:00:00",
+        ])
+
+    def show_power(self, kind, interface):
+        if kind == 'olt-tx':
+            port = interface.replace('gpon-olt_', '')
+            if port not in self.olt_tx:
+                return NO_INTERFACE
+            return f"Olt                 Tx power\n-------------------------------------\n{interface:<20}{self.olt_tx[port]:.3f}(dbm)"
+
+        found = self.lookup(interface)
+        if not found:
+            return NO_INTERFACE
+        _, _, onu = found
+        value = {'onu-rx': onu['rx'], 'olt-rx': onu['olt_rx'], 'onu-tx': onu['tx']}.get(kind)
+        if value is None:
+            return INVALID
+        label = 'Tx power' if kind.endswith('tx') else 'Rx power'
+        power = f"{value:.3f}(dbm)" if onu['phase'] == 'working' else "N/A"
+        return f"Onu                 {label}\n-------------------------------------\n{interface:<20}{power}"
+
+    def running_config(self):
+        lines = [f"hostname {self.hostname}", "!"]
+        for port, onus in self.ports.items():
+            lines.append(f"interface gpon-olt_{port}")
+            lines += [f"  onu {onu_id} type {onu['type']} sn {onu['sn']}" for onu_id, onu in onus.items()]
+            lines.append("!")
+        for port, onus in self.ports.items():
+            for onu_id, onu in onus.items():
+                lines += [f"interface gpon-onu_{port}:{onu_id}", f"  name {onu['name']}", "  tcont 1 profile 1G", "!"]
+        lines.append("end")
+        return "\n".join(lines)
+
+    def execute(self, command):
+        """Saida de um comando show, ou None se o comando nao e de leitura conhecida."""
+        parts = command.split()
+        lowered = [p.lower() for p in parts]
+        if lowered[:5] == ['show', 'gpon', 'onu', 'by', 'sn'] and len(parts) == 6:
+            return self.show_by_sn(parts[5])
+        if lowered[:4] == ['show', 'gpon', 'onu', 'state']:
+            return self.show_state(parts[4] if len(parts) > 4 else None)
+        if lowered[:4] == ['show', 'gpon', 'onu', 'baseinfo']:
+            return self.show_baseinfo(parts[4] if len(parts) > 4 else None)
+        if lowered[:4] == ['show', 'gpon', 'onu', 'detail-info'] and len(parts) == 5:
+            return self.show_detail(parts[4])
+        if lowered[:3] == ['show', 'pon', 'power'] and len(parts) == 5:
+            return self.show_power(lowered[3], parts[4])
+        if lowered == ['show', 'running-config']:
+            return self.running_config()
+        if lowered[:2] == ['show', 'running-config']:
+            return ""
+        return None
+
+
+class CLIHandler(socketserver.BaseRequestHandler):
+    """Uma sessao vty: negociacao telnet, login, modos exec/config e comandos."""
+
+    def setup(self):
+        self.olt = self.server.olt
+        self.args = self.server.args
+        self.rng = random.Random()
+        self.buffer = b""
+        self.iac_state = None
+        self.mode = 'exec'
+        self.privileged = not self.args.unprivileged
+
+    # --- Entrada/saida -------------------------------------------------------
+
+    def send(self, text):
+        self.request.sendall(text.replace("\n", "\r\n").encode('ascii', errors='ignore'))
+
+    def _filter(self, data):
+        out = bytearray()
+        for byte in data:
+            state = self.iac_state
+            if state is None:
+                if byte == IAC:
+                    self.iac_state = 'iac'
+                else:
+                    out.append(byte)
+            elif state == 'iac':
+                if byte in (DO, DONT, WILL, WONT):
+                    self.iac_state = 'opt'
+                elif byte == SB:
+                    self.iac_state = 'sb'
+                else:
+                    self.iac_state = None
+            elif state == 'sb':
+                if byte == IAC:
+                    self.iac_state = 'sb-iac'
+            elif state == 'sb-iac':
+                self.iac_state = None if byte == SE else 'sb'
+            else:
+                self.iac_state = None
+        return bytes(out)
+
+    def readline(self, echo=True):
+        while True:
+            for sep in (b"\r\n", b"\r\x00", b"\n", b"\r"):
+                idx = self.buffer.find(sep)
+                if idx != -1:
+                    line, self.buffer = self.buffer[:idx], self.buffer[idx + len(sep):]
+                    text = line.decode('ascii', errors='ignore')
+                    self.send((text if echo else "") + "\n")
+                    return text
+            chunk = self.request.recv(4096)
+            if not chunk:
+                raise EOFError
+            self.buffer += self._filter(chunk)
+
+    def prompt(self):
+        if self.mode == 'exec':
+            return f"{self.olt.hostname}{'#' if self.privileged else '>'}"
+        return f"{self.olt.hostname}({self.mode})#"
+
+    # --- Sessao --------------------------------------------------------------
+
+    def handle(self):
+        with self.olt.lock:
+            if self.args.max_sessions and self.olt.sessions >= self.args.max_sessions:
+                self.send("%Error 20022: The number of users exceeds the limit.\n")
+                return
+            self.olt.sessions += 1
+        try:
+            self.request.sendall(bytes([IAC, WILL, ECHO, IAC, WILL, SGA]))
+            if self.args.login_latency:
+                time.sleep(self.args.login_latency)
+            if self.login():
+                self.loop()
+        except (EOFError, OSError):
+            pass
+        finally:
+            with self.olt.lock:
+                self.olt.sessions -= 1
+
+    def login(self):
+        for _ in range(3):
+            self.send("\n************************************************\nWelcome to ZXAN product C320 of ZTE Corporation\n************************************************\n\nUsername:")
+            username = self.readline().strip()
+            self.send("Password:")
+            password = self.readline(echo=False).strip()
+            if username == self.args.username and password == self.args.password:
+                self.send("\n" + self.prompt())
+                return True
+            self.send("%Error 20204: Username or password error.\n")
+        return False
+
+    def loop(self):
+        while True:
+            command = self.readline().strip()
+            if not command:
+                self.send(self.prompt())
+                continue
+            if self.args.verbose:
+                print(f"[SIM] {self.olt.ip} <- {command}", flush=True)
+
+            output = self.run(command)
+            if output is False:
+                return
+            self.send((output + "\n" if output else "") + self.prompt())
+
+    def _inject(self):
+        """Falhas configuradas: False derruba a sessao, string vira a saida do comando."""
+        roll = self.rng.random()
+        if roll < self.args.drop_rate:
+            return False
+        roll -= self.args.drop_rate
+        if roll < self.args.hang_rate:
+            time.sleep(self.args.hang_time)
+            return None
+        roll -= self.args.hang_rate
+        if roll < self.args.error_rate:
+            return "%Error 20001: System is busy, please try again later."
+        return None
+
+    def _latency(self, command, output):
+        delay = self.args.latency + self.rng.uniform(0, self.args.jitter)
+        for prefix, value in self.args.command_latency:
+            if command.lower().startswith(prefix):
+                delay = value
+        if output:
+            delay += output.count("\n") * self.args.latency_per_line
+        if delay > 0:
+            time.sleep(delay)
+
+    def run(self, command):
+        lowered = command.lower()
+        if lowered in ('exit', 'quit', 'logout'):
+            if self.mode == 'exec':
+                return False
+            self.mode = 'config' if self.mode != 'config' else 'exec'
+            return ""
+        if lowered == 'end':
+            self.mode = 'exec'
+            return ""
+        if lowered == 'enable':
+            self.privileged = True
+            return ""
+        if lowered.startswith('terminal length'):
+            return ""
+        if not self.privileged:
+            return INVALID
+
+        injected = self._inject()
+        if injected is False:
+            self.request.shutdown(socket.SHUT_RDWR)
+            return False
+        if injected:
+            return injected
+
+        if self.mode != 'exec':
+            if lowered.startswith('interface gpon-onu_'):
+                self.mode = 'config-if'
+            elif lowered.startswith('pon-onu-mng'):
+                self.mode = 'gpon-onu-mng'
+            self._latency(command, "")
+            return ""
+
+        if lowered in ('configure terminal', 'conf t'):
+            self.mode = 'config'
+            return "Enter configuration commands, one per line. End with CTRL/Z."
+        if lowered.startswith('reboot'):
+            self.send("Confirm to reboot? [yes/no]:")
+            self.readline()
+            return ""
+
+        output = self.olt.execute(command)
+        if output is None:
+            output = INVALID
+        self._latency(command, output)
+        return output
+
+
+class OLTServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, olt, args):
+        self.olt = olt
+        self.args = args
+        super().__init__((olt.ip, args.port), CLIHandler)
+
+
+def olt_ips(base_ip, count):
+    a, b, c, d = (int(x) for x in base_ip.split('.'))
+    start = (a << 24) | (b << 16) | (c << 8) | d
+    return ['.'.join(str(((start + i) >> shift) & 255) for shift in (24, 16, 8, 0)) for i in range(count)]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Simulador de OLT ZTE (telnet) para testes e benchmarks.")
+    parser.add_argument('--olts', type=int, default=1, help="Quantidade de OLTs simuladas (uma por IP)")
+    parser.add_argument('--base-ip', default='127.0.1.1', help="IP da primeira OLT; as demais usam os IPs seguintes")
+    parser.add_argument('--port', type=int, default=2323, help="Porta telnet (use a mesma em OLT_TELNET_PORT)")
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin')
+    parser.add_argument('--hostname', default='OLT-SIM')
+    parser.add_argument('--unprivileged', action='store_true', help="Login cai no prompt '>' e exige enable")
+    parser.add_argument('--slots', type=int, default=2, help="Placas GPON por OLT")
+    parser.add_argument('--pons', type=int, default=16, help="Portas PON por placa")
+    parser.add_argument('--onus-per-port', default='32', help="ONUs por porta: N ou faixa MIN-MAX")
+    parser.add_argument('--offline-ratio', type=float, default=0.05, help="Fracao de ONUs fora do ar")
+    parser.add_argument('--churn', type=float, default=0.0, help="Fracao de ONUs que muda de estado a cada --churn-interval")
+    parser.add_argument('--churn-interval', type=float, default=30.0)
+    parser.add_argument('--latency', type=float, default=0.0, help="Atraso base por comando (s)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Atraso extra aleatorio por comando (0..N s)")
+    parser.add_argument('--latency-per-line', type=float, default=0.0, help="Atraso por linha de saida (s)")
+    parser.add_argument('--command-latency', action='append', default=[], metavar='PREFIXO=SEG',
+                        help="Atraso fixo para comandos com o prefixo (pode repetir)")
+    parser.add_argument('--login-latency', type=float, default=0.0, help="Atraso antes do prompt de login (s)")
+    parser.add_argument('--drop-rate', type=float, default=0.0, help="Probabilidade de derrubar a sessao em um comando")
+    parser.add_argument('--hang-rate', type=float, default=0.0, help="Probabilidade de travar um comando por --hang-time")
+    parser.add_argument('--hang-time', type=float, default=30.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Probabilidade de responder %%Error a um comando")
+    parser.add_argument('--max-sessions', type=int, default=0, help="Limite de vty por OLT (0 = sem limite)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--dump-sns', help="Grava {ip: [sn, ...]} em JSON para scripts de benchmark")
+    parser.add_argument('--verbose', action='store_true')
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    command_latency = []
+    for item in args.command_latency:
+        prefix, _, value = item.rpartition('=')
+        command_latency.append((prefix.strip().lower(), float(value)))
+    args.command_latency = command_latency
+
+    rng = random.Random(args.seed)
+    olts = [SimulatedOLT(i + 1, ip, args, rng) for i, ip in enumerate(olt_ips(args.base_ip, args.olts))]
+
+    servers = []
+    for olt in olts:
+        server = OLTServer(olt, args)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        print(f"[SIM] {olt.hostname} em {olt.ip}:{args.port} - {len(olt.ports)} portas, {olt.total_onus()} ONUs", flush=True)
+
+    if args.dump_sns:
+        with open(args.dump_sns, 'w') as f:
+            json.dump({olt.ip: list(olt.by_sn) for olt in olts}, f)
+        print(f"[SIM] SNs gravados em {args.dump_sns}")
+
+    sample = olts[0]
+    print(f"[SIM] Exemplo de SN: {next(iter(sample.by_sn), '-')} ({sample.ip})", flush=True)
+
+    try:
+        while True:
+            time.sleep(args.churn_interval if args.churn else 3600)
+            if args.churn:
+                changed = sum(olt.churn(rng, args.churn) for olt in olts)
+                print(f"[SIM] Churn: {changed} ONUs mudaram de estado", flush=True)
+    except KeyboardInterrupt:
+        for server in servers:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()